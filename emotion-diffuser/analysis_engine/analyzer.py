@@ -2,16 +2,299 @@
 Core Analyzer Logic — coordinates model inference and result processing.
 """
 
+import asyncio
 import logging
-from backend.schemas import AnalysisOut
-from .models import get_emotion_pipeline, get_toxicity_pipeline
+from itertools import islice
+from typing import Any, Callable
+from backend import config
+from backend.cache import LRUCache, SingleFlight, SQLiteCache, content_key, normalize_text
+from backend.schemas import AnalysisOut, ChunkAnalysis
+from .batcher import MicroBatcher
+from .chunking import aggregate, iter_chunks
+from .executor import run_inference
+from .models import predict_combined, predict_emotions, predict_toxicity, warm_up_models
 from .utils import format_emotion_results, calculate_risk_level
 
 logger = logging.getLogger(__name__)
 
-async def analyze_text(text: str, context: str | None = None) -> AnalysisOut:
+# Micro-batchers, one per model (created on first use)
+_batchers: dict[str, MicroBatcher] = {}
+
+# Content-addressed result cache: same text + same models → same analysis
+_analysis_cache = LRUCache(
+    max_entries=config.ANALYSIS_CACHE_SIZE,
+    ttl_seconds=config.ANALYSIS_CACHE_TTL_S or None,
+)
+
+# Optional persistent second tier (see config.ANALYSIS_CACHE_BACKEND)
+_persistent_cache: SQLiteCache | None = None
+
+# Concurrent analyses of the same text share one forward pass
+_in_flight = SingleFlight()
+
+
+def get_analysis_cache() -> LRUCache:
+    """The in-memory analysis result cache (exposed for metrics)."""
+    return _analysis_cache
+
+
+def get_analysis_singleflight() -> SingleFlight:
+    """The analysis request coalescer (exposed for metrics)."""
+    return _in_flight
+
+
+def get_persistent_cache() -> SQLiteCache | None:
+    """The shared on-disk analysis cache, or None when it is disabled."""
+    global _persistent_cache
+    if _persistent_cache is None and config.ANALYSIS_CACHE_BACKEND == "sqlite":
+        _persistent_cache = SQLiteCache(
+            config.ANALYSIS_CACHE_PATH,
+            max_entries=config.ANALYSIS_CACHE_DB_MAX_ENTRIES,
+            ttl_seconds=config.ANALYSIS_CACHE_TTL_S or None,
+        )
+    return _persistent_cache
+
+
+def _cache_key(text: str) -> str:
+    """
+    Hash of the normalized text plus the models (and runtime) that produced the result.
+    Long texts also hash their chunk spans: normalizing drops the line breaks
+    the windows are split at, and the spans are the offsets in ``chunks``.
+    """
+    toxicity = "multihead" if config.ENABLE_MULTIHEAD_ANALYZER else config.TOXICITY_MODEL
+    parts = [normalize_text(text), config.EMOTION_MODEL, toxicity, config.INFERENCE_BACKEND]
+    if len(text) > config.ANALYSIS_CHUNK_MAX_CHARS:
+        parts.append(_chunk_spans(text))
+    return content_key(*parts)
+
+
+async def _cache_get_many(keys: list[str]) -> list[AnalysisOut | None]:
+    """
+    Cached analyses for keys, copied so callers can't mutate the cache.
+    Memory misses go to the persistent tier in one trip off the event loop.
+    """
+    results: list[AnalysisOut | None] = []
+    for key in keys:
+        cached = _analysis_cache.get(key)
+        results.append(cached.model_copy(deep=True) if cached is not None else None)
+
+    persistent = get_persistent_cache()
+    missing = [i for i, result in enumerate(results) if result is None]
+    if persistent is not None and missing:
+        stored = await asyncio.to_thread(lambda: [persistent.get(keys[i]) for i in missing])
+        for i, value in zip(missing, stored):
+            if value is not None:
+                results[i] = AnalysisOut.model_validate_json(value)
+                _analysis_cache.set(keys[i], results[i].model_copy(deep=True))
+    return results
+
+
+async def _cache_get(key: str) -> AnalysisOut | None:
+    return (await _cache_get_many([key]))[0]
+
+
+async def _cache_put_many(items: list[tuple[str, AnalysisOut]]) -> None:
+    """Store successful analyses (fallbacks are never cached)."""
+    for key, result in items:
+        _analysis_cache.set(key, result.model_copy(deep=True))
+
+    persistent = get_persistent_cache()
+    if persistent is not None and items:
+        rows = [(key, result.model_dump_json()) for key, result in items]
+        await asyncio.to_thread(lambda: [persistent.set(key, value) for key, value in rows])
+
+
+async def _cache_put(key: str, result: AnalysisOut) -> None:
+    await _cache_put_many([(key, result)])
+
+
+# Readiness — flipped once warm_up() has loaded and exercised both models
+_ready: bool = False
+_warmup_error: str | None = None
+
+
+def is_ready() -> bool:
+    """True once the models are loaded and warm (see warm_up)."""
+    return _ready
+
+
+def warmup_error() -> str | None:
+    """The error from the last failed warm-up attempt, until one succeeds."""
+    return _warmup_error
+
+
+def mark_ready() -> None:
+    """Declare the engine ready without warming up (lazy model loading)."""
+    global _ready
+    _ready = True
+
+
+async def warm_up() -> None:
+    """
+    Load both models and run warm-up inferences on the inference executor.
+    With a process pool every worker loads its own models, so each gets a pass.
+    A failed attempt (e.g. the model hub was unreachable) is retried with
+    exponential backoff, so a transient error doesn't leave /ready failing.
+    """
+    global _ready, _warmup_error
+    passes = config.INFERENCE_WORKERS if config.INFERENCE_EXECUTOR == "process" else 1
+    delay = config.WARMUP_RETRY_BACKOFF_S
+    while True:
+        try:
+            await asyncio.gather(*(run_inference(warm_up_models) for _ in range(passes)))
+            break
+        except Exception as e:
+            _warmup_error = str(e)
+            if delay <= 0:
+                logger.error(f"Model warm-up failed: {str(e)}")
+                return
+            logger.error(f"Model warm-up failed, retrying in {delay:g}s: {str(e)}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, config.WARMUP_RETRY_MAX_BACKOFF_S)
+    _warmup_error = None
+    _ready = True
+
+
+async def _infer(name: str, fn: Callable[[list[str]], list], text: str) -> Any:
+    """Run one text through a model, via its micro-batcher when enabled."""
+    if not config.ENABLE_MICRO_BATCHING:
+        return (await run_inference(fn, [text]))[0]
+
+    batcher = _batchers.get(name)
+    if batcher is None:
+        batcher = _batchers[name] = MicroBatcher(
+            fn,
+            max_batch_size=config.MICRO_BATCH_MAX_SIZE,
+            max_wait_ms=config.MICRO_BATCH_MAX_WAIT_MS,
+        )
+    return await batcher.submit(text)
+
+
+async def _predict_one(text: str) -> tuple[list[dict], dict]:
+    """Raw (emotions, toxicity) for one text — one shared pass or both models side by side."""
+    if config.ENABLE_MULTIHEAD_ANALYZER:
+        return await _infer("combined", predict_combined, text)
+    # Both models run concurrently on the executor, so latency is the slower of the two
+    return await asyncio.gather(
+        _infer("emotion", predict_emotions, text),
+        _infer("toxicity", predict_toxicity, text),
+    )
+
+
+async def _predict_many(texts: list[str]) -> list[tuple[list[dict], dict]]:
+    """Raw (emotions, toxicity) pairs for a chunk of texts, one forward pass per model."""
+    if config.ENABLE_MULTIHEAD_ANALYZER:
+        return await run_inference(predict_combined, texts)
+    raw_emotions, raw_toxicity = await asyncio.gather(
+        run_inference(predict_emotions, texts),
+        run_inference(predict_toxicity, texts),
+    )
+    return list(zip(raw_emotions, raw_toxicity))
+
+
+def _build_analysis(raw_emotions: list[dict], raw_toxicity: dict) -> AnalysisOut:
+    """Turn raw emotion scores and the toxicity label into an AnalysisOut."""
+    # Process emotions
+    top_emotion, intensity, all_emotions = format_emotion_results(raw_emotions)
+
+    # Process toxicity
+    # Note: martin-ha/toxic-comment-model returns [{'label': 'toxic/non-toxic', 'score': float}]
+    # The label is usually binary.
+    is_toxic = False
+    toxicity_score = 0.0
+
+    if raw_toxicity['label'].lower() == 'toxic':
+        is_toxic = True
+        toxicity_score = round(raw_toxicity['score'], 3)
+    else:
+        # If non-toxic, the score is often for 'non-toxic', so we invert it for risk calculation
+        toxicity_score = round(1.0 - raw_toxicity['score'], 3)
+
+    # Calculate escalation risk
+    risk = calculate_risk_level(toxicity_score, intensity)
+
+    return AnalysisOut(
+        emotion=top_emotion,
+        intensity=intensity,
+        risk=risk,
+        is_toxic=is_toxic,
+        toxicity_score=toxicity_score,
+        all_emotions=all_emotions
+    )
+
+
+def _chunk_spans(text: str) -> list[tuple[int, int]]:
+    return list(islice(iter_chunks(text, config.ANALYSIS_CHUNK_MAX_CHARS), config.ANALYSIS_MAX_CHUNKS))
+
+
+async def _analyze_long(text: str) -> AnalysisOut:
+    """
+    Analyze a long text as sentence-aligned windows (batched through the
+    models) and aggregate them into one result that lists each chunk.
+    """
+    spans = _chunk_spans(text)
+    windows = [text[start:end] for start, end in spans]
+    chunk_size = max(1, config.BATCH_CHUNK_SIZE)
+
+    raw: list[tuple[list[dict], dict]] = []
+    for i in range(0, len(windows), chunk_size):
+        raw.extend(await _predict_many(windows[i:i + chunk_size]))
+
+    result = _build_analysis(*aggregate(spans, [e for e, _ in raw], [t for _, t in raw]))
+    result.chunks = []
+    for (start, end), (raw_emotions, raw_toxicity) in zip(spans, raw):
+        chunk = _build_analysis(raw_emotions, raw_toxicity)
+        result.chunks.append(ChunkAnalysis(
+            start=start,
+            end=end,
+            emotion=chunk.emotion,
+            intensity=chunk.intensity,
+            is_toxic=chunk.is_toxic,
+            toxicity_score=chunk.toxicity_score,
+        ))
+    return result
+
+
+def combine_analyses(spans: list[tuple[int, int]], analyses: list[AnalysisOut]) -> AnalysisOut:
+    """
+    Merge analyses of consecutive pieces of one text (e.g. its sentences) the
+    same way long-text chunks are merged: length-weighted emotions, worst toxicity.
+    """
+    if len(analyses) == 1:
+        return analyses[0]
+    raw_emotions = [
+        [{"label": e.label, "score": e.score} for e in a.all_emotions]
+        if a.all_emotions else [{"label": a.emotion, "score": a.intensity}]
+        for a in analyses
+    ]
+    raw_toxicity = [
+        {"label": "toxic", "score": a.toxicity_score} if a.is_toxic
+        else {"label": "non-toxic", "score": 1.0 - a.toxicity_score}
+        for a in analyses
+    ]
+    return _build_analysis(*aggregate(spans, raw_emotions, raw_toxicity))
+
+
+def _fallback_analysis() -> AnalysisOut:
+    """Neutral result used when the models fail."""
+    return AnalysisOut(
+        emotion="neutral",
+        intensity=0.1,
+        risk="low",
+        is_toxic=False,
+        toxicity_score=0.01,
+        all_emotions=[]
+    )
+
+
+async def analyze_text(
+    text: str, context: str | None = None, include_chunks: bool = False, use_cache: bool = True
+) -> AnalysisOut:
     """
     Analyze a piece of text for emotions and toxicity.
+
+    Texts longer than ``config.ANALYSIS_CHUNK_MAX_CHARS`` are split at
+    sentence boundaries and the per-chunk results aggregated.
     
     Parameters
     ----------
@@ -19,57 +302,114 @@ async def analyze_text(text: str, context: str | None = None) -> AnalysisOut:
         The user input to analyze.
     context : str, optional
         Additional context for the analysis.
+    include_chunks : bool
+        Keep the per-chunk breakdown of a long text in ``chunks``.
+    use_cache : bool
+        False runs the models without reading or filling the analysis cache,
+        for throwaway text such as a half-typed sentence.
         
     Returns
     -------
     AnalysisOut
         Structured analysis results.
     """
-    try:
-        # Load pipelines (singleton/cached)
-        emotion_pipe = get_emotion_pipeline()
-        toxicity_pipe = get_toxicity_pipeline()
-        
-        # Run inference
-        raw_emotions = emotion_pipe(text)[0]  # HF returns list of lists for top_k=None
-        raw_toxicity = toxicity_pipe(text)[0] # HF returns list for single input
-        
-        # Process emotions
-        top_emotion, intensity, all_emotions = format_emotion_results(raw_emotions)
-        
-        # Process toxicity
-        # Note: martin-ha/toxic-comment-model returns [{'label': 'toxic/non-toxic', 'score': float}]
-        # The label is usually binary.
-        is_toxic = False
-        toxicity_score = 0.0
-        
-        if raw_toxicity['label'].lower() == 'toxic':
-            is_toxic = True
-            toxicity_score = round(raw_toxicity['score'], 3)
-        else:
-            # If non-toxic, the score is often for 'non-toxic', so we invert it for risk calculation
-            toxicity_score = round(1.0 - raw_toxicity['score'], 3)
+    if not use_cache:
+        result = await _analyze_uncached(None, text)
+        if not include_chunks:
+            result.chunks = None
+        return result
 
-        # Calculate escalation risk
-        risk = calculate_risk_level(toxicity_score, intensity)
-        
-        return AnalysisOut(
-            emotion=top_emotion,
-            intensity=intensity,
-            risk=risk,
-            is_toxic=is_toxic,
-            toxicity_score=toxicity_score,
-            all_emotions=all_emotions
+    key = _cache_key(text)
+    result = await _cache_get(key)
+
+    if result is None:
+        # Identical texts already being analyzed share that run; each caller gets its own copy
+        result = await _in_flight.do(
+            key, lambda: _analyze_uncached(key, text), share=lambda r: r.model_copy(deep=True)
         )
 
+    if not include_chunks:
+        result.chunks = None
+    return result
+
+
+async def _analyze_uncached(key: str | None, text: str) -> AnalysisOut:
+    """Run the models for one text and cache the result under ``key`` if given (the neutral fallback is not cached)."""
+    try:
+        if len(text) > config.ANALYSIS_CHUNK_MAX_CHARS:
+            result = await _analyze_long(text)
+        else:
+            raw_emotions, raw_toxicity = await _predict_one(text)
+            result = _build_analysis(raw_emotions, raw_toxicity)
+        if key is not None:
+            await _cache_put(key, result)
+        return result
+
     except Exception as e:
         logger.error(f"Analysis failed: {str(e)}")
         # Fallback to neutral if ML fails
-        return AnalysisOut(
-            emotion="neutral",
-            intensity=0.1,
-            risk="low",
-            is_toxic=False,
-            toxicity_score=0.01,
-            all_emotions=[]
-        )
+        return _fallback_analysis()
+
+
+async def analyze_texts(texts: list[str]) -> list[AnalysisOut]:
+    """
+    Analyze many texts with batched forward passes.
+
+    Cached texts are answered from the analysis cache and duplicates are
+    analyzed once. The rest are bucketed by length (so each padded batch
+    wastes little compute), split into chunks of ``config.BATCH_CHUNK_SIZE``,
+    and each model runs once per chunk. Results come back in input order.
+
+    Parameters
+    ----------
+    texts : list[str]
+        The messages to analyze.
+
+    Returns
+    -------
+    list[AnalysisOut]
+        One result per input text.
+    """
+    results: list[AnalysisOut | None] = [None] * len(texts)
+
+    # Answer cache hits; group the misses by key so duplicates run once
+    text_keys = [_cache_key(text) for text in texts]
+    first: dict[str, int] = {}
+    for i, key in enumerate(text_keys):
+        first.setdefault(key, i)
+    cached = dict(zip(first, await _cache_get_many(list(first))))
+
+    pending: dict[str, list[int]] = {}
+    for i, key in enumerate(text_keys):
+        if cached[key] is None:
+            pending.setdefault(key, []).append(i)
+        else:
+            results[i] = cached[key] if i == first[key] else cached[key].model_copy(deep=True)
+            # Like fresh results, hits drop a long text's per-chunk breakdown
+            results[i].chunks = None
+
+    # Long texts are chunked on their own; the rest are sorted by length
+    # so neighbouring texts pad to similar sizes
+    for key in [k for k in pending if len(texts[pending[k][0]]) > config.ANALYSIS_CHUNK_MAX_CHARS]:
+        result = await analyze_text(texts[pending[key][0]])
+        for n, i in enumerate(pending.pop(key)):
+            results[i] = result if n == 0 else result.model_copy(deep=True)
+    order = sorted(pending, key=lambda k: len(texts[pending[k][0]]))
+    chunk_size = max(1, config.BATCH_CHUNK_SIZE)
+
+    for start in range(0, len(order), chunk_size):
+        keys = order[start:start + chunk_size]
+        chunk = [texts[pending[k][0]] for k in keys]
+        try:
+            chunk_results = [_build_analysis(e, t) for e, t in await _predict_many(chunk)]
+            await _cache_put_many(list(zip(keys, chunk_results)))
+        except Exception as e:
+            # Fall back to per-text analysis so one bad message doesn't sink the chunk
+            logger.error(f"Batch analysis failed for {len(chunk)} texts: {str(e)}")
+            chunk_results = [await analyze_text(text) for text in chunk]
+
+        for key, result in zip(keys, chunk_results):
+            for n, i in enumerate(pending[key]):
+                results[i] = result if n == 0 else result.model_copy(deep=True)
+
+    return results
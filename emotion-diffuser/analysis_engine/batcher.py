@@ -0,0 +1,90 @@
+"""
+Micro-Batcher — coalesces concurrent single-text requests into batched model calls.
+Pending texts are collected for a short window (or until the batch is full),
+run through the model once on the inference executor, and the results are
+fanned back out to each waiting caller.
+"""
+
+import asyncio
+import logging
+from typing import Any, Callable, Optional
+
+from .executor import run_inference
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Batches calls to ``fn(items) -> results`` (one result per item, same order).
+
+    Parameters
+    ----------
+    fn : callable
+        Batched model entrypoint, e.g. ``predict_emotions``.
+    max_batch_size : int
+        Flush as soon as this many items are pending.
+    max_wait_ms : float
+        Flush this long after the first pending item arrived, even if not full.
+    """
+
+    def __init__(self, fn: Callable[[list], list], max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        self.fn = fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._pending: list[tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one item for the next batch and wait for its result."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # First use, or a new event loop (e.g. tests) — drop stale state
+            self._loop = loop
+            self._pending = []
+            self._timer = None
+
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        """Hand the pending items to a background batch run."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._pending:
+            batch = self._pending[: self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            task = self._loop.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[Any, asyncio.Future]]) -> None:
+        """Run one batch and resolve every caller's future."""
+        items = [item for item, _ in batch]
+        try:
+            results = await run_inference(self.fn, items)
+        except Exception as e:
+            if len(batch) > 1:
+                # Isolate the failure so one bad input doesn't fail its neighbours
+                logger.warning(f"Batch of {len(batch)} failed ({e}) — retrying items individually")
+                await asyncio.gather(*(self._run([entry]) for entry in batch))
+                return
+            _, future = batch[0]
+            if not future.done():
+                future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
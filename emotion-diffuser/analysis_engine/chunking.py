@@ -0,0 +1,105 @@
+"""
+Long-text handling — split messages into model-sized windows at sentence
+boundaries, and combine per-window model outputs into one result.
+"""
+
+import re
+from typing import Iterator
+
+# Sentence ends (. ! ? … followed by whitespace) and line breaks
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+
+def iter_sentences(text: str) -> Iterator[tuple[int, int]]:
+    """(start, end) spans of the sentences in ``text``, surrounding whitespace excluded."""
+    pos = 0
+    for match in _SENTENCE_END.finditer(text):
+        yield from _strip(text, pos, match.start())
+        pos = match.end()
+    yield from _strip(text, pos, len(text))
+
+
+def is_sentence_closed(text: str, end: int) -> bool:
+    """True if the sentence ending at ``end`` is followed by a sentence break (it is no longer being typed)."""
+    return _SENTENCE_END.match(text, end) is not None
+
+
+def _strip(text: str, start: int, end: int) -> Iterator[tuple[int, int]]:
+    """The span without leading/trailing whitespace (nothing if it is blank)."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    if start < end:
+        yield start, end
+
+
+def _split_long(text: str, start: int, end: int, max_chars: int) -> Iterator[tuple[int, int]]:
+    """Split one over-long sentence at word boundaries (hard cut if a word is too long)."""
+    while end - start > max_chars:
+        cut = text.rfind(" ", start, start + max_chars + 1)
+        if cut <= start:
+            cut = start + max_chars
+        yield start, cut
+        start = cut
+        while start < end and text[start].isspace():
+            start += 1
+    if start < end:
+        yield start, end
+
+
+def iter_chunks(text: str, max_chars: int) -> Iterator[tuple[int, int]]:
+    """
+    Lazily yield (start, end) character spans covering ``text`` in windows of
+    at most ``max_chars``, packing whole sentences together where they fit.
+
+    Example
+    -------
+    >>> [text[s:e] for s, e in iter_chunks(text := "One. Two. Three.", 10)]
+    ['One. Two.', 'Three.']
+    """
+    window_start = window_end = None
+    for s_start, s_end in iter_sentences(text):
+        for start, end in _split_long(text, s_start, s_end, max_chars):
+            if window_start is not None and end - window_start <= max_chars:
+                window_end = end
+                continue
+            if window_start is not None:
+                yield window_start, window_end
+            window_start, window_end = start, end
+    if window_start is not None:
+        yield window_start, window_end
+
+
+def _p_toxic(raw_toxicity: dict) -> float:
+    """Probability of the toxic label from a top-label toxicity output."""
+    score = raw_toxicity["score"]
+    return score if raw_toxicity["label"].lower() == "toxic" else 1.0 - score
+
+
+def aggregate(
+    spans: list[tuple[int, int]], raw_emotions: list[list[dict]], raw_toxicity: list[dict]
+) -> tuple[list[dict], dict]:
+    """
+    Combine per-window outputs into one (emotions, toxicity) pair in the
+    models' own formats.
+
+    Emotion scores are averaged, weighted by window length. Toxicity takes
+    the most toxic window — one abusive passage makes the message toxic.
+    """
+    weights = [end - start for start, end in spans]
+    total = sum(weights) or 1
+    scores: dict[str, float] = {}
+    for weight, emotions in zip(weights, raw_emotions):
+        for emotion in emotions:
+            scores[emotion["label"]] = scores.get(emotion["label"], 0.0) + emotion["score"] * weight / total
+    emotions = sorted(
+        ({"label": label, "score": score} for label, score in scores.items()),
+        key=lambda e: e["score"],
+        reverse=True,
+    )
+
+    p_toxic = max(_p_toxic(t) for t in raw_toxicity)
+    if p_toxic >= 0.5:
+        return emotions, {"label": "toxic", "score": p_toxic}
+    return emotions, {"label": "non-toxic", "score": 1.0 - p_toxic}
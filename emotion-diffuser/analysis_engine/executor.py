@@ -0,0 +1,49 @@
+"""
+Inference Executor — runs blocking model calls off the event loop.
+HF pipelines are synchronous; awaiting them through this pool keeps
+uvicorn free to serve other requests while a forward pass is running.
+"""
+
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+from backend import config
+
+# Global pool, created on first use
+_executor: Optional[Executor] = None
+
+
+def get_inference_executor() -> Executor:
+    """Returns the singleton inference pool (thread or process, see config)."""
+    global _executor
+    if _executor is None:
+        if config.INFERENCE_EXECUTOR == "process":
+            # Each worker process loads its own copy of the models on first use
+            _executor = ProcessPoolExecutor(max_workers=config.INFERENCE_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(
+                max_workers=config.INFERENCE_WORKERS,
+                thread_name_prefix="inference",
+            )
+    return _executor
+
+
+async def run_inference(fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run a blocking model call on the inference pool and await its result.
+
+    ``fn`` must be a module-level function when the process pool is used,
+    so it can be pickled into the worker.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_inference_executor(), partial(fn, *args))
+
+
+def shutdown_inference_executor() -> None:
+    """Stop the inference pool (called on application shutdown)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
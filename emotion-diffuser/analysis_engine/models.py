@@ -1,34 +1,203 @@
 """
 Model Loading Layer — abstracts HuggingFace pipeline initialization.
 Caches models globally to avoid redundant loading.
+Pipelines run on PyTorch or, via optimum, on ONNX Runtime (fp32 or dynamic int8).
 """
 
+import platform
+from pathlib import Path
+
 from transformers import pipeline
 from backend import config
 
+# Inference backends selectable with INFERENCE_BACKEND
+BACKENDS = ("pytorch", "onnx", "onnx-int8")
+
 # Global cache for pipelines
 _emotion_pipe = None
 _toxicity_pipe = None
+_multihead = None
 
 def get_emotion_pipeline():
     """Returns the singleton emotion classification pipeline."""
     global _emotion_pipe
     if _emotion_pipe is None:
-        print(f"[LOAD] Loading emotion model: {config.EMOTION_MODEL}...")
-        _emotion_pipe = pipeline(
-            "text-classification",
-            model=config.EMOTION_MODEL,
-            top_k=None  # Return all scores
-        )
+        _emotion_pipe = build_emotion_pipeline()
     return _emotion_pipe
 
 def get_toxicity_pipeline():
     """Returns the singleton toxicity classification pipeline."""
     global _toxicity_pipe
     if _toxicity_pipe is None:
-        print(f"[LOAD] Loading toxicity model: {config.TOXICITY_MODEL}...")
-        _toxicity_pipe = pipeline(
-            "text-classification",
-            model=config.TOXICITY_MODEL
-        )
+        _toxicity_pipe = build_toxicity_pipeline()
     return _toxicity_pipe
+
+def get_multihead_analyzer():
+    """Returns the singleton shared-encoder analyzer (see multihead.py)."""
+    global _multihead
+    if _multihead is None:
+        if not Path(config.MULTIHEAD_TOXICITY_HEAD_PATH).exists():
+            raise RuntimeError(
+                f"No toxicity head at {config.MULTIHEAD_TOXICITY_HEAD_PATH} — "
+                "train one with: python -m analysis_engine.multihead messages.txt"
+            )
+        # Imported lazily: it needs torch even when the ONNX backends are in use
+        from .multihead import MultiHeadAnalyzer
+
+        print(f"[LOAD] Loading shared-encoder analyzer: {config.EMOTION_MODEL} "
+              f"+ toxicity head {config.MULTIHEAD_TOXICITY_HEAD_PATH}...")
+        _multihead = MultiHeadAnalyzer(config.EMOTION_MODEL, head_path=config.MULTIHEAD_TOXICITY_HEAD_PATH)
+    return _multihead
+
+def build_emotion_pipeline(backend: str | None = None):
+    """A new emotion pipeline on the given backend (default: config.INFERENCE_BACKEND)."""
+    backend = backend or config.INFERENCE_BACKEND
+    print(f"[LOAD] Loading emotion model: {config.EMOTION_MODEL} ({backend})...")
+    return _build_pipeline(config.EMOTION_MODEL, backend, top_k=None)  # Return all scores
+
+def build_toxicity_pipeline(backend: str | None = None):
+    """A new toxicity pipeline on the given backend (default: config.INFERENCE_BACKEND)."""
+    backend = backend or config.INFERENCE_BACKEND
+    print(f"[LOAD] Loading toxicity model: {config.TOXICITY_MODEL} ({backend})...")
+    return _build_pipeline(config.TOXICITY_MODEL, backend)
+
+# ────────────────────────────────────────
+# Inference backends
+# ────────────────────────────────────────
+
+def _build_pipeline(model_id: str, backend: str, **kwargs):
+    """text-classification pipeline for a model; ONNX models produce the same output format."""
+    if backend == "pytorch":
+        return pipeline("text-classification", model=model_id, **kwargs)
+    if backend in ("onnx", "onnx-int8"):
+        model, tokenizer = _load_onnx_model(model_id, quantized=backend == "onnx-int8")
+        return pipeline("text-classification", model=model, tokenizer=tokenizer, **kwargs)
+    raise ValueError(f"Unknown INFERENCE_BACKEND {backend!r} — expected one of {BACKENDS}")
+
+def _onnx_model_dir(model_id: str, quantized: bool) -> Path:
+    """Where the exported (and quantized) copy of a model is stored."""
+    return Path(config.ONNX_MODEL_DIR) / model_id.replace("/", "--") / ("int8" if quantized else "fp32")
+
+def _load_onnx_model(model_id: str, quantized: bool):
+    """
+    Load a model on ONNX Runtime, exporting it (and quantizing it to dynamic
+    int8) on first use. Exports are kept under ONNX_MODEL_DIR.
+    """
+    try:
+        from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    except ImportError as e:
+        raise RuntimeError(
+            "The ONNX backends need optimum with onnxruntime: pip install 'optimum[onnxruntime]'"
+        ) from e
+    from transformers import AutoConfig, AutoTokenizer
+
+    fp32_dir = _onnx_model_dir(model_id, quantized=False)
+    if not (fp32_dir / "model.onnx").exists():
+        print(f"[LOAD] Exporting {model_id} to ONNX...")
+        ORTModelForSequenceClassification.from_pretrained(model_id, export=True).save_pretrained(fp32_dir)
+        AutoTokenizer.from_pretrained(model_id).save_pretrained(fp32_dir)
+
+    model_dir, file_name = fp32_dir, "model.onnx"
+    if quantized:
+        int8_dir = _onnx_model_dir(model_id, quantized=True)
+        if not (int8_dir / "model_quantized.onnx").exists():
+            print(f"[LOAD] Quantizing {model_id} to dynamic int8...")
+            arm = platform.machine().lower() in ("arm64", "aarch64")
+            qconfig = (AutoQuantizationConfig.arm64 if arm else AutoQuantizationConfig.avx2)(
+                is_static=False, per_channel=False
+            )
+            ORTQuantizer.from_pretrained(fp32_dir).quantize(save_dir=int8_dir, quantization_config=qconfig)
+            AutoConfig.from_pretrained(fp32_dir).save_pretrained(int8_dir)
+            AutoTokenizer.from_pretrained(fp32_dir).save_pretrained(int8_dir)
+        model_dir, file_name = int8_dir, "model_quantized.onnx"
+
+    model = ORTModelForSequenceClassification.from_pretrained(model_dir, file_name=file_name)
+    return model, AutoTokenizer.from_pretrained(model_dir)
+
+# ────────────────────────────────────────
+# Inference entrypoints (run on the inference executor)
+# ────────────────────────────────────────
+
+def predict_emotions(texts: list[str]) -> list[list[dict]]:
+    """Run the emotion pipeline and return one list of label scores per text."""
+    texts = list(texts)
+    return get_emotion_pipeline()(texts, batch_size=max(1, len(texts)), truncation=True)
+
+def predict_toxicity(texts: list[str]) -> list[dict]:
+    """Run the toxicity pipeline and return one top-label dict per text."""
+    texts = list(texts)
+    return get_toxicity_pipeline()(texts, batch_size=max(1, len(texts)), truncation=True)
+
+def predict_combined(texts: list[str]) -> list[tuple[list[dict], dict]]:
+    """One shared-encoder pass; returns an (emotions, toxicity) pair per text."""
+    return get_multihead_analyzer()(list(texts))
+
+# Representative inputs at a few sequence lengths (short / medium / long)
+WARMUP_TEXTS = [
+    "Okay.",
+    "I'm honestly upset about what happened yesterday and I think we need to talk. " * 3,
+    "I keep going over what was said and it still bothers me more than I expected. " * 12,
+]
+
+def warm_up_models() -> None:
+    """Load the models and run warm-up passes across WARMUP_TEXTS."""
+    for text in WARMUP_TEXTS:
+        if config.ENABLE_MULTIHEAD_ANALYZER:
+            predict_combined([text])
+        else:
+            predict_emotions([text])
+            predict_toxicity([text])
+
+# ────────────────────────────────────────
+# Accuracy drift between backends
+# ────────────────────────────────────────
+
+def compare_outputs(
+    reference_emotions: list[list[dict]],
+    candidate_emotions: list[list[dict]],
+    reference_toxicity: list[dict],
+    candidate_toxicity: list[dict],
+) -> dict:
+    """
+    Drift of a candidate backend's outputs against reference outputs for the same texts:
+    top-label agreement and the largest absolute score difference, per model.
+    """
+    n = len(reference_emotions)
+    emotion_agree = 0
+    emotion_diff = 0.0
+    for ref, cand in zip(reference_emotions, candidate_emotions):
+        ref_scores = {r["label"]: r["score"] for r in ref}
+        cand_scores = {c["label"]: c["score"] for c in cand}
+        emotion_agree += max(ref_scores, key=ref_scores.get) == max(cand_scores, key=cand_scores.get)
+        emotion_diff = max(emotion_diff, *(abs(ref_scores[k] - cand_scores.get(k, 0.0)) for k in ref_scores))
+
+    toxicity_agree = 0
+    toxicity_diff = 0.0
+    for ref, cand in zip(reference_toxicity, candidate_toxicity):
+        if ref["label"] == cand["label"]:
+            toxicity_agree += 1
+            toxicity_diff = max(toxicity_diff, abs(ref["score"] - cand["score"]))
+        else:
+            # Binary head: a flipped label means the scores sit either side of 0.5
+            toxicity_diff = max(toxicity_diff, abs(ref["score"] - (1 - cand["score"])))
+
+    return {
+        "texts": n,
+        "emotion_top_label_agreement": emotion_agree / n if n else 1.0,
+        "emotion_max_score_diff": round(emotion_diff, 6),
+        "toxicity_label_agreement": toxicity_agree / n if n else 1.0,
+        "toxicity_max_score_diff": round(toxicity_diff, 6),
+    }
+
+def measure_drift(texts: list[str], backend: str, reference: str = "pytorch") -> dict:
+    """Run both models on two backends and compare their outputs (see compare_outputs)."""
+    texts = list(texts)
+    batch = max(1, len(texts))
+    ref_emotions = build_emotion_pipeline(reference)(texts, batch_size=batch)
+    ref_toxicity = build_toxicity_pipeline(reference)(texts, batch_size=batch)
+    cand_emotions = build_emotion_pipeline(backend)(texts, batch_size=batch)
+    cand_toxicity = build_toxicity_pipeline(backend)(texts, batch_size=batch)
+    return {"backend": backend, "reference": reference, **compare_outputs(
+        ref_emotions, cand_emotions, ref_toxicity, cand_toxicity
+    )}
@@ -0,0 +1,126 @@
+"""
+Shared-encoder analyzer — one tokenization and one encoder pass per text,
+with two classification heads on top of it.
+
+The emotion model (DistilRoBERTa) and the toxicity model (DistilBERT) use
+different tokenizers and encoders, so they can't simply share weights.
+Instead the emotion model's encoder is shared: its own classifier gives the
+emotion distribution, and a small linear toxicity head on the same [CLS]
+features is distilled from the toxicity model (distill_toxicity_head).
+The two-pipeline path in models.py remains the reference implementation.
+"""
+
+import torch
+from backend import config
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+# Toxicity head output order (matches the toxicity model's label names)
+TOXICITY_LABELS = ("non-toxic", "toxic")
+
+
+class MultiHeadAnalyzer:
+    """
+    Emotion model plus a toxicity head sharing its encoder.
+
+    Calling it on a list of texts returns one ``(emotions, toxicity)`` pair per
+    text, in the same formats the two pipelines produce: all emotion labels
+    sorted by score, and the top toxicity ``{"label", "score"}``.
+    """
+
+    def __init__(self, model_id: str, head_path: str | None = None, max_length: int = 512):
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        self.model = AutoModelForSequenceClassification.from_pretrained(model_id).eval()
+        self.max_length = max_length
+        self.labels = [self.model.config.id2label[i] for i in range(self.model.config.num_labels)]
+        self.toxicity_head = torch.nn.Linear(self.model.config.hidden_size, len(TOXICITY_LABELS)).eval()
+        if head_path:
+            self.toxicity_head.load_state_dict(torch.load(head_path, map_location="cpu"))
+
+    @torch.inference_mode()
+    def encode(self, texts: list[str]) -> tuple[torch.Tensor, torch.Tensor]:
+        """One encoder pass: emotion logits and the [CLS] features for the toxicity head."""
+        inputs = self.tokenizer(
+            list(texts), padding=True, truncation=True, max_length=self.max_length, return_tensors="pt"
+        )
+        output = self.model(**inputs, output_hidden_states=True)
+        return output.logits, output.hidden_states[-1][:, 0]
+
+    @torch.inference_mode()
+    def __call__(self, texts: list[str]) -> list[tuple[list[dict], dict]]:
+        logits, features = self.encode(texts)
+        emotion_probs = logits.softmax(dim=-1).tolist()
+        toxicity_probs = self.toxicity_head(features).softmax(dim=-1).tolist()
+        return [
+            format_outputs(self.labels, emotions, toxicity)
+            for emotions, toxicity in zip(emotion_probs, toxicity_probs)
+        ]
+
+
+def format_outputs(
+    labels: list[str], emotion_probs: list[float], toxicity_probs: list[float]
+) -> tuple[list[dict], dict]:
+    """Shape one text's head outputs like the emotion and toxicity pipelines do."""
+    emotions = sorted(
+        ({"label": label, "score": score} for label, score in zip(labels, emotion_probs)),
+        key=lambda e: e["score"],
+        reverse=True,
+    )
+    top = max(range(len(TOXICITY_LABELS)), key=toxicity_probs.__getitem__)
+    return emotions, {"label": TOXICITY_LABELS[top], "score": toxicity_probs[top]}
+
+
+def distill_toxicity_head(
+    texts: list[str],
+    path: str | None = None,
+    epochs: int = 300,
+    lr: float = 1e-2,
+    batch_size: int = 32,
+) -> dict:
+    """
+    Train the toxicity head on the emotion encoder's features to match the
+    toxicity model's predictions on ``texts``, save it to ``path`` (default
+    config.MULTIHEAD_TOXICITY_HEAD_PATH), and report agreement with the teacher.
+    """
+    from pathlib import Path
+    from .models import build_toxicity_pipeline
+
+    path = path or config.MULTIHEAD_TOXICITY_HEAD_PATH
+    texts = list(texts)
+    analyzer = MultiHeadAnalyzer(config.EMOTION_MODEL)
+    teacher = build_toxicity_pipeline("pytorch")(texts, batch_size=batch_size)
+    p_toxic = torch.tensor([
+        t["score"] if t["label"].lower() == "toxic" else 1.0 - t["score"] for t in teacher
+    ])
+    targets = torch.stack([1.0 - p_toxic, p_toxic], dim=1)
+
+    # Features come out of inference mode; clone them so autograd can use them
+    features = torch.cat([
+        analyzer.encode(texts[i:i + batch_size])[1] for i in range(0, len(texts), batch_size)
+    ]).clone()
+
+    head = analyzer.toxicity_head.train()
+    optimizer = torch.optim.Adam(head.parameters(), lr=lr)
+    for _ in range(epochs):
+        optimizer.zero_grad()
+        loss = -(targets * head(features).log_softmax(dim=-1)).sum(dim=-1).mean()
+        loss.backward()
+        optimizer.step()
+    head.eval()
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    torch.save(head.state_dict(), path)
+
+    with torch.no_grad():
+        predicted = head(features).argmax(dim=-1)
+    agreement = (predicted == targets.argmax(dim=-1)).float().mean().item()
+    return {"texts": len(texts), "loss": round(loss.item(), 4), "toxicity_label_agreement": agreement, "path": path}
+
+
+if __name__ == "__main__":
+    # python -m analysis_engine.multihead messages.txt  (one message per line)
+    import json
+    import sys
+
+    with open(sys.argv[1], encoding="utf-8") as f:
+        lines = [line.strip() for line in f if line.strip()]
+    print(json.dumps(distill_toxicity_head(lines), indent=2))
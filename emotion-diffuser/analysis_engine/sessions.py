@@ -0,0 +1,71 @@
+"""
+Conversation sessions — running engagement counters per conversation, so a
+trigger check only has to look at the messages added since the last one.
+"""
+
+from collections import Counter, deque
+
+from backend.schemas import AnalysisOut
+from .utils import count_engagement, signals_from_counts
+
+
+class ConversationSession:
+    """
+    Running state of one conversation.
+
+    Adding n messages costs O(n); signals() is O(1) however long the
+    conversation gets. Only the most recent analyses are kept.
+
+    Parameters
+    ----------
+    relationship : str
+        Relationship mode used to pick re-engagement triggers.
+    context : str, optional
+        Free-text context about the conversation.
+    analyze : bool
+        Whether new messages are run through the analysis models.
+    max_recent : int
+        How many per-message analyses to keep.
+    """
+
+    def __init__(
+        self,
+        relationship: str = "neutral",
+        context: str | None = None,
+        analyze: bool = True,
+        max_recent: int = 20,
+    ):
+        self.relationship = relationship
+        self.context = context
+        self.analyze = analyze
+        self.message_count = 0
+        self.short_count = 0
+        self.question_count = 0
+        self.toxic_count = 0
+        self.emotion_counts: Counter[str] = Counter()
+        self.recent_analyses: deque[AnalysisOut] = deque(maxlen=max_recent)
+
+    def add_messages(self, messages: list[str]) -> None:
+        """Fold new messages into the engagement counters."""
+        short_count, question_count = count_engagement(messages)
+        self.message_count += len(messages)
+        self.short_count += short_count
+        self.question_count += question_count
+
+    def add_analyses(self, analyses: list[AnalysisOut]) -> None:
+        """Fold the analyses of new messages into the emotion and toxicity counters."""
+        for analysis in analyses:
+            self.emotion_counts[analysis.emotion] += 1
+            self.toxic_count += analysis.is_toxic
+            self.recent_analyses.append(analysis)
+
+    def signals(self) -> list[str]:
+        """Disengagement signals for the whole conversation so far."""
+        return signals_from_counts(self.message_count, self.short_count, self.question_count)
+
+    @property
+    def dominant_emotion(self) -> str | None:
+        """Most frequent primary emotion across analyzed messages."""
+        if not self.emotion_counts:
+            return None
+        return self.emotion_counts.most_common(1)[0][0]
@@ -36,15 +36,23 @@ def detect_disengagement_signals(messages: List[str]) -> List[str]:
     """
     Analyze a list of messages for disengagement signals (heuristic-based).
     """
-    signals = []
-    if not messages:
-        return signals
+    short_count, question_count = count_engagement(messages)
+    return signals_from_counts(len(messages), short_count, question_count)
 
+def count_engagement(messages: List[str]) -> Tuple[int, int]:
+    """(short-response count, question count) for some messages — summable across batches."""
     short_count = sum(1 for m in messages if len(m.split()) <= 3)
     question_count = sum(1 for m in messages if "?" in m)
+    return short_count, question_count
+
+def signals_from_counts(message_count: int, short_count: int, question_count: int) -> List[str]:
+    """Disengagement signals from running counters over a whole conversation."""
+    signals = []
+    if not message_count:
+        return signals
 
     # If more than 50% of responses are very short
-    if short_count > len(messages) * 0.5:
+    if short_count > message_count * 0.5:
         signals.append("short_responses")
     
     # If no questions are being asked to keep the conversation going
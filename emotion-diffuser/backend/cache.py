@@ -0,0 +1,317 @@
+"""
+Caching primitives — bounded LRU/TTL caches, content-hash keys, and
+single-flight coalescing of identical in-flight work.
+Shared by the analysis and mediator engines so repeated work costs a lookup.
+"""
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form of a message for cache keys: NFC, trimmed, single-spaced."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def content_key(*parts: Any) -> str:
+    """Stable SHA-256 key over the given parts (order matters)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x1f")  # unit separator so ("ab", "c") != ("a", "bc")
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """
+    In-memory LRU cache with an optional time-to-live.
+
+    Parameters
+    ----------
+    max_entries : int
+        Least-recently-used entries are evicted beyond this size.
+    ttl_seconds : float, optional
+        Entries older than this are treated as misses. ``None`` means no expiry.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the cached value (refreshing its recency) or ``default``."""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        stored_at, value = entry
+        if self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds:
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a value, evicting the least recently used entries if full."""
+        if self.max_entries <= 0:
+            return
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        """Remove and return a value without touching the hit/miss counters."""
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        """Drop every entry (counters are kept)."""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """Hit/miss/eviction counters for the metrics endpoint."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class SQLiteCache:
+    """
+    Persistent string cache in a local SQLite file, shared by every worker on a node.
+
+    Values survive restarts. Least-recently-read entries are evicted once the
+    table grows past ``max_entries``; entries older than ``ttl_seconds`` are misses.
+    Reads only write back their recency once per ``_TOUCH_AFTER_S``, so hot
+    keys don't turn every lookup into a write transaction. When another
+    process holds the lock for longer than ``busy_timeout_s``, a lookup is a
+    miss and a store is skipped rather than stalling the caller.
+
+    Parameters
+    ----------
+    path : str
+        Database file (created if missing).
+    max_entries : int
+        Size bound enforced on writes.
+    ttl_seconds : float, optional
+        Entry lifetime. ``None`` means no expiry.
+    busy_timeout_s : float
+        How long to wait for a lock held by another worker.
+    """
+
+    # Enforce the size bound every N writes rather than on each one
+    _EVICT_EVERY = 32
+    # Minimum age of a recorded read before a hit refreshes it
+    _TOUCH_AFTER_S = 60.0
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 100_000,
+        ttl_seconds: Optional[float] = None,
+        busy_timeout_s: float = 0.05,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.lock_timeouts = 0
+        self._writes = 0
+        # One connection shared by the threads cache I/O is offloaded to
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=busy_timeout_s, check_same_thread=False, isolation_level=None)
+        # WAL lets several worker processes read while one writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " stored_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """Return the stored string (marking it recently used) or ``default``."""
+        with self._lock:
+            try:
+                return self._get(key, default)
+            except sqlite3.OperationalError:
+                # Locked by another worker: a miss is cheaper than waiting
+                self.lock_timeouts += 1
+                self.misses += 1
+                return default
+
+    def _get(self, key: str, default: Optional[str]) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT value, stored_at, accessed_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return default
+
+        value, stored_at, accessed_at = row
+        now = time.time()
+        if self.ttl_seconds is not None and now - stored_at > self.ttl_seconds:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        if now - accessed_at > self._TOUCH_AFTER_S:
+            self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """Store a string, trimming the table back to ``max_entries`` periodically."""
+        if self.max_entries <= 0:
+            return
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now),
+                )
+                self._writes += 1
+                if self._writes % self._EVICT_EVERY == 0:
+                    self._evict()
+            except sqlite3.OperationalError:
+                self.lock_timeouts += 1
+
+    def _evict(self) -> None:
+        """Delete the least recently read rows beyond ``max_entries``."""
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+            self.evictions += excess
+
+    def clear(self) -> None:
+        """Drop every entry (counters are kept)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def stats(self) -> dict:
+        """Hit/miss/eviction counters for this process (the table is shared)."""
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "size": len(self),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "lock_timeouts": self.lock_timeouts,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical work: callers with the same key while a call
+    is in flight share its result (or exception) instead of repeating it.
+
+    The shared call runs as its own task, so it still finishes — and fills any
+    cache behind it — if the caller that started it is cancelled.
+
+    Example
+    -------
+    >>> flights = SingleFlight()
+    >>> result = await flights.do(key, lambda: expensive(text))
+    """
+
+    def __init__(self):
+        self._in_flight: dict[str, asyncio.Task] = {}
+        self._leaders = 0
+        self._coalesced = 0
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[T]],
+        share: Optional[Callable[[T], T]] = None,
+    ) -> T:
+        """
+        Await ``fn()`` once per key at a time. ``share`` (e.g. a deep copy) is
+        applied to the result for every caller when results are mutable.
+        """
+        task = self._in_flight.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            self._coalesced += 1
+        else:
+            self._leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+
+        result = await asyncio.shield(task)
+        return share(result) if share is not None else result
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved: no "never retrieved" warning if every caller left
+
+    def stats(self) -> dict:
+        """Leader / coalesced call counters."""
+        total = self._leaders + self._coalesced
+        return {
+            "in_flight": len(self._in_flight),
+            "leaders": self._leaders,
+            "coalesced": self._coalesced,
+            "coalesced_rate": round(self._coalesced / total, 4) if total else 0.0,
+        }
@@ -15,6 +15,8 @@ load_dotenv()
 
 OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
 GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
+# Point the OpenAI client at another OpenAI-compatible server (e.g. a local fake)
+OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "")
 
 # ────────────────────────────────────────
 # Model Configuration
@@ -23,6 +25,109 @@ GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
 EMOTION_MODEL: str = os.getenv("EMOTION_MODEL", "j-hartmann/emotion-english-distilroberta-base")
 TOXICITY_MODEL: str = os.getenv("TOXICITY_MODEL", "martin-ha/toxic-comment-model")
 LLM_MODEL: str = os.getenv("LLM_MODEL", "gpt-3.5-turbo")
+GEMINI_MODEL: str = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+
+# ────────────────────────────────────────
+# Inference Settings
+# ────────────────────────────────────────
+
+# Model runtime: "pytorch", "onnx" (ONNX Runtime fp32) or "onnx-int8" (dynamic int8 quantized)
+INFERENCE_BACKEND: str = os.getenv("INFERENCE_BACKEND", "pytorch").lower()
+# Where exported / quantized ONNX models are kept
+ONNX_MODEL_DIR: str = os.getenv("ONNX_MODEL_DIR", ".cache/onnx")
+# Shared-encoder analyzer: one emotion-encoder pass feeds both the emotion head
+# and a distilled toxicity head (PyTorch only; see analysis_engine/multihead.py)
+ENABLE_MULTIHEAD_ANALYZER: bool = os.getenv("ENABLE_MULTIHEAD_ANALYZER", "false").lower() == "true"
+MULTIHEAD_TOXICITY_HEAD_PATH: str = os.getenv("MULTIHEAD_TOXICITY_HEAD_PATH", ".cache/toxicity_head.pt")
+# Where blocking model forward passes run: "thread" or "process"
+INFERENCE_EXECUTOR: str = os.getenv("INFERENCE_EXECUTOR", "thread").lower()
+# Max forward passes running at once (size of the inference pool).
+# Keep >= 2 so the emotion and toxicity models can run side by side.
+INFERENCE_WORKERS: int = int(os.getenv("INFERENCE_WORKERS", "2"))
+# Collect concurrent requests into one batched forward pass per model
+ENABLE_MICRO_BATCHING: bool = os.getenv("ENABLE_MICRO_BATCHING", "true").lower() == "true"
+# Flush a micro-batch once it holds this many texts...
+MICRO_BATCH_MAX_SIZE: int = int(os.getenv("MICRO_BATCH_MAX_SIZE", "16"))
+# ...or this many milliseconds after its first text arrived
+MICRO_BATCH_MAX_WAIT_MS: float = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "5"))
+# Load and warm up both models at startup; /ready reports 503 until done
+WARMUP_ON_STARTUP: bool = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+# A failed warm-up is retried after this many seconds, doubling up to the max (0 = give up)
+WARMUP_RETRY_BACKOFF_S: float = float(os.getenv("WARMUP_RETRY_BACKOFF_S", "5"))
+WARMUP_RETRY_MAX_BACKOFF_S: float = float(os.getenv("WARMUP_RETRY_MAX_BACKOFF_S", "300"))
+# Messages longer than this are split at sentence boundaries into windows of at
+# most this many characters (~350 tokens, inside the models' 512-token limit)
+ANALYSIS_CHUNK_MAX_CHARS: int = int(os.getenv("ANALYSIS_CHUNK_MAX_CHARS", "1500"))
+# Windows analyzed per message; text beyond this is not analyzed
+ANALYSIS_MAX_CHUNKS: int = int(os.getenv("ANALYSIS_MAX_CHUNKS", "64"))
+# Texts per forward pass when analyzing a whole /batch request
+BATCH_CHUNK_SIZE: int = int(os.getenv("BATCH_CHUNK_SIZE", "32"))
+
+# ────────────────────────────────────────
+# Caching
+# ────────────────────────────────────────
+
+# Max analysis results kept in memory (0 disables the cache)
+ANALYSIS_CACHE_SIZE: int = int(os.getenv("ANALYSIS_CACHE_SIZE", "4096"))
+# Seconds a cached analysis stays valid (0 = until evicted)
+ANALYSIS_CACHE_TTL_S: float = float(os.getenv("ANALYSIS_CACHE_TTL_S", "3600"))
+# Second-tier analysis cache: "none" or "sqlite" (shared by all workers on a node)
+ANALYSIS_CACHE_BACKEND: str = os.getenv("ANALYSIS_CACHE_BACKEND", "none").lower()
+# SQLite file used by the persistent analysis cache
+ANALYSIS_CACHE_PATH: str = os.getenv("ANALYSIS_CACHE_PATH", ".cache/analysis.sqlite3")
+# Max rows kept in the persistent analysis cache
+ANALYSIS_CACHE_DB_MAX_ENTRIES: int = int(os.getenv("ANALYSIS_CACHE_DB_MAX_ENTRIES", "200000"))
+# Recent analyses kept by ID for reuse by /rewrite, /apologize and /pipeline
+ANALYSIS_STORE_SIZE: int = int(os.getenv("ANALYSIS_STORE_SIZE", "10000"))
+# Seconds an analysis ID stays valid
+ANALYSIS_STORE_TTL_S: float = float(os.getenv("ANALYSIS_STORE_TTL_S", "600"))
+# Max LLM responses cached per (prompts, model, temperature) (0 disables)
+LLM_CACHE_SIZE: int = int(os.getenv("LLM_CACHE_SIZE", "2048"))
+# Seconds a cached LLM response stays valid (0 = until evicted)
+LLM_CACHE_TTL_S: float = float(os.getenv("LLM_CACHE_TTL_S", "86400"))
+# LLM response cache backend: "memory" or "sqlite"
+LLM_CACHE_BACKEND: str = os.getenv("LLM_CACHE_BACKEND", "memory").lower()
+# SQLite file used when LLM_CACHE_BACKEND=sqlite
+LLM_CACHE_PATH: str = os.getenv("LLM_CACHE_PATH", ".cache/llm.sqlite3")
+
+# ────────────────────────────────────────
+# Conversation Sessions (/triggers/sessions)
+# ────────────────────────────────────────
+
+# Max live conversations; least recently used are dropped beyond this
+CONVERSATION_STORE_SIZE: int = int(os.getenv("CONVERSATION_STORE_SIZE", "10000"))
+# Seconds without activity before a conversation is evicted (0 = never)
+CONVERSATION_IDLE_TTL_S: float = float(os.getenv("CONVERSATION_IDLE_TTL_S", "1800"))
+# Per-message analyses kept per conversation
+CONVERSATION_RECENT_ANALYSES: int = int(os.getenv("CONVERSATION_RECENT_ANALYSES", "20"))
+
+# ────────────────────────────────────────
+# Live Draft Analysis (/analyze/live WebSocket)
+# ────────────────────────────────────────
+
+# Quiet period after a draft update before it is analyzed; newer updates cancel older ones
+DRAFT_DEBOUNCE_MS: float = float(os.getenv("DRAFT_DEBOUNCE_MS", "300"))
+# Longest draft accepted over the socket
+DRAFT_MAX_CHARS: int = int(os.getenv("DRAFT_MAX_CHARS", "20000"))
+
+# ────────────────────────────────────────
+# Bulk Analysis Jobs (/jobs)
+# ────────────────────────────────────────
+
+# Directory holding each job's input, results and progress (survives restarts)
+JOBS_DIR: str = os.getenv("JOBS_DIR", ".cache/jobs")
+# Jobs processed concurrently; further submissions wait in the queue
+JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "2"))
+# Messages analyzed per batch; progress is checkpointed after each one
+JOB_CHUNK_SIZE: int = int(os.getenv("JOB_CHUNK_SIZE", "256"))
+# Largest number of messages accepted in one upload
+JOB_MAX_MESSAGES: int = int(os.getenv("JOB_MAX_MESSAGES", "1000000"))
+# Seconds between checks for new results when following a running job
+JOB_POLL_INTERVAL_S: float = float(os.getenv("JOB_POLL_INTERVAL_S", "0.5"))
+# Seconds a done or failed job's files are kept after it finishes (0 = forever)
+JOB_RETENTION_S: float = float(os.getenv("JOB_RETENTION_S", str(7 * 24 * 3600)))
+# Longest single line accepted in an NDJSON upload (/jobs and /batch/stream)
+NDJSON_MAX_LINE_BYTES: int = int(os.getenv("NDJSON_MAX_LINE_BYTES", str(1024 * 1024)))
 
 # ────────────────────────────────────────
 # Thresholds
@@ -45,6 +150,64 @@ DEBUG: bool = os.getenv("DEBUG", "true").lower() == "true"
 ENABLE_APOLOGY: bool = os.getenv("ENABLE_APOLOGY", "true").lower() == "true"
 ENABLE_TRIGGERS: bool = os.getenv("ENABLE_TRIGGERS", "true").lower() == "true"
 ENABLE_REWRITE: bool = os.getenv("ENABLE_REWRITE", "true").lower() == "true"
+# /pipeline asks for rewrite + apology in one combined LLM call when both are requested
+ENABLE_FUSED_MEDIATION: bool = os.getenv("ENABLE_FUSED_MEDIATION", "true").lower() == "true"
+
+# ────────────────────────────────────────
+# LLM Admission Control
+# ────────────────────────────────────────
+
+# Max concurrent provider calls (the adaptive limit never exceeds this)
+LLM_MAX_IN_FLIGHT: int = int(os.getenv("LLM_MAX_IN_FLIGHT", "16"))
+# Token budget per minute across all calls (0 = unlimited)
+LLM_TOKENS_PER_MINUTE: int = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+# Completion tokens assumed per call when charging the token budget
+LLM_EXPECTED_COMPLETION_TOKENS: int = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "350"))
+# Calls waiting beyond this queue length are rejected immediately
+LLM_MAX_QUEUE: int = int(os.getenv("LLM_MAX_QUEUE", "256"))
+# Max seconds a call may wait for admission before it is shed
+LLM_QUEUE_TIMEOUT_S: float = float(os.getenv("LLM_QUEUE_TIMEOUT_S", "15"))
+# Calls slower than this shrink the concurrency limit
+LLM_TARGET_LATENCY_S: float = float(os.getenv("LLM_TARGET_LATENCY_S", "8"))
+
+# ────────────────────────────────────────
+# LLM Deadlines, Retries & Hedging
+# ────────────────────────────────────────
+
+# Default deadline for a whole call_llm (queueing + retries + hedges), 0 = none
+LLM_TIMEOUT_S: float = float(os.getenv("LLM_TIMEOUT_S", "25"))
+# Retries on transient errors (timeouts, connection errors, 429, 5xx)
+LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "2"))
+# Base delay for exponential backoff between retries (jittered)
+LLM_RETRY_BACKOFF_S: float = float(os.getenv("LLM_RETRY_BACKOFF_S", "0.5"))
+# Fire a duplicate request when the first is slower than the recent latency quantile
+LLM_HEDGE_ENABLED: bool = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+# Latency quantile that triggers the hedge
+LLM_HEDGE_QUANTILE: float = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+# Successful calls observed before hedging kicks in
+LLM_HEDGE_MIN_SAMPLES: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+# ────────────────────────────────────────
+# LLM Providers
+# ────────────────────────────────────────
+
+# Comma-separated failover order: openai, gemini, fake
+LLM_PROVIDERS: list[str] = [p.strip() for p in os.getenv("LLM_PROVIDERS", "openai").split(",") if p.strip()]
+# Structured output for JSON responses: json_schema, json_object, or off
+LLM_JSON_MODE: str = os.getenv("LLM_JSON_MODE", "json_object").lower()
+# Keep-alive connection pool size per provider
+LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+# Fake provider timing (offline load testing)
+FAKE_LLM_LATENCY_S: float = float(os.getenv("FAKE_LLM_LATENCY_S", "0.3"))
+FAKE_LLM_TOKENS_PER_S: float = float(os.getenv("FAKE_LLM_TOKENS_PER_S", "50"))
+
+# ────────────────────────────────────────
+# Pipeline Stage Timeouts (seconds, 0 = none)
+# ────────────────────────────────────────
+
+PIPELINE_REWRITE_TIMEOUT_S: float = float(os.getenv("PIPELINE_REWRITE_TIMEOUT_S", "30"))
+PIPELINE_APOLOGY_TIMEOUT_S: float = float(os.getenv("PIPELINE_APOLOGY_TIMEOUT_S", "30"))
+PIPELINE_TRIGGERS_TIMEOUT_S: float = float(os.getenv("PIPELINE_TRIGGERS_TIMEOUT_S", "5"))
 
 # ────────────────────────────────────────
 # Server Settings
@@ -0,0 +1,361 @@
+"""
+Bulk analysis jobs — NDJSON uploads analyzed in the background.
+
+Each job lives in its own directory under JOBS_DIR:
+``input.ndjson`` (validated messages), ``results.ndjson`` (one AnalysisOut
+per line, in input order) and ``meta.json`` (status and progress). Progress is
+checkpointed after every chunk, so a restarted worker picks up where it stopped.
+Finished jobs are deleted JOB_RETENTION_S after they last changed.
+"""
+
+import asyncio
+import fcntl
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from typing import IO, AsyncIterator, Optional
+
+from backend import config, orchestrator
+from backend.ndjson import NDJSONError, aiter_messages
+
+# Statuses a job can still make progress from; resumed on startup
+_RESUMABLE = ("queued", "running")
+_FINISHED = ("done", "failed")
+
+# Seconds between sweeps for expired jobs; each sweep also recounts statuses
+_SWEEP_INTERVAL_S = 60.0
+
+_READ_SIZE = 64 * 1024
+
+# Job IDs are uuid4 hex; anything else is never a path under JOBS_DIR
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+
+class JobInputError(NDJSONError):
+    """An upload is empty or has more than JOB_MAX_MESSAGES messages."""
+
+
+class JobManager:
+    """
+    Queue of bulk analysis jobs backed by a local directory.
+
+    Several server processes can share one ``root``: job state is always read
+    from disk, and a worker holds an exclusive ``flock`` on a job while it
+    runs it, so each job is processed by one worker at a time. On startup
+    every process queues the unfinished jobs; whichever gets the lock first
+    resumes a job and the others skip it.
+
+    Parameters
+    ----------
+    root : str
+        Directory holding one subdirectory per job (created if missing).
+    workers : int
+        Jobs processed concurrently by this process.
+    chunk_size : int
+        Messages analyzed per batch and per progress checkpoint.
+    retention_s : float
+        Seconds a done or failed job is kept after it last changed (0 = forever).
+    """
+
+    def __init__(self, root: str, workers: int = 2, chunk_size: int = 256, retention_s: float = 0):
+        self.root = root
+        self.workers = max(1, workers)
+        self.chunk_size = max(1, chunk_size)
+        self.retention_s = retention_s
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Job counts by status for /metrics: recounted from disk by every sweep,
+        # and kept current in between by this process's own transitions
+        self._counts = _count_statuses([])
+        os.makedirs(root, exist_ok=True)
+
+    # ── Lifecycle ─────────────────────────
+
+    def start(self) -> None:
+        """Launch the workers and queue jobs left unfinished by a restart."""
+        loop = asyncio.get_running_loop()
+        if self._tasks and self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        metas = self._all_meta()
+        self._counts = _count_statuses(metas)
+        resumable = sorted(
+            (meta for meta in metas if meta["status"] in _RESUMABLE),
+            key=lambda meta: meta["created_at"],
+        )
+        for meta in resumable:
+            self._queue.put_nowait(meta["job_id"])
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+
+    async def stop(self) -> None:
+        """Cancel the workers; unfinished jobs resume from their last checkpoint."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._loop = None
+
+    # ── Public API ────────────────────────
+
+    async def submit(self, chunks: AsyncIterator[bytes]) -> dict:
+        """
+        Store an NDJSON upload (one MessageIn object per line) and queue it.
+        Raises NDJSONError, leaving nothing behind, if the upload is invalid.
+        """
+        # Started before the job exists on disk, so start() doesn't queue it too
+        self.start()
+        job_id = uuid.uuid4().hex
+        directory = self._path(job_id)
+        await asyncio.to_thread(os.makedirs, directory)
+        total = 0
+        try:
+            f = await asyncio.to_thread(open, os.path.join(directory, "input.ndjson"), "w", encoding="utf-8")
+            try:
+                lines: list[str] = []
+                async for message in aiter_messages(chunks):
+                    total += 1
+                    if total > config.JOB_MAX_MESSAGES:
+                        raise JobInputError(f"More than {config.JOB_MAX_MESSAGES} messages")
+                    lines.append(json.dumps({"text": message.text}) + "\n")
+                    if len(lines) >= self.chunk_size:
+                        await asyncio.to_thread(f.writelines, lines)
+                        lines = []
+                await asyncio.to_thread(f.writelines, lines)
+            finally:
+                await asyncio.to_thread(f.close)
+            if total == 0:
+                raise JobInputError("Upload contains no messages")
+        except BaseException:
+            await asyncio.to_thread(shutil.rmtree, directory, ignore_errors=True)
+            raise
+
+        now = time.time()
+        meta = {
+            "job_id": job_id,
+            "status": "queued",
+            "total": total,
+            "processed": 0,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            # Byte offsets of the last checkpoint, for resuming
+            "input_offset": 0,
+            "results_offset": 0,
+        }
+        await asyncio.to_thread(self._create, meta)
+        self._counts["queued"] += 1
+        self._queue.put_nowait(job_id)
+        return meta
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """The job's metadata as last checkpointed by any worker, or None if unknown."""
+        if not _JOB_ID.fullmatch(job_id):
+            return None
+        return self._read_meta(job_id)
+
+    def delete(self, job_id: str) -> bool:
+        """
+        Remove a job's files. False if unknown. A worker running the job
+        notices the missing directory after its current batch and stops.
+        """
+        meta = self.get(job_id)
+        if meta is None:
+            return False
+        shutil.rmtree(self._path(job_id), ignore_errors=True)
+        self._counts[meta["status"]] = max(0, self._counts[meta["status"]] - 1)
+        return True
+
+    async def iter_results(self, job_id: str, follow: bool = False) -> AsyncIterator[bytes]:
+        """
+        Yield the job's checkpointed results as NDJSON bytes.
+        With ``follow``, keep yielding new results until the job stops running.
+        """
+        position = 0
+        f = await asyncio.to_thread(open, os.path.join(self._path(job_id), "results.ndjson"), "rb")
+        try:
+            while True:
+                meta = await asyncio.to_thread(self.get, job_id)
+                if meta is None:
+                    return
+                running = meta["status"] in _RESUMABLE
+                end = meta["results_offset"]
+                while position < end:
+                    data = await asyncio.to_thread(f.read, min(_READ_SIZE, end - position))
+                    position += len(data)
+                    yield data
+                if not (follow and running):
+                    return
+                await asyncio.sleep(config.JOB_POLL_INTERVAL_S)
+        finally:
+            f.close()
+
+    def stats(self) -> dict:
+        """Job counts by status, for /metrics; no disk access."""
+        return dict(self._counts)
+
+    # ── Processing ────────────────────────
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            lock = self._try_lock(job_id)
+            if lock is None:
+                continue  # another worker has it, or it was deleted
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                meta = await asyncio.to_thread(self._read_meta, job_id)
+                if meta is not None:
+                    self._count(meta["status"], "failed")
+                    meta["status"] = "failed"
+                    meta["error"] = str(e)
+                    await asyncio.to_thread(self._checkpoint, meta)
+            finally:
+                lock.close()
+
+    async def _sweeper(self) -> None:
+        while True:
+            await asyncio.to_thread(self._sweep)
+            await asyncio.sleep(_SWEEP_INTERVAL_S)
+
+    async def _run(self, job_id: str) -> None:
+        # Read under the lock: another worker may have advanced or finished it
+        meta = await asyncio.to_thread(self._read_meta, job_id)
+        if meta is None or meta["status"] not in _RESUMABLE:
+            return
+        self._count(meta["status"], "running")
+        meta["status"] = "running"
+        await asyncio.to_thread(self._checkpoint, meta)
+
+        directory = self._path(job_id)
+        src, dst = await asyncio.to_thread(self._open_job_files, meta)
+        try:
+            while meta["processed"] < meta["total"]:
+                count = min(self.chunk_size, meta["total"] - meta["processed"])
+                lines = await asyncio.to_thread(lambda: [src.readline() for _ in range(count)])
+                texts = [json.loads(line)["text"] for line in lines]
+                results = await orchestrator.analyze_texts(texts)
+                data = b"".join(result.model_dump_json().encode("utf-8") + b"\n" for result in results)
+                if not await asyncio.to_thread(self._save_batch, directory, meta, src, dst, data, len(texts)):
+                    return  # deleted while the batch ran
+            self._count("running", "done")
+        finally:
+            src.close()
+            dst.close()
+
+    # ── Storage ───────────────────────────
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.root, job_id)
+
+    def _try_lock(self, job_id: str) -> Optional[IO]:
+        """Exclusive, non-blocking lock on a job; None if it's held elsewhere or gone."""
+        try:
+            f = open(os.path.join(self._path(job_id), "lock"), "a")
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return None
+        return f
+
+    def _count(self, old: str, new: str) -> None:
+        self._counts[old] = max(0, self._counts[old] - 1)
+        self._counts[new] += 1
+
+    def _sweep(self) -> None:
+        """Delete finished jobs past the retention period and recount the rest."""
+        cutoff = time.time() - self.retention_s
+        kept = []
+        for meta in self._all_meta():
+            if self.retention_s and meta["status"] in _FINISHED and meta["updated_at"] < cutoff:
+                shutil.rmtree(self._path(meta["job_id"]), ignore_errors=True)
+            else:
+                kept.append(meta)
+        self._counts = _count_statuses(kept)
+
+    def _create(self, meta: dict) -> None:
+        open(os.path.join(self._path(meta["job_id"]), "results.ndjson"), "wb").close()
+        self._write_meta(meta)
+
+    def _open_job_files(self, meta: dict) -> tuple[IO[bytes], IO[bytes]]:
+        """The job's input and results files, positioned at its last checkpoint."""
+        directory = self._path(meta["job_id"])
+        src = open(os.path.join(directory, "input.ndjson"), "rb")
+        dst = open(os.path.join(directory, "results.ndjson"), "r+b")
+        src.seek(meta["input_offset"])
+        # Drop results written after the last checkpoint by an interrupted run
+        dst.truncate(meta["results_offset"])
+        dst.seek(meta["results_offset"])
+        return src, dst
+
+    def _save_batch(self, directory: str, meta: dict, src: IO[bytes], dst: IO[bytes], data: bytes, count: int) -> bool:
+        """Append a batch's results durably and checkpoint; False if the job was deleted."""
+        if not os.path.isdir(directory):
+            return False
+        dst.write(data)
+        dst.flush()
+        os.fsync(dst.fileno())
+        meta["processed"] += count
+        meta["input_offset"] = src.tell()
+        meta["results_offset"] = dst.tell()
+        if meta["processed"] >= meta["total"]:
+            meta["status"] = "done"
+        self._checkpoint(meta)
+        return True
+
+    def _all_meta(self) -> list[dict]:
+        metas = (self._read_meta(job_id) for job_id in os.listdir(self.root))
+        return [meta for meta in metas if meta is not None]
+
+    def _checkpoint(self, meta: dict) -> None:
+        meta["updated_at"] = time.time()
+        self._write_meta(meta)
+
+    def _write_meta(self, meta: dict) -> None:
+        path = os.path.join(self._path(meta["job_id"]), "meta.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, path)
+
+    def _read_meta(self, job_id: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(self._path(job_id), "meta.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+def _count_statuses(metas: list[dict]) -> dict:
+    counts = dict.fromkeys(_RESUMABLE + _FINISHED, 0)
+    for meta in metas:
+        counts[meta["status"]] += 1
+    return counts
+
+
+_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    """The process-wide job manager, created from config on first use."""
+    global _manager
+    if _manager is None:
+        _manager = JobManager(
+            config.JOBS_DIR,
+            workers=config.JOB_WORKERS,
+            chunk_size=config.JOB_CHUNK_SIZE,
+            retention_s=config.JOB_RETENTION_S,
+        )
+    return _manager
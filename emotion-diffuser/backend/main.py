@@ -3,11 +3,15 @@ Emotion Diffuser — FastAPI Application Entry Point.
 Start with: uvicorn backend.main:app --reload
 """
 
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from backend.routes import router
-from backend.config import API_TITLE, API_DESCRIPTION, API_VERSION, CORS_ORIGINS, DEBUG
+from backend.jobs import get_job_manager
+from analysis_engine.analyzer import mark_ready, warm_up
+from analysis_engine.executor import shutdown_inference_executor
+from backend.config import API_TITLE, API_DESCRIPTION, API_VERSION, CORS_ORIGINS, DEBUG, WARMUP_ON_STARTUP
 
 
 # ────────────────────────────────────────
@@ -16,14 +20,33 @@ from backend.config import API_TITLE, API_DESCRIPTION, API_VERSION, CORS_ORIGINS
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Called on startup and shutdown. Load models here later."""
+    """
+    Called on startup and shutdown.
+    Models warm up in the background: /health answers immediately,
+    /ready only once both models are loaded and warm.
+    """
     if DEBUG:
         print(f"[START] {API_TITLE} {API_VERSION} starting up...")
         print(f"[DOCS]  http://127.0.0.1:8000/docs")
         print(f"[INFO]  Built for Hack for Humanity 6.0")
+
+    warmup_task = None
+    if WARMUP_ON_STARTUP:
+        warmup_task = asyncio.create_task(warm_up())
+    else:
+        mark_ready()
+    # Resumes jobs left unfinished by the previous process
+    jobs = get_job_manager()
+    jobs.start()
+
     yield
+
     if DEBUG:
         print("[STOP] Shutting down Emotion Diffuser...")
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    await jobs.stop()
+    shutdown_inference_executor()
 
 
 # ────────────────────────────────────────
@@ -71,6 +94,7 @@ async def root():
         "message": "Emotion Diffuser API is running",
         "docs": f"/docs",
         "health": f"/api/{API_VERSION}/health",
+        "ready": f"/api/{API_VERSION}/ready",
         "version": API_VERSION,
     }
 
@@ -0,0 +1,65 @@
+"""
+NDJSON request bodies — one JSON object per line, read incrementally.
+"""
+
+from typing import AsyncIterator
+
+from pydantic import ValidationError
+
+from backend import config
+from backend.schemas import MessageIn
+
+
+class NDJSONError(ValueError):
+    """An uploaded NDJSON body is not a valid list of messages."""
+
+
+async def aiter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, str]]:
+    """
+    Split a byte stream into ``(line_number, line)`` pairs, skipping blank lines.
+    Line numbers start at 1 and count blank lines, so they match the upload.
+    Raises NDJSONError on invalid UTF-8 or a line over NDJSON_MAX_LINE_BYTES.
+    """
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for raw in lines:
+            line_no += 1
+            line = _decode(line_no, raw)
+            if line:
+                yield line_no, line
+        # The unterminated tail is bounded too, or one endless line fills memory
+        _check_length(line_no + 1, buffer)
+    line = _decode(line_no + 1, buffer)
+    if line:
+        yield line_no + 1, line
+
+
+def _check_length(line_no: int, raw: bytes) -> None:
+    if len(raw) > config.NDJSON_MAX_LINE_BYTES:
+        raise NDJSONError(f"Line {line_no}: longer than {config.NDJSON_MAX_LINE_BYTES} bytes")
+
+
+def _decode(line_no: int, raw: bytes) -> str:
+    _check_length(line_no, raw)
+    try:
+        return raw.decode("utf-8").strip()
+    except UnicodeDecodeError:
+        raise NDJSONError(f"Line {line_no}: invalid UTF-8") from None
+
+
+def parse_message(line_no: int, line: str) -> MessageIn:
+    """Validate one NDJSON line as a MessageIn; NDJSONError names the bad line."""
+    try:
+        return MessageIn.model_validate_json(line)
+    except ValidationError as e:
+        reason = e.errors()[0]["msg"]
+        raise NDJSONError(f"Line {line_no}: {reason}") from None
+
+
+async def aiter_messages(chunks: AsyncIterator[bytes]) -> AsyncIterator[MessageIn]:
+    """Validated messages from an NDJSON byte stream, one per non-blank line."""
+    async for line_no, line in aiter_lines(chunks):
+        yield parse_message(line_no, line)
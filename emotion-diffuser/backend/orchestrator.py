@@ -3,33 +3,170 @@ Orchestrator — connects analysis + mediation engines.
 Now wired to real mediator_engine and analysis_engine.
 """
 
+import asyncio
+import logging
+import uuid
+from itertools import islice
+from typing import AsyncIterator, Awaitable, TypeVar
+
 from backend.schemas import (
     AnalysisOut,
     RewriteOut,
     ApologyOut,
     ApologyComponents,
     TriggerOut,
+    ConversationTriggerOut,
     SuggestedTrigger,
     FullPipelineOut,
 )
 from backend import config
+from backend.cache import LRUCache, content_key, normalize_text
 
 # ✅ Real imports
-from mediator_engine.rewrite import rewrite_message_llm, generate_apology_llm
+from mediator_engine.rewrite import (
+    rewrite_message_llm,
+    generate_apology_llm,
+    rewrite_and_apologize_llm,
+    stream_rewrite_llm,
+    stream_apology_llm,
+)
 from mediator_engine.prompts import SUGGESTED_TRIGGERS
-from analysis_engine.analyzer import analyze_text
+from analysis_engine.analyzer import analyze_text, analyze_texts, combine_analyses
+from analysis_engine.chunking import is_sentence_closed, iter_sentences
+from analysis_engine.sessions import ConversationSession
 from analysis_engine.utils import detect_disengagement_signals
 
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
 
 # ────────────────────────────────────────
 # ANALYZE (Now using real analysis_engine)
 # ────────────────────────────────────────
 
-async def analyze_message(text: str, context: str | None = None) -> AnalysisOut:
+# Short-lived store of recent analyses, so mediation requests can reuse one by ID.
+# Entries are (text_key, analysis); the key guards against IDs sent with other text.
+_analysis_store = LRUCache(
+    max_entries=config.ANALYSIS_STORE_SIZE,
+    ttl_seconds=config.ANALYSIS_STORE_TTL_S or None,
+)
+
+
+def _remember(text: str, analysis: AnalysisOut) -> AnalysisOut:
+    """Give an analysis an ID and keep it in the analysis store."""
+    analysis.analysis_id = uuid.uuid4().hex
+    _analysis_store.set(analysis.analysis_id, (content_key(normalize_text(text)), analysis.model_copy()))
+    return analysis
+
+
+async def analyze_message(text: str, context: str | None = None, include_chunks: bool = False) -> AnalysisOut:
     """
     Detect primary emotion, intensity, and risk level using HuggingFace models.
+    The result carries an ``analysis_id`` that later mediation requests can reuse.
+    """
+    return _remember(text, await analyze_text(text, context, include_chunks=include_chunks))
+
+
+async def analyze_messages(texts: list[str], remember: bool = False) -> list[AnalysisOut]:
+    """
+    Analyze many messages at once with batched model inference.
+    With ``remember``, each result gets an ``analysis_id`` as in analyze_message;
+    otherwise a large batch would push recent /analyze results out of the store.
+    """
+    results = await analyze_texts(texts)
+    if not remember:
+        return results
+    return [_remember(text, result) for text, result in zip(texts, results)]
+
+
+async def stream_messages(texts: AsyncIterator[str], batch_size: int | None = None) -> AsyncIterator[AnalysisOut]:
+    """
+    Analyze a stream of messages in micro-batches, yielding results in order.
+
+    Reading runs at most two batches ahead of inference, so memory stays flat
+    however long the stream is. Each batch is whatever has arrived (up to
+    ``batch_size``, default BATCH_CHUNK_SIZE) when the previous one finishes,
+    so the first results don't wait for a full batch. An error raised while
+    reading surfaces after the messages before it have been yielded.
+    """
+    size = max(1, batch_size or config.BATCH_CHUNK_SIZE)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=2 * size)
+    end = object()
+
+    async def read() -> None:
+        # No sentinel on cancellation: the consumer is gone and the queue may be full
+        try:
+            async for text in texts:
+                await queue.put(text)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await queue.put(end)
+            raise
+        await queue.put(end)
+
+    reader = asyncio.create_task(read())
+    try:
+        finished = False
+        while not finished:
+            batch = [await queue.get()]
+            while len(batch) < size and not queue.empty():
+                batch.append(queue.get_nowait())
+            if batch[-1] is end:
+                batch.pop()
+                finished = True
+            if batch:
+                # analyze_texts, not analyze_messages: a bulk stream must not flush
+                # interactive users' entries out of the analysis-ID store
+                for result in await analyze_texts(batch):
+                    yield result
+        await reader
+    finally:
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+
+
+async def analyze_draft(text: str) -> AnalysisOut | None:
+    """
+    Analyze a draft that is still being typed, sentence by sentence.
+    Finished sentences go through the analysis cache, so each keystroke only
+    runs the models on the edited part. The sentence still being typed is
+    analyzed without touching the cache, so half-typed text never evicts
+    real entries. None for a blank draft.
+    """
+    spans = list(islice(iter_sentences(text), config.ANALYSIS_MAX_CHUNKS))
+    if not spans:
+        return None
+    analyses = await asyncio.gather(*(
+        analyze_text(text[start:end], use_cache=is_sentence_closed(text, end)) for start, end in spans
+    ))
+    return combine_analyses(spans, list(analyses))
+
+
+async def resolve_analysis(
+    text: str,
+    context: str | None = None,
+    prior: AnalysisOut | None = None,
+    analysis_id: str | None = None,
+) -> AnalysisOut:
+    """
+    Reuse an existing analysis when the client has one, otherwise run inference.
+
+    ``prior`` is an AnalysisOut the client got from an earlier /analyze call;
+    ``analysis_id`` refers to one still in the server-side store for this text.
     """
-    return await analyze_text(text, context)
+    if prior is not None:
+        return prior
+
+    if analysis_id:
+        entry = _analysis_store.get(analysis_id)
+        if entry is not None:
+            text_key, stored = entry
+            if text_key == content_key(normalize_text(text)):
+                return stored.model_copy()
+
+    return await analyze_message(text, context)
 
 
 # ────────────────────────────────────────
@@ -37,12 +174,15 @@ async def analyze_message(text: str, context: str | None = None) -> AnalysisOut:
 # ────────────────────────────────────────
 
 async def rewrite_message(
-    text: str, analysis: AnalysisOut | None = None, relationship: str = "neutral"
+    text: str,
+    analysis: AnalysisOut | None = None,
+    relationship: str = "neutral",
+    use_cache: bool = True,
 ) -> RewriteOut:
     """
     Produce a calmer, constructive version of a message using the LLM.
     """
-    rewritten = await rewrite_message_llm(text, analysis, relationship)
+    rewritten = await rewrite_message_llm(text, analysis, relationship, use_cache=use_cache)
 
     return RewriteOut(
         original=text,
@@ -57,12 +197,17 @@ async def rewrite_message(
 # ────────────────────────────────────────
 
 async def generate_apology(
-    text: str, analysis: AnalysisOut | None = None, relationship: str = "neutral"
+    text: str,
+    analysis: AnalysisOut | None = None,
+    relationship: str = "neutral",
+    use_cache: bool = True,
 ) -> ApologyOut:
     """
     Generate a 5-component psychological apology using the LLM.
     """
-    apology_text, components = await generate_apology_llm(text, analysis, relationship)
+    apology_text, components = await generate_apology_llm(
+        text, analysis, relationship, use_cache=use_cache
+    )
 
     return ApologyOut(
         original=text,
@@ -73,6 +218,103 @@ async def generate_apology(
     )
 
 
+# ────────────────────────────────────────
+# REWRITE + APOLOGY (single LLM call)
+# ────────────────────────────────────────
+
+async def rewrite_and_apologize(
+    text: str,
+    analysis: AnalysisOut | None = None,
+    relationship: str = "neutral",
+    use_cache: bool = True,
+) -> tuple[RewriteOut, ApologyOut]:
+    """
+    Produce both the calm rewrite and the 5-component apology from one LLM call.
+    """
+    rewritten, apology_text, components = await rewrite_and_apologize_llm(
+        text, analysis, relationship, use_cache=use_cache
+    )
+
+    rewrite = RewriteOut(
+        original=text,
+        rewritten=rewritten,
+        tone="calm",
+        emotion=analysis.emotion if analysis else "unknown",
+    )
+    apology = ApologyOut(
+        original=text,
+        apology=apology_text,
+        tone="empathetic",
+        repair_type="acknowledgment + ownership + remorse + repair + invitation",
+        components=ApologyComponents(**components),
+    )
+    return rewrite, apology
+
+
+# ────────────────────────────────────────
+# STREAMING (Server-Sent Events)
+# ────────────────────────────────────────
+
+async def stream_rewrite(
+    text: str,
+    context: str | None = None,
+    relationship: str = "neutral",
+    use_cache: bool = True,
+    prior_analysis: AnalysisOut | None = None,
+    analysis_id: str | None = None,
+) -> AsyncIterator[tuple[str, dict]]:
+    """
+    Analyze (or reuse an analysis), then stream the rewrite.
+    Yields ("analysis", ...), one ("token", {"text": ...}) per delta, then ("done", RewriteOut).
+    """
+    analysis = await resolve_analysis(text, context, prior_analysis, analysis_id)
+    yield "analysis", analysis.model_dump()
+
+    parts: list[str] = []
+    async for delta in stream_rewrite_llm(text, analysis, relationship, use_cache=use_cache):
+        parts.append(delta)
+        yield "token", {"text": delta}
+
+    rewrite = RewriteOut(
+        original=text,
+        rewritten="".join(parts).strip(),
+        tone="calm",
+        emotion=analysis.emotion,
+    )
+    yield "done", rewrite.model_dump()
+
+
+async def stream_apology(
+    text: str,
+    context: str | None = None,
+    relationship: str = "neutral",
+    use_cache: bool = True,
+    prior_analysis: AnalysisOut | None = None,
+    analysis_id: str | None = None,
+) -> AsyncIterator[tuple[str, dict]]:
+    """
+    Analyze (or reuse an analysis), then stream the apology.
+    Yields ("analysis", ...), one ("component", {"key", "text"}) per finished
+    component, then ("done", ApologyOut).
+    """
+    analysis = await resolve_analysis(text, context, prior_analysis, analysis_id)
+    yield "analysis", analysis.model_dump()
+
+    async for event, payload in stream_apology_llm(text, analysis, relationship, use_cache=use_cache):
+        if event != "done":
+            yield event, payload
+            continue
+
+        apology = ApologyOut(
+            original=text,
+            apology=payload["apology"],
+            tone="empathetic",
+            repair_type="acknowledgment + ownership + remorse + repair + invitation",
+            components=ApologyComponents(**payload["components"]),
+        )
+        yield "done", apology.model_dump()
+
+
 # ────────────────────────────────────────
 # TRIGGERS
 # ────────────────────────────────────────
@@ -84,8 +326,11 @@ async def detect_triggers(
     Analyze a conversation for disengagement and suggest psychology-backed triggers.
     Triggers are relationship-specific.
     """
-    signals = detect_disengagement_signals(messages)
+    return TriggerOut(**_trigger_fields(detect_disengagement_signals(messages), relationship))
+
 
+def _trigger_fields(signals: list[str], relationship: str) -> dict:
+    """Engagement level and relationship-specific suggestions for some signals."""
     engagement = "low" if len(signals) >= 2 else "medium" if signals else "high"
 
     suggested = []
@@ -94,17 +339,97 @@ async def detect_triggers(
         mode_triggers = SUGGESTED_TRIGGERS.get(relationship.lower(), SUGGESTED_TRIGGERS["neutral"])
         suggested = [SuggestedTrigger(**t) for t in mode_triggers]
 
-    return TriggerOut(
-        engagement_level=engagement,
-        signals_detected=signals,
-        suggested_triggers=suggested,
+    return {
+        "engagement_level": engagement,
+        "signals_detected": signals,
+        "suggested_triggers": suggested,
+    }
+
+
+# Live conversation sessions; re-stored on every append so the TTL acts as an idle timeout
+_conversations = LRUCache(
+    max_entries=config.CONVERSATION_STORE_SIZE,
+    ttl_seconds=config.CONVERSATION_IDLE_TTL_S or None,
+)
+
+
+def get_conversation_store() -> LRUCache:
+    """The conversation session store (exposed for metrics)."""
+    return _conversations
+
+
+async def start_conversation(
+    messages: list[str],
+    context: str | None = None,
+    relationship: str = "neutral",
+    analyze: bool = True,
+) -> ConversationTriggerOut:
+    """Open a conversation session seeded with any messages so far."""
+    session_id = uuid.uuid4().hex
+    session = ConversationSession(relationship, context, analyze, config.CONVERSATION_RECENT_ANALYSES)
+    _conversations.set(session_id, session)
+    return await append_to_conversation(session_id, messages)
+
+
+async def append_to_conversation(session_id: str, messages: list[str]) -> ConversationTriggerOut | None:
+    """
+    Add new messages to a session and re-check triggers — only the new
+    messages are scanned and analyzed. None if the session is unknown or
+    expired, or was ended while the messages were being analyzed.
+    """
+    session = _conversations.get(session_id)
+    if session is None:
+        return None
+
+    analyses = await analyze_texts(messages) if session.analyze and messages else []
+    # The session may have been ended or replaced during the analysis
+    if _conversations.get(session_id) is not session:
+        return None
+    # Counters change only once analysis has succeeded, and with no await in between
+    session.add_messages(messages)
+    session.add_analyses(analyses)
+    _conversations.set(session_id, session)
+
+    return ConversationTriggerOut(
+        session_id=session_id,
+        message_count=session.message_count,
+        dominant_emotion=session.dominant_emotion,
+        toxic_messages=session.toxic_count,
+        **_trigger_fields(session.signals(), session.relationship),
     )
 
 
+def end_conversation(session_id: str) -> bool:
+    """Drop a session; False if it was already gone."""
+    return _conversations.pop(session_id) is not None
+
+
 # ────────────────────────────────────────
 # FULL PIPELINE
 # ────────────────────────────────────────
 
+async def _run_stage(name: str, coro: Awaitable[T], timeout: float, errors: dict[str, str]) -> T | None:
+    """
+    Await one pipeline stage under its own timeout; record failures instead of raising.
+    A timeout raised by the stage itself (the LLM call deadline) is reported as such.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        done, _ = await asyncio.wait({task}, timeout=timeout or None)
+        if not done:
+            errors[name] = f"timed out after {timeout:g}s"
+            return None
+        return task.result()
+    except asyncio.TimeoutError:
+        errors[name] = f"LLM call timed out after {config.LLM_TIMEOUT_S:g}s"
+    except Exception as e:
+        logger.error(f"Pipeline stage '{name}' failed: {str(e)}")
+        errors[name] = str(e)
+    finally:
+        task.cancel()
+    return None
+
+
 async def full_pipeline(
     text: str,
     context: str | None = None,
@@ -113,27 +438,72 @@ async def full_pipeline(
     include_apology: bool = True,
     include_triggers: bool = False,
     conversation_history: list[str] | None = None,
+    use_cache: bool = True,
+    prior_analysis: AnalysisOut | None = None,
+    analysis_id: str | None = None,
 ) -> FullPipelineOut:
     """
-    Run analysis → rewrite → apology → triggers in a single unified flow.
+    Run analysis, then rewrite / apology / triggers concurrently.
+
+    The later stages only depend on the analysis, so they run side by side,
+    each under its own timeout. A failed or timed-out stage comes back as
+    None with the reason in ``errors`` instead of failing the whole request.
     """
-    analysis = await analyze_message(text, context)
+    analysis = await resolve_analysis(text, context, prior_analysis, analysis_id)
+
+    want_rewrite = include_rewrite and config.ENABLE_REWRITE
+    want_apology = include_apology and config.ENABLE_APOLOGY
+    want_triggers = include_triggers and config.ENABLE_TRIGGERS and conversation_history
+    fused = want_rewrite and want_apology and config.ENABLE_FUSED_MEDIATION
 
-    rewrite = None
-    if include_rewrite and config.ENABLE_REWRITE:
-        rewrite = await rewrite_message(text, analysis, relationship)
+    errors: dict[str, str] = {}
+    stages: dict[str, Awaitable] = {}
+    if fused:
+        # One round trip instead of two when both outputs are requested
+        stages["mediation"] = _run_stage(
+            "mediation",
+            rewrite_and_apologize(text, analysis, relationship, use_cache),
+            max(config.PIPELINE_REWRITE_TIMEOUT_S, config.PIPELINE_APOLOGY_TIMEOUT_S),
+            errors,
+        )
+    else:
+        if want_rewrite:
+            stages["rewrite"] = _run_stage(
+                "rewrite",
+                rewrite_message(text, analysis, relationship, use_cache),
+                config.PIPELINE_REWRITE_TIMEOUT_S,
+                errors,
+            )
+        if want_apology:
+            stages["apology"] = _run_stage(
+                "apology",
+                generate_apology(text, analysis, relationship, use_cache),
+                config.PIPELINE_APOLOGY_TIMEOUT_S,
+                errors,
+            )
+    if want_triggers:
+        stages["triggers"] = _run_stage(
+            "triggers",
+            detect_triggers(conversation_history, context, relationship),
+            config.PIPELINE_TRIGGERS_TIMEOUT_S,
+            errors,
+        )
 
-    apology = None
-    if include_apology and config.ENABLE_APOLOGY:
-        apology = await generate_apology(text, analysis, relationship)
+    results = dict(zip(stages, await asyncio.gather(*stages.values())))
 
-    triggers = None
-    if include_triggers and config.ENABLE_TRIGGERS and conversation_history:
-        triggers = await detect_triggers(conversation_history, context, relationship)
+    rewrite = results.get("rewrite")
+    apology = results.get("apology")
+    if fused:
+        if results["mediation"] is not None:
+            rewrite, apology = results["mediation"]
+        else:
+            reason = errors.pop("mediation")
+            errors["rewrite"] = errors["apology"] = reason
 
     return FullPipelineOut(
         analysis=analysis,
         rewrite=rewrite,
         apology=apology,
-        triggers=triggers,
+        triggers=results.get("triggers"),
+        errors=errors,
     )
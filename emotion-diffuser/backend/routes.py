@@ -3,25 +3,72 @@ API Routes — all HTTP endpoints for Emotion Diffuser.
 This file ONLY routes requests. No ML logic, no prompts, no business rules.
 """
 
-from fastapi import APIRouter, HTTPException
+import asyncio
+import json
+import logging
+from typing import AsyncIterator
+
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
 from backend.schemas import (
     MessageIn,
     ConversationIn,
+    ConversationStartIn,
+    ConversationAppendIn,
     FullPipelineIn,
     BatchIn,
     AnalysisOut,
     RewriteOut,
     ApologyOut,
     TriggerOut,
+    ConversationTriggerOut,
     FullPipelineOut,
     BatchOut,
+    JobOut,
     ErrorOut,
 )
 from backend import orchestrator, config
+from backend.jobs import get_job_manager
+from backend.ndjson import NDJSONError, aiter_messages
+from analysis_engine.analyzer import (
+    is_ready,
+    warmup_error,
+    get_analysis_cache,
+    get_analysis_singleflight,
+    get_persistent_cache,
+)
+from mediator_engine.client import get_response_cache, get_admission_controller, get_llm_singleflight, client_stats
+from mediator_engine.parsing import parse_stats
+from mediator_engine.limiter import LLMOverloadedError
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
+def _sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _sse_stream(events: AsyncIterator[tuple[str, dict]]) -> AsyncIterator[str]:
+    """Turn orchestrator (event, payload) pairs into SSE text; failures become an error event."""
+    try:
+        async for event, payload in events:
+            yield _sse(event, payload)
+    except Exception as e:
+        yield _sse("error", {"detail": str(e)})
+
+
+def _sse_response(events: AsyncIterator[tuple[str, dict]]) -> StreamingResponse:
+    """StreamingResponse with headers that stop proxies from buffering the stream."""
+    return StreamingResponse(
+        _sse_stream(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # ────────────────────────────────────────
 # HEALTH CHECK
 # ────────────────────────────────────────
@@ -41,6 +88,36 @@ async def health_check():
     }
 
 
+@router.get("/ready", tags=["System"])
+async def readiness_check():
+    """Report whether the models are loaded and warm (503 until they are)."""
+    if not is_ready():
+        return JSONResponse(
+            status_code=503,
+            content={"status": "warming_up", "error": warmup_error()},
+        )
+    return {"status": "ready"}
+
+
+@router.get("/metrics", tags=["System"])
+async def metrics():
+    """Runtime counters for caches and other performance components."""
+    persistent = get_persistent_cache()
+    llm_cache = get_response_cache()
+    return {
+        "analysis_cache": get_analysis_cache().stats(),
+        "analysis_cache_persistent": persistent.stats() if persistent else None,
+        "analysis_singleflight": get_analysis_singleflight().stats(),
+        "llm_cache": llm_cache.stats() if llm_cache else None,
+        "conversations": orchestrator.get_conversation_store().stats(),
+        "jobs": get_job_manager().stats(),
+        "llm_admission": get_admission_controller().stats(),
+        "llm_client": client_stats(),
+        "llm_singleflight": get_llm_singleflight().stats(),
+        "llm_parsing": parse_stats(),
+    }
+
+
 # ────────────────────────────────────────
 # ANALYZE — Emotion + Risk Detection
 # ────────────────────────────────────────
@@ -58,7 +135,7 @@ async def analyze(data: MessageIn):
     and toxicity in a message.
     """
     try:
-        return await orchestrator.analyze_message(data.text, data.context)
+        return await orchestrator.analyze_message(data.text, data.context, data.include_chunks)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -70,7 +147,7 @@ async def analyze(data: MessageIn):
 @router.post(
     "/rewrite",
     response_model=RewriteOut,
-    responses={500: {"model": ErrorOut}},
+    responses={500: {"model": ErrorOut}, 503: {"model": ErrorOut}},
     tags=["Mediation"],
     summary="Rewrite a message with a calmer tone",
 )
@@ -82,10 +159,12 @@ async def rewrite(data: MessageIn):
     try:
         if not config.ENABLE_REWRITE:
             raise HTTPException(status_code=403, detail="Rewrite feature is disabled")
-        analysis = await orchestrator.analyze_message(data.text, data.context)
-        return await orchestrator.rewrite_message(data.text, analysis, data.relationship)
+        analysis = await orchestrator.resolve_analysis(data.text, data.context, data.analysis, data.analysis_id)
+        return await orchestrator.rewrite_message(data.text, analysis, data.relationship, data.use_cache)
     except HTTPException:
         raise
+    except LLMOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -97,7 +176,7 @@ async def rewrite(data: MessageIn):
 @router.post(
     "/apologize",
     response_model=ApologyOut,
-    responses={500: {"model": ErrorOut}},
+    responses={500: {"model": ErrorOut}, 503: {"model": ErrorOut}},
     tags=["Mediation"],
     summary="Generate a heartfelt, psychology-backed apology",
 )
@@ -108,14 +187,135 @@ async def apologize(data: MessageIn):
     try:
         if not config.ENABLE_APOLOGY:
             raise HTTPException(status_code=403, detail="Apology feature is disabled")
-        analysis = await orchestrator.analyze_message(data.text, data.context)
-        return await orchestrator.generate_apology(data.text, analysis, data.relationship)
+        analysis = await orchestrator.resolve_analysis(data.text, data.context, data.analysis, data.analysis_id)
+        return await orchestrator.generate_apology(data.text, analysis, data.relationship, data.use_cache)
     except HTTPException:
         raise
+    except LLMOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ────────────────────────────────────────
+# STREAMING — Rewrite / Apology as Server-Sent Events
+# ────────────────────────────────────────
+
+@router.post(
+    "/rewrite/stream",
+    tags=["Mediation"],
+    summary="Stream a calmer rewrite token by token (Server-Sent Events)",
+)
+async def rewrite_stream(data: MessageIn):
+    """
+    Same as /rewrite, streamed: an `analysis` event, a `token` event per
+    text delta, then `done` with the full RewriteOut.
+    """
+    if not config.ENABLE_REWRITE:
+        raise HTTPException(status_code=403, detail="Rewrite feature is disabled")
+    return _sse_response(
+        orchestrator.stream_rewrite(
+            data.text, data.context, data.relationship, data.use_cache, data.analysis, data.analysis_id
+        )
+    )
+
+
+@router.post(
+    "/apologize/stream",
+    tags=["Mediation"],
+    summary="Stream an apology component by component (Server-Sent Events)",
+)
+async def apologize_stream(data: MessageIn):
+    """
+    Same as /apologize, streamed: an `analysis` event, a `component` event
+    as each of the 5 components is ready, then `done` with the full ApologyOut.
+    """
+    if not config.ENABLE_APOLOGY:
+        raise HTTPException(status_code=403, detail="Apology feature is disabled")
+    return _sse_response(
+        orchestrator.stream_apology(
+            data.text, data.context, data.relationship, data.use_cache, data.analysis, data.analysis_id
+        )
+    )
+
+
+# ────────────────────────────────────────
+# LIVE — Draft Analysis Over WebSocket
+# ────────────────────────────────────────
+
+@router.websocket("/analyze/live")
+async def analyze_live(websocket: WebSocket):
+    """
+    Live risk indicator for a compose box.
+
+    The client sends ``{"text": <whole draft>, "seq": <optional counter>}``
+    as the user types. Updates are debounced (DRAFT_DEBOUNCE_MS) and a newer
+    draft cancels the analysis of an older one. Each finished analysis is
+    pushed as ``{"type": "analysis", "seq": ..., "changes": {...}}`` holding
+    only the AnalysisOut fields that changed since the last push; a blank
+    draft gets ``{"type": "cleared"}``.
+
+    The live result combines per-sentence analyses, so it can differ from
+    what /analyze returns for the same final text, which runs the models over
+    the whole message at once (chunked only past ANALYSIS_CHUNK_MAX_CHARS).
+    """
+    await websocket.accept()
+    pending: asyncio.Task | None = None
+    # Every analysis task still running, superseded ones included, so none outlives the socket
+    running: set[asyncio.Task] = set()
+    last: dict = {}
+
+    def finished(task: asyncio.Task) -> None:
+        running.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Live draft analysis failed: {task.exception()!r}")
+
+    async def analyze_after_quiet(text: str, seq):
+        nonlocal last
+        await asyncio.sleep(config.DRAFT_DEBOUNCE_MS / 1000)
+        result = await orchestrator.analyze_draft(text)
+        if result is None:
+            last = {}
+            message = {"type": "cleared", "seq": seq}
+        else:
+            current = result.model_dump(mode="json", exclude={"analysis_id", "chunks"})
+            message = {
+                "type": "analysis",
+                "seq": seq,
+                "changes": {k: v for k, v in current.items() if last.get(k) != v},
+            }
+            last = current
+        # Shielded so a superseding update can't cut a frame off half-sent
+        await asyncio.shield(websocket.send_json(message))
+
+    try:
+        while True:
+            try:
+                update = json.loads(await websocket.receive_text())
+                text = update["text"]
+                if not isinstance(text, str):
+                    raise TypeError("text must be a string")
+            except (ValueError, KeyError, TypeError) as e:
+                await websocket.send_json({"type": "error", "detail": f"Invalid draft update: {e}"})
+                continue
+            if len(text) > config.DRAFT_MAX_CHARS:
+                detail = f"Draft longer than {config.DRAFT_MAX_CHARS} chars"
+                await websocket.send_json({"type": "error", "detail": detail})
+                continue
+
+            if pending is not None:
+                pending.cancel()
+            pending = asyncio.create_task(analyze_after_quiet(text, update.get("seq")))
+            running.add(pending)
+            pending.add_done_callback(finished)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+
 # ────────────────────────────────────────
 # TRIGGERS — Conversation Re-Engagement
 # ────────────────────────────────────────
@@ -142,6 +342,63 @@ async def triggers(data: ConversationIn):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post(
+    "/triggers/sessions",
+    response_model=ConversationTriggerOut,
+    responses={500: {"model": ErrorOut}},
+    tags=["Engagement"],
+    summary="Start an incremental conversation session for trigger detection",
+)
+async def start_conversation(data: ConversationStartIn):
+    """
+    Open a conversation session. Later turns POST only their new messages to
+    /triggers/sessions/{session_id} instead of resending the whole history.
+    """
+    try:
+        if not config.ENABLE_TRIGGERS:
+            raise HTTPException(status_code=403, detail="Triggers feature is disabled")
+        return await orchestrator.start_conversation(data.messages, data.context, data.relationship, data.analyze)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post(
+    "/triggers/sessions/{session_id}",
+    response_model=ConversationTriggerOut,
+    responses={404: {"model": ErrorOut}, 500: {"model": ErrorOut}},
+    tags=["Engagement"],
+    summary="Append new messages to a conversation session and re-check triggers",
+)
+async def append_conversation(session_id: str, data: ConversationAppendIn):
+    """Add the messages sent since the last call; cost is proportional to the new messages only."""
+    try:
+        if not config.ENABLE_TRIGGERS:
+            raise HTTPException(status_code=403, detail="Triggers feature is disabled")
+        result = await orchestrator.append_to_conversation(session_id, data.messages)
+        if result is None:
+            raise HTTPException(status_code=404, detail="Unknown or expired conversation session")
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete(
+    "/triggers/sessions/{session_id}",
+    status_code=204,
+    responses={404: {"model": ErrorOut}},
+    tags=["Engagement"],
+    summary="End a conversation session",
+)
+async def end_conversation(session_id: str):
+    """Drop a conversation session before it idles out."""
+    if not orchestrator.end_conversation(session_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired conversation session")
+
+
 # ────────────────────────────────────────
 # PIPELINE — Everything In One Call
 # ────────────────────────────────────────
@@ -167,6 +424,9 @@ async def pipeline(data: FullPipelineIn):
             include_apology=data.include_apology,
             include_triggers=data.include_triggers,
             conversation_history=data.conversation_history,
+            use_cache=data.use_cache,
+            prior_analysis=data.analysis,
+            analysis_id=data.analysis_id,
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -190,10 +450,124 @@ async def batch_analyze(data: BatchIn):
     Useful for analyzing an entire conversation history.
     """
     try:
-        results = []
-        for msg in data.messages:
-            result = await orchestrator.analyze_message(msg.text, msg.context)
-            results.append(result)
+        results = await orchestrator.analyze_messages([msg.text for msg in data.messages], remember=data.remember)
         return BatchOut(results=results, count=len(results))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that starts sending while the request body is still
+    being read. The stock class also listens on ``receive`` for disconnects,
+    which would swallow body chunks the endpoint hasn't read yet.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+
+
+@router.post(
+    "/batch/stream",
+    tags=["Analysis"],
+    summary="Analyze an NDJSON stream of messages, streaming results back",
+)
+async def batch_stream(request: Request):
+    """
+    Streaming /batch: send one MessageIn per line (``application/x-ndjson``)
+    and receive one AnalysisOut per line, in the same order, as soon as each
+    micro-batch is analyzed. Nothing is buffered beyond a couple of batches,
+    so any number of messages can be sent. Results carry no ``analysis_id``.
+    If a line is invalid or analysis fails, the results so far are followed
+    by a final ErrorOut line.
+    """
+    async def texts() -> AsyncIterator[str]:
+        async for message in aiter_messages(request.stream()):
+            yield message.text
+
+    async def lines() -> AsyncIterator[str]:
+        try:
+            async for result in orchestrator.stream_messages(texts()):
+                yield result.model_dump_json() + "\n"
+        except NDJSONError as e:
+            yield ErrorOut(error="invalid_input", detail=str(e), code=422).model_dump_json() + "\n"
+        except Exception as e:
+            yield ErrorOut(error="analysis_failed", detail=str(e), code=500).model_dump_json() + "\n"
+
+    return _DuplexStreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+# ────────────────────────────────────────
+# JOBS — Bulk Analysis in the Background
+# ────────────────────────────────────────
+
+def _job_or_404(job_id: str) -> dict:
+    meta = get_job_manager().get(job_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return meta
+
+
+@router.post(
+    "/jobs",
+    response_model=JobOut,
+    status_code=202,
+    responses={422: {"model": ErrorOut}},
+    tags=["Analysis"],
+    summary="Submit an NDJSON conversation export for background analysis",
+)
+async def submit_job(request: Request):
+    """
+    Upload one MessageIn object per line (``application/x-ndjson``), e.g.
+    ``{"text": "..."}``. The upload is stored locally and analyzed in batches
+    by a bounded pool of workers; poll GET /jobs/{job_id} for progress and
+    fetch GET /jobs/{job_id}/results for the analyses, in upload order.
+    """
+    try:
+        meta = await get_job_manager().submit(request.stream())
+    except NDJSONError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return JobOut(**meta)
+
+
+@router.get(
+    "/jobs/{job_id}",
+    response_model=JobOut,
+    responses={404: {"model": ErrorOut}},
+    tags=["Analysis"],
+    summary="Poll the progress of a bulk analysis job",
+)
+async def job_status(job_id: str):
+    """Status plus processed/total counts, checkpointed after every batch."""
+    return JobOut(**_job_or_404(job_id))
+
+
+@router.get(
+    "/jobs/{job_id}/results",
+    responses={404: {"model": ErrorOut}},
+    tags=["Analysis"],
+    summary="Stream a job's results as NDJSON",
+)
+async def job_results(job_id: str, follow: bool = False):
+    """
+    One AnalysisOut per line, in upload order, for every message processed so
+    far. With ``follow=true`` the response stays open until the job finishes.
+    """
+    _job_or_404(job_id)
+    return StreamingResponse(
+        get_job_manager().iter_results(job_id, follow=follow),
+        media_type="application/x-ndjson",
+    )
+
+
+@router.delete(
+    "/jobs/{job_id}",
+    status_code=204,
+    responses={404: {"model": ErrorOut}},
+    tags=["Analysis"],
+    summary="Cancel a job and delete its stored input and results",
+)
+async def delete_job(job_id: str):
+    """Stop a running job and free its local storage."""
+    if not await asyncio.to_thread(get_job_manager().delete, job_id):
+        raise HTTPException(status_code=404, detail="Unknown job")
@@ -17,6 +17,10 @@ class MessageIn(BaseModel):
     context: Optional[str] = Field(None, description="Optional context (e.g. 'argument with friend')")
     sender_name: Optional[str] = Field(None, description="Optional sender name for personalization")
     relationship: str = Field("neutral", description="Relationship with recipient (parent, friend, partner, professional, etc.)")
+    use_cache: bool = Field(True, description="Reuse a cached LLM response for an identical request (false forces regeneration)")
+    analysis: Optional["AnalysisOut"] = Field(None, description="Analysis from a previous /analyze call — skips re-running the models")
+    analysis_id: Optional[str] = Field(None, description="analysis_id from a recent /analyze call for this same text")
+    include_chunks: bool = Field(False, description="For long messages, also return the analysis of each sentence-aligned chunk")
 
 
 
@@ -27,6 +31,19 @@ class ConversationIn(BaseModel):
     relationship: str = Field("neutral", description="Relationship with recipient (parent, sibling, friend, partner, professional)")
 
 
+class ConversationStartIn(BaseModel):
+    """Start a conversation session; later turns append only their new messages."""
+    messages: list[str] = Field(default_factory=list, description="Messages so far, in conversation order")
+    context: Optional[str] = Field(None, description="Optional context about the conversation")
+    relationship: str = Field("neutral", description="Relationship with recipient (parent, sibling, friend, partner, professional)")
+    analyze: bool = Field(True, description="Run emotion/toxicity analysis on each new message")
+
+
+class ConversationAppendIn(BaseModel):
+    """New messages for an existing conversation session."""
+    messages: list[str] = Field(..., min_length=1, description="Messages added since the last call, in order")
+
+
 class FullPipelineIn(BaseModel):
     """Full pipeline request — toggle which outputs you want."""
     text: str = Field(..., min_length=1, description="The message text to process")
@@ -36,12 +53,16 @@ class FullPipelineIn(BaseModel):
     include_apology: bool = Field(True, description="Include heartfelt apology in response")
     include_triggers: bool = Field(False, description="Include re-engagement triggers")
     conversation_history: Optional[list[str]] = Field(None, description="Previous messages (needed if include_triggers=True)")
+    use_cache: bool = Field(True, description="Reuse cached LLM responses for an identical request (false forces regeneration)")
+    analysis: Optional["AnalysisOut"] = Field(None, description="Analysis from a previous /analyze call — skips re-running the models")
+    analysis_id: Optional[str] = Field(None, description="analysis_id from a recent /analyze call for this same text")
 
 
 
 class BatchIn(BaseModel):
     """Batch processing — analyze multiple messages at once."""
     messages: list[MessageIn] = Field(..., min_length=1, description="List of messages to analyze")
+    remember: bool = Field(False, description="Give each result an analysis_id that later mediation requests can reuse")
 
 
 # ────────────────────────────────────────
@@ -54,6 +75,16 @@ class EmotionDetail(BaseModel):
     score: float = Field(..., ge=0, le=1, description="Confidence score 0-1")
 
 
+class ChunkAnalysis(BaseModel):
+    """Analysis of one sentence-aligned window of a long message."""
+    start: int = Field(..., ge=0, description="Character offset where the chunk starts")
+    end: int = Field(..., ge=0, description="Character offset where the chunk ends")
+    emotion: str = Field(..., description="Primary emotion in this chunk")
+    intensity: float = Field(..., ge=0, le=1, description="Emotion intensity 0-1")
+    is_toxic: bool = Field(False, description="Whether this chunk is toxic")
+    toxicity_score: float = Field(0.0, ge=0, le=1, description="Toxicity confidence 0-1")
+
+
 class AnalysisOut(BaseModel):
     """Emotion analysis result."""
     emotion: str = Field(..., description="Primary detected emotion")
@@ -62,6 +93,8 @@ class AnalysisOut(BaseModel):
     is_toxic: bool = Field(False, description="Whether toxicity was detected")
     toxicity_score: float = Field(0.0, ge=0, le=1, description="Toxicity confidence 0-1")
     all_emotions: Optional[list[EmotionDetail]] = Field(None, description="All detected emotions with scores")
+    analysis_id: Optional[str] = Field(None, description="ID for reusing this analysis in /rewrite, /apologize or /pipeline")
+    chunks: Optional[list[ChunkAnalysis]] = Field(None, description="Per-chunk analysis of a long message (when include_chunks is set)")
 
 
 class RewriteOut(BaseModel):
@@ -104,6 +137,14 @@ class TriggerOut(BaseModel):
     suggested_triggers: list[SuggestedTrigger] = Field(default_factory=list, description="Re-engagement suggestions")
 
 
+class ConversationTriggerOut(TriggerOut):
+    """Trigger analysis for a conversation session, plus its running totals."""
+    session_id: str = Field(..., description="ID to append further messages to")
+    message_count: int = Field(..., description="Messages in the conversation so far")
+    dominant_emotion: Optional[str] = Field(None, description="Most frequent primary emotion across analyzed messages")
+    toxic_messages: int = Field(0, description="Analyzed messages flagged as toxic")
+
+
 # ────────────────────────────────────────
 # OUTPUTS — Combined / Pipeline
 # ────────────────────────────────────────
@@ -114,6 +155,7 @@ class FullPipelineOut(BaseModel):
     rewrite: Optional[RewriteOut] = None
     apology: Optional[ApologyOut] = None
     triggers: Optional[TriggerOut] = None
+    errors: dict[str, str] = Field(default_factory=dict, description="Stages that failed or timed out, with the reason (partial result)")
 
 
 class BatchOut(BaseModel):
@@ -122,8 +164,24 @@ class BatchOut(BaseModel):
     count: int = Field(..., description="Number of messages processed")
 
 
+class JobOut(BaseModel):
+    """Progress of a bulk analysis job."""
+    job_id: str = Field(..., description="ID to poll and fetch results with")
+    status: str = Field(..., description="queued, running, done or failed")
+    total: int = Field(..., description="Messages in the upload")
+    processed: int = Field(..., description="Messages analyzed so far (results available for these)")
+    error: Optional[str] = Field(None, description="Why the job failed, if it did")
+    created_at: float = Field(..., description="Submission time (Unix seconds)")
+    updated_at: float = Field(..., description="Last progress checkpoint (Unix seconds)")
+
+
 class ErrorOut(BaseModel):
     """Standardized error response."""
     error: str = Field(..., description="Error type")
     detail: str = Field(..., description="Human-readable error description")
     code: int = Field(..., description="HTTP status code")
+
+
+# Resolve the forward references to AnalysisOut in the input models
+MessageIn.model_rebuild()
+FullPipelineIn.model_rebuild()
@@ -0,0 +1,62 @@
+"""
+Compare per-message analysis cost: sequential analyze_text loop vs batched analyze_texts.
+The analysis cache is disabled and every message is distinct, so both paths run the models.
+Run with: python bench_batch.py [n_messages]
+"""
+
+import asyncio
+import sys
+import time
+
+from backend import config
+from backend.cache import LRUCache, SingleFlight
+from analysis_engine import analyzer
+from analysis_engine.analyzer import analyze_text, analyze_texts
+
+SAMPLES = [
+    "Ok",
+    "Fine, whatever.",
+    "I am so incredibly angry that you did this without telling me!",
+    "I'm feeling a bit down lately, everything seems so difficult.",
+    "Can we talk later tonight? I think we should sort this out properly.",
+    "Shut up you absolute idiot!",
+    "Thanks for picking me up yesterday, that really meant a lot to me.",
+    "You never listen to me. You just lecture and then act surprised when I stop talking.",
+]
+
+
+def disable_caching():
+    """Measure inference, not cache lookups."""
+    config.ANALYSIS_CACHE_BACKEND = "none"
+    analyzer._persistent_cache = None
+    analyzer._analysis_cache = LRUCache(max_entries=0)
+    analyzer._in_flight = SingleFlight()
+
+
+async def bench(n: int):
+    disable_caching()
+    # Numbered so no two messages share a cache key or get deduplicated
+    texts = [f"{SAMPLES[i % len(SAMPLES)]} ({i})" for i in range(n)]
+
+    # Load both models before timing anything
+    await analyze_texts(SAMPLES)
+
+    # The old /batch path: one analyze_text per message, no micro-batching
+    config.ENABLE_MICRO_BATCHING = False
+    start = time.perf_counter()
+    for text in texts:
+        await analyze_text(text)
+    loop_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await analyze_texts(texts)
+    batch_s = time.perf_counter() - start
+
+    print(f"\n=== Batch analysis benchmark ({n} messages, chunk size {config.BATCH_CHUNK_SIZE}) ===")
+    print(f"Sequential loop: {loop_s:.2f}s total, {loop_s / n * 1000:.1f} ms/message")
+    print(f"analyze_texts:   {batch_s:.2f}s total, {batch_s / n * 1000:.1f} ms/message")
+    print(f"Speed-up:        {loop_s / batch_s:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(bench(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
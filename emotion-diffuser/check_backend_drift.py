@@ -0,0 +1,56 @@
+"""
+Accuracy-drift check for the ONNX inference backends against PyTorch.
+Run with: python check_backend_drift.py [onnx|onnx-int8] [max_score_diff] [min_agreement]
+Exits non-zero when the candidate backend drifts past the thresholds.
+"""
+
+import json
+import sys
+
+from analysis_engine.models import measure_drift, WARMUP_TEXTS
+
+SAMPLES = [
+    "Ok",
+    "Fine, whatever.",
+    "I am so incredibly angry that you did this without telling me!",
+    "I'm feeling a bit down lately, everything seems so difficult.",
+    "Can we talk later tonight? I think we should sort this out properly.",
+    "Shut up you absolute idiot!",
+    "Thanks for picking me up yesterday, that really meant a lot to me.",
+    "You never listen to me. You just lecture and then act surprised when I stop talking.",
+    "Wow, I can't believe you actually remembered my birthday this year!",
+    "That movie was disgusting, I honestly felt sick watching it.",
+    "I'm scared something bad is going to happen at the appointment tomorrow.",
+    "You're pathetic and everyone knows it.",
+] + WARMUP_TEXTS
+
+
+def main(backend: str, max_score_diff: float, min_agreement: float) -> int:
+    report = measure_drift(SAMPLES, backend)
+    print(f"\n=== Accuracy drift: {backend} vs pytorch ({report['texts']} texts) ===")
+    print(json.dumps(report, indent=2))
+
+    failures = [
+        name for name, ok in [
+            ("emotion agreement", report["emotion_top_label_agreement"] >= min_agreement),
+            ("toxicity agreement", report["toxicity_label_agreement"] >= min_agreement),
+            ("emotion score diff", report["emotion_max_score_diff"] <= max_score_diff),
+            ("toxicity score diff", report["toxicity_max_score_diff"] <= max_score_diff),
+        ]
+        if not ok
+    ]
+    if failures:
+        print(f"FAIL: {', '.join(failures)} outside thresholds "
+              f"(max diff {max_score_diff}, min agreement {min_agreement})")
+        return 1
+    print("OK: within thresholds")
+    return 0
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    sys.exit(main(
+        args[0] if args else "onnx-int8",
+        float(args[1]) if len(args) > 1 else 0.05,
+        float(args[2]) if len(args) > 2 else 0.95,
+    ))
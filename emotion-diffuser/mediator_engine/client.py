@@ -1,43 +1,431 @@
 """
-OpenAI client — singleton async client and LLM helper.
+LLM client — provider failover, LLM helper, response cache, admission control,
+and tail-latency protection (per-call deadlines, retries with backoff, hedged requests).
 """
 
-from typing import Optional
-from openai import AsyncOpenAI
+import asyncio
+import random
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Optional, Protocol
+
+import openai
 from backend import config
+from backend.cache import LRUCache, SingleFlight, SQLiteCache, content_key
+from .limiter import AdmissionController
+from .providers import LLMProvider, build_provider
+
+_providers: Optional[list[LLMProvider]] = None
+
+
+class ResponseCache(Protocol):
+    """Anything with string get/set and stats() can back the LLM response cache."""
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]: ...
+    def set(self, key: str, value: str) -> None: ...
+    def stats(self) -> dict: ...
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies, for hedging thresholds."""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """The q-quantile of recent latencies (None until there are samples)."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+_response_cache: Optional[ResponseCache] = None
+_admission: Optional[AdmissionController] = None
+_latency = LatencyTracker()
+
+# Concurrent identical (cacheable) calls share one provider request
+_in_flight = SingleFlight()
+
+# Counters for the metrics endpoint
+_stats = {"calls": 0, "retries": 0, "failovers": 0, "timeouts": 0, "hedges": 0, "hedge_wins": 0}
+
+# Provider errors worth retrying: network trouble, timeouts, 429 and 5xx
+_TRANSIENT_ERRORS = (
+    asyncio.TimeoutError,
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+def get_providers() -> list[LLMProvider]:
+    """Return (or create) the providers in LLM_PROVIDERS failover order."""
+    global _providers
+
+    if _providers is None:
+        if not config.LLM_PROVIDERS:
+            raise RuntimeError("LLM_PROVIDERS is empty.")
+        _providers = [build_provider(name) for name in config.LLM_PROVIDERS]
+
+    return _providers
+
+
+def set_providers(providers: Optional[list[LLMProvider]]) -> None:
+    """Plug in a different provider list (None resets to the configured one)."""
+    global _providers
+    _providers = list(providers) if providers is not None else None
+
+
+def _pick_provider(attempt: int, model: Optional[str]) -> tuple[LLMProvider, Optional[str]]:
+    """
+    Provider for the given attempt, rotating through the failover order.
+    An explicit model only applies to the primary provider; the others use their own default.
+    """
+    providers = get_providers()
+    index = attempt % len(providers)
+    return providers[index], model if index == 0 else None
+
+
+def _count_failover(attempt: int) -> None:
+    """Count a retry as a failover if it goes to a different provider than the attempt before it."""
+    providers = get_providers()
+    if providers[attempt % len(providers)] is not providers[(attempt - 1) % len(providers)]:
+        _stats["failovers"] += 1
+
+
+def get_admission_controller() -> AdmissionController:
+    """Return (or create) the admission controller that gates every provider call."""
+    global _admission
+
+    if _admission is None:
+        _admission = AdmissionController(
+            max_in_flight=config.LLM_MAX_IN_FLIGHT,
+            tokens_per_minute=config.LLM_TOKENS_PER_MINUTE,
+            max_queue=config.LLM_MAX_QUEUE,
+            target_latency_s=config.LLM_TARGET_LATENCY_S,
+        )
+
+    return _admission
+
+
+def _estimate_tokens(system_prompt: str, user_prompt: str) -> int:
+    """Rough token cost of a call (~4 chars per token) plus the expected completion."""
+    return (len(system_prompt) + len(user_prompt)) // 4 + config.LLM_EXPECTED_COMPLETION_TOKENS
+
+
+def get_llm_singleflight() -> SingleFlight:
+    """The LLM call coalescer (exposed for metrics)."""
+    return _in_flight
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return (or create) the LLM response cache, or None when it is disabled."""
+    global _response_cache
+
+    if _response_cache is None and config.LLM_CACHE_SIZE > 0:
+        ttl = config.LLM_CACHE_TTL_S or None
+        if config.LLM_CACHE_BACKEND == "sqlite":
+            _response_cache = SQLiteCache(config.LLM_CACHE_PATH, max_entries=config.LLM_CACHE_SIZE, ttl_seconds=ttl)
+        else:
+            _response_cache = LRUCache(max_entries=config.LLM_CACHE_SIZE, ttl_seconds=ttl)
+
+    return _response_cache
+
+
+def set_response_cache(cache: Optional[ResponseCache]) -> None:
+    """Plug in a different response cache backend (None resets to the configured one)."""
+    global _response_cache
+    _response_cache = cache
+
+
+async def _cache_get(cache: ResponseCache, key: str) -> Optional[str]:
+    # Only the in-memory LRU is cheap enough to call on the event loop
+    if isinstance(cache, LRUCache):
+        return cache.get(key)
+    return await asyncio.to_thread(cache.get, key)
 
-_client: Optional[AsyncOpenAI] = None
 
+async def _cache_set(cache: ResponseCache, key: str, value: str) -> None:
+    if isinstance(cache, LRUCache):
+        cache.set(key, value)
+    else:
+        await asyncio.to_thread(cache.set, key, value)
 
-def get_client() -> AsyncOpenAI:
-    """Return (or create) the singleton AsyncOpenAI client."""
-    global _client
 
-    if _client is None:
-        if not config.OPENAI_API_KEY:
-            raise RuntimeError("OPENAI_API_KEY not set in environment.")
+def _cache_key(
+    system_prompt: str, user_prompt: str, model: Optional[str], temperature: float, json_schema: Optional[dict]
+) -> str:
+    """Response cache key; structured-output requests are keyed apart from free-form ones."""
+    parts = [system_prompt, user_prompt, model or get_providers()[0].default_model, temperature]
+    if json_schema is not None:
+        parts.append(json_schema.get("name", "json"))
+    return content_key(*parts)
+
+
+def client_stats() -> dict:
+    """Retry / hedge / timeout counters and the observed latency percentiles."""
+    p50 = _latency.quantile(0.5)
+    p95 = _latency.quantile(0.95)
+    return {
+        **_stats,
+        "coalesced": _in_flight.stats()["coalesced"],
+        "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+        "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+    }
+
+
+def _is_transient(error: BaseException) -> bool:
+    return isinstance(error, _TRANSIENT_ERRORS)
+
 
-        _client = AsyncOpenAI(api_key=config.OPENAI_API_KEY)
+def _backoff(attempt: int) -> float:
+    """Exponential backoff with jitter: base * 2^attempt * [0.5, 1.5)."""
+    return config.LLM_RETRY_BACKOFF_S * (2 ** attempt) * (0.5 + random.random())
+
+
+async def _complete_once(
+    provider: LLMProvider,
+    system_prompt: str,
+    user_prompt: str,
+    model: Optional[str],
+    temperature: float,
+    json_schema: Optional[dict],
+) -> str:
+    """One provider round trip, gated by the admission controller."""
+    admission = get_admission_controller()
+    async with admission.slot(_estimate_tokens(system_prompt, user_prompt), config.LLM_QUEUE_TIMEOUT_S):
+        start = time.monotonic()
+        text = await provider.complete(
+            system_prompt, user_prompt, model=model, temperature=temperature, json_schema=json_schema
+        )
+        _latency.record(time.monotonic() - start)
 
-    return _client
+    return text.strip()
+
+
+async def _complete_hedged(
+    attempt: int,
+    system_prompt: str,
+    user_prompt: str,
+    model: Optional[str],
+    temperature: float,
+    json_schema: Optional[dict],
+) -> str:
+    """
+    Send the request; if it outlives the recent p95 latency, fire a duplicate
+    at the next provider in the failover order and take whichever answers
+    first (the other is cancelled).
+    """
+    provider, provider_model = _pick_provider(attempt, model)
+    threshold = None
+    if config.LLM_HEDGE_ENABLED and len(_latency) >= config.LLM_HEDGE_MIN_SAMPLES:
+        threshold = _latency.quantile(config.LLM_HEDGE_QUANTILE)
+    if threshold is None:
+        return await _complete_once(provider, system_prompt, user_prompt, provider_model, temperature, json_schema)
+
+    primary = asyncio.create_task(
+        _complete_once(provider, system_prompt, user_prompt, provider_model, temperature, json_schema)
+    )
+    tasks = {primary}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=threshold)
+        if not done:
+            _stats["hedges"] += 1
+            hedge, hedge_model = _pick_provider(attempt + 1, model)
+            tasks.add(asyncio.create_task(
+                _complete_once(hedge, system_prompt, user_prompt, hedge_model, temperature, json_schema)
+            ))
+
+        error: Optional[BaseException] = None
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        _stats["hedge_wins"] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
 
 
 async def call_llm(
     system_prompt: str,
     user_prompt: str,
-    model: str = config.LLM_MODEL,
+    model: Optional[str] = None,
     temperature: float = 0.7,
+    use_cache: bool = True,
+    timeout: Optional[float] = None,
+    json_schema: Optional[dict] = None,
+    validate: Optional[Callable[[str], bool]] = None,
 ) -> str:
-    """Send a system + user prompt to the configured LLM and return the text response."""
-    client = get_client()
-
-    response = await client.chat.completions.create(
-        model=model,
-        temperature=temperature,
-        messages=[
-            {"role": "system", "content": system_prompt.strip()},
-            {"role": "user", "content": user_prompt.strip()},
-        ],
+    """
+    Send a system + user prompt to the configured LLM and return the text response.
+
+    ``model`` defaults to the primary provider's default model. Pass
+    ``json_schema`` (an OpenAI-style {"name", "schema"} dict) to request
+    structured JSON output from providers that support it.
+
+    Identical (prompts, model, temperature) requests are answered from the
+    response cache unless ``use_cache`` is False. A fresh response is always
+    written back, so a forced regeneration replaces the cached one. With
+    ``validate``, it is called once on each fresh response (never on cache
+    hits) and only responses it accepts are cached; rejected ones are still
+    returned.
+
+    The whole call — queueing, retries and hedges included — must finish within
+    ``timeout`` seconds (default ``config.LLM_TIMEOUT_S``), else asyncio.TimeoutError.
+    Transient provider errors are retried with exponential backoff, each retry
+    going to the next provider in LLM_PROVIDERS. Concurrent identical cacheable
+    calls are coalesced into one provider request.
+    """
+    system_prompt = system_prompt.strip()
+    user_prompt = user_prompt.strip()
+
+    cache = get_response_cache()
+    key = _cache_key(system_prompt, user_prompt, model, temperature, json_schema)
+    if not use_cache:
+        return await _call_uncached(
+            key, system_prompt, user_prompt, model, temperature, timeout, json_schema, validate
+        )
+
+    if cache is not None:
+        cached = await _cache_get(cache, key)
+        if cached is not None:
+            return cached
+    return await _in_flight.do(
+        key,
+        lambda: _call_uncached(key, system_prompt, user_prompt, model, temperature, timeout, json_schema, validate),
     )
 
-    return response.choices[0].message.content.strip()
+
+async def _call_uncached(
+    key: str,
+    system_prompt: str,
+    user_prompt: str,
+    model: Optional[str],
+    temperature: float,
+    timeout: Optional[float],
+    json_schema: Optional[dict],
+    validate: Optional[Callable[[str], bool]] = None,
+) -> str:
+    """call_llm past the cache check: deadline, retries, failover; writes the response cache."""
+    cache = get_response_cache()
+    timeout = config.LLM_TIMEOUT_S if timeout is None else timeout
+    deadline = time.monotonic() + timeout if timeout else None
+    _stats["calls"] += 1
+
+    attempt = 0
+    while True:
+        remaining = None if deadline is None else deadline - time.monotonic()
+        try:
+            if remaining is not None and remaining <= 0:
+                raise asyncio.TimeoutError()
+            text = await asyncio.wait_for(
+                _complete_hedged(attempt, system_prompt, user_prompt, model, temperature, json_schema),
+                timeout=remaining,
+            )
+            break
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                _stats["timeouts"] += 1
+            delay = _backoff(attempt)
+            out_of_time = deadline is not None and time.monotonic() + delay >= deadline
+            if not _is_transient(e) or attempt >= config.LLM_MAX_RETRIES or out_of_time:
+                raise
+            _stats["retries"] += 1
+            attempt += 1
+            _count_failover(attempt)
+            await asyncio.sleep(delay)
+
+    if cache is not None and (validate is None or validate(text)):
+        await _cache_set(cache, key, text)
+    return text
+
+
+async def stream_llm(
+    system_prompt: str,
+    user_prompt: str,
+    model: Optional[str] = None,
+    temperature: float = 0.7,
+    use_cache: bool = True,
+    json_schema: Optional[dict] = None,
+    validate: Optional[Callable[[str], bool]] = None,
+) -> AsyncIterator[str]:
+    """
+    Streaming variant of call_llm — yields text deltas as the LLM produces them.
+
+    A cached response is yielded in one piece. The complete streamed text is
+    written to the same cache that call_llm uses, subject to ``validate`` as
+    in call_llm. Transient errors before the
+    first token are retried on the next provider; once tokens have been sent
+    they are not. The whole stream, retries included, must finish within
+    LLM_TIMEOUT_S or asyncio.TimeoutError is raised.
+    """
+    system_prompt = system_prompt.strip()
+    user_prompt = user_prompt.strip()
+
+    cache = get_response_cache()
+    key = _cache_key(system_prompt, user_prompt, model, temperature, json_schema)
+    if cache is not None and use_cache:
+        cached = await _cache_get(cache, key)
+        if cached is not None:
+            yield cached
+            return
+
+    _stats["calls"] += 1
+    deadline = time.monotonic() + config.LLM_TIMEOUT_S if config.LLM_TIMEOUT_S else None
+
+    def remaining() -> Optional[float]:
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    parts: list[str] = []
+    admission = get_admission_controller()
+    async with admission.slot(_estimate_tokens(system_prompt, user_prompt), config.LLM_QUEUE_TIMEOUT_S):
+        attempt = 0
+        while True:
+            provider, provider_model = _pick_provider(attempt, model)
+            stream = provider.stream(
+                system_prompt, user_prompt, model=provider_model, temperature=temperature, json_schema=json_schema
+            )
+            try:
+                first = await asyncio.wait_for(anext(stream, None), timeout=remaining())
+                break
+            except Exception as e:
+                await stream.aclose()
+                if isinstance(e, asyncio.TimeoutError):
+                    _stats["timeouts"] += 1
+                delay = _backoff(attempt)
+                out_of_time = deadline is not None and time.monotonic() + delay >= deadline
+                if not _is_transient(e) or attempt >= config.LLM_MAX_RETRIES or out_of_time:
+                    raise
+                _stats["retries"] += 1
+                await asyncio.sleep(delay)
+                attempt += 1
+                _count_failover(attempt)
+
+        try:
+            delta = first
+            while delta is not None:
+                parts.append(delta)
+                yield delta
+                delta = await asyncio.wait_for(anext(stream, None), timeout=remaining())
+        except asyncio.TimeoutError:
+            _stats["timeouts"] += 1
+            raise
+        finally:
+            await stream.aclose()
+
+    text = "".join(parts).strip()
+    if cache is not None and (validate is None or validate(text)):
+        await _cache_set(cache, key, text)
@@ -0,0 +1,64 @@
+"""
+Local OpenAI-compatible stub server backed by FakeProvider.
+Lets the real OpenAI provider path (HTTP, pooling, SSE parsing) be load-tested offline:
+
+    uvicorn mediator_engine.fake_server:app --port 9000
+    OPENAI_BASE_URL=http://127.0.0.1:9000/v1 OPENAI_API_KEY=fake uvicorn backend.main:app
+"""
+
+import json
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from backend import config
+from .providers import FakeProvider
+
+app = FastAPI(title="Fake LLM")
+provider = FakeProvider(latency_s=config.FAKE_LLM_LATENCY_S, tokens_per_s=config.FAKE_LLM_TOKENS_PER_S)
+
+
+def _prompts(messages: list[dict]) -> tuple[str, str]:
+    """Pull the system and user prompt text out of chat messages."""
+    system = "\n".join(m["content"] for m in messages if m.get("role") == "system")
+    user = "\n".join(m["content"] for m in messages if m.get("role") == "user")
+    return system, user
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    """Minimal /chat/completions: non-streaming JSON or an SSE chunk stream."""
+    body = await request.json()
+    system, user = _prompts(body.get("messages", []))
+    model = body.get("model", provider.default_model)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    if body.get("stream"):
+        async def events():
+            async for token in provider.stream(system, user):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    text = await provider.complete(system, user)
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [
+            {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+        ],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
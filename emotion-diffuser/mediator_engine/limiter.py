@@ -0,0 +1,217 @@
+"""
+Admission control for LLM calls — bounded concurrency, token budget, and load shedding.
+Keeps bursts from turning into provider rate-limit storms: requests queue for a
+slot, the in-flight limit adapts to 429s and latency (AIMD), and requests that
+cannot start before their deadline are shed instead of piling up.
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+
+class LLMOverloadedError(RuntimeError):
+    """Raised when an LLM call is shed because it can't be admitted in time."""
+
+
+class AdmissionController:
+    """
+    Client-side admission controller for an LLM provider.
+
+    Parameters
+    ----------
+    max_in_flight : int
+        Upper bound for concurrent provider calls (the adaptive limit starts here).
+    tokens_per_minute : int
+        Token budget per minute across all calls (0 = unlimited).
+    max_queue : int
+        Requests waiting beyond this are shed immediately.
+    target_latency_s : float
+        Calls slower than this nudge the concurrency limit down.
+    min_in_flight : int
+        The adaptive limit never drops below this.
+    """
+
+    # Smoothing factor for the latency / wait-time moving averages
+    _EWMA_ALPHA = 0.2
+
+    def __init__(
+        self,
+        max_in_flight: int = 16,
+        tokens_per_minute: int = 0,
+        max_queue: int = 256,
+        target_latency_s: float = 8.0,
+        min_in_flight: int = 1,
+    ):
+        self.max_in_flight = max(1, max_in_flight)
+        self.min_in_flight = max(1, min(min_in_flight, self.max_in_flight))
+        self.limit = float(self.max_in_flight)
+        self.tokens_per_minute = tokens_per_minute
+        self.max_queue = max_queue
+        self.target_latency_s = target_latency_s
+
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+
+        # Metrics
+        self.admitted = 0
+        self.shed = 0
+        self.rate_limited = 0
+        self.avg_wait_s = 0.0
+        self.max_wait_s = 0.0
+        self.avg_latency_s: Optional[float] = None
+
+    # ── Admission ───────────────────────
+
+    async def acquire(self, tokens: int = 0, timeout: Optional[float] = None) -> None:
+        """
+        Wait for a concurrency slot and enough token budget.
+
+        Raises LLMOverloadedError if the queue is full, if the expected wait
+        exceeds ``timeout``, or if ``timeout`` runs out while queued.
+        """
+        start = time.monotonic()
+        deadline = start + timeout if timeout else None
+
+        if self._waiters or self.in_flight >= int(self.limit):
+            if len(self._waiters) >= self.max_queue:
+                self._shed("LLM queue is full")
+            if timeout and self._expected_wait() > timeout:
+                self._shed("expected LLM queue wait exceeds the deadline")
+            await self._wait_for_slot(deadline)
+        else:
+            self.in_flight += 1
+
+        token_wait = self._reserve_tokens(tokens)
+        if token_wait > 0:
+            if deadline and time.monotonic() + token_wait > deadline:
+                self._tokens += tokens
+                self.release()
+                self._shed("LLM token budget exhausted until after the deadline")
+            try:
+                await asyncio.sleep(token_wait)
+            except asyncio.CancelledError:
+                # Cancelled while holding the slot (deadline, losing hedge, stage timeout)
+                self._tokens += tokens
+                self.release()
+                raise
+
+        waited = time.monotonic() - start
+        self.admitted += 1
+        self.max_wait_s = max(self.max_wait_s, waited)
+        self.avg_wait_s += self._EWMA_ALPHA * (waited - self.avg_wait_s)
+
+    async def _wait_for_slot(self, deadline: Optional[float]) -> None:
+        """Queue until release() hands this caller a slot."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            await asyncio.wait_for(future, timeout=remaining)
+        except asyncio.TimeoutError:
+            self._discard(future)
+            self._shed("timed out waiting for an LLM slot")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # the slot was granted just as we were cancelled
+            else:
+                self._discard(future)
+            raise
+
+    def release(self, latency_s: Optional[float] = None, rate_limited: bool = False) -> None:
+        """Return a slot, feeding the call's outcome into the adaptive limit."""
+        if rate_limited:
+            self.rate_limited += 1
+            # Multiplicative decrease on provider push-back
+            self.limit = max(self.min_in_flight, self.limit / 2)
+        elif latency_s is not None:
+            if self.avg_latency_s is None:
+                self.avg_latency_s = latency_s
+            else:
+                self.avg_latency_s += self._EWMA_ALPHA * (latency_s - self.avg_latency_s)
+            if latency_s > self.target_latency_s:
+                self.limit = max(self.min_in_flight, self.limit * 0.9)
+            else:
+                # Additive increase: about +1 per "limit" healthy calls
+                self.limit = min(self.max_in_flight, self.limit + 1 / self.limit)
+
+        self.in_flight -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        """Hold an admission slot for the duration of one provider call."""
+        await self.acquire(tokens, timeout)
+        start = time.monotonic()
+        latency_s: Optional[float] = None
+        rate_limited = False
+        try:
+            yield
+            latency_s = time.monotonic() - start
+        except asyncio.CancelledError:
+            # A call cut short (e.g. the losing hedge) says nothing about provider latency
+            raise
+        except Exception as e:
+            latency_s = time.monotonic() - start
+            rate_limited = getattr(e, "status_code", None) == 429
+            raise
+        finally:
+            self.release(latency_s, rate_limited)
+
+    # ── Internals ───────────────────────
+
+    def _wake(self) -> None:
+        """Hand free slots to queued callers, oldest first."""
+        while self._waiters and self.in_flight < int(self.limit):
+            future = self._waiters.popleft()
+            if future.done():
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _discard(self, future: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(future)
+        except ValueError:
+            pass
+
+    def _shed(self, reason: str) -> None:
+        self.shed += 1
+        raise LLMOverloadedError(f"LLM overloaded: {reason}")
+
+    def _expected_wait(self) -> float:
+        """Rough queueing delay for a new arrival, from observed call latency."""
+        if self.avg_latency_s is None:
+            return 0.0
+        return (len(self._waiters) + 1) / max(1, int(self.limit)) * self.avg_latency_s
+
+    def _reserve_tokens(self, tokens: int) -> float:
+        """Take tokens from the per-minute bucket; return seconds until they're covered."""
+        if self.tokens_per_minute <= 0 or tokens <= 0:
+            return 0.0
+        now = time.monotonic()
+        rate = self.tokens_per_minute / 60
+        self._tokens = min(self.tokens_per_minute, self._tokens + (now - self._refilled_at) * rate)
+        self._refilled_at = now
+        self._tokens -= tokens
+        return 0.0 if self._tokens >= 0 else -self._tokens / rate
+
+    def stats(self) -> dict:
+        """Queue depth, wait times and limiter state for the metrics endpoint."""
+        return {
+            "limit": round(self.limit, 2),
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "queue_depth": len(self._waiters),
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "rate_limited": self.rate_limited,
+            "avg_wait_ms": round(self.avg_wait_s * 1000, 1),
+            "max_wait_ms": round(self.max_wait_s * 1000, 1),
+            "avg_latency_ms": round(self.avg_latency_s * 1000, 1) if self.avg_latency_s is not None else None,
+            "tokens_available": round(self._tokens) if self.tokens_per_minute > 0 else None,
+        }
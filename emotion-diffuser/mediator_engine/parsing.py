@@ -0,0 +1,198 @@
+"""
+Parsing of LLM output — structured-output schemas, a tolerant apology
+component parser, and incremental parsing of streamed responses.
+Lets the apology path emit each of the 5 components as soon as it is complete.
+"""
+
+import json
+import re
+
+# The 5 psychological apology components, in the order the prompt asks for them
+COMPONENT_KEYS = ("acknowledgment", "responsibility", "remorse", "repair", "invitation")
+
+# "key": "string value" — only matches once the closing quote has arrived
+_COMPONENT_RE = re.compile(
+    r'"(' + "|".join(COMPONENT_KEYS) + r')"\s*:\s*"((?:[^"\\]|\\.)*)"',
+    re.DOTALL,
+)
+
+# "key": "unterminated value — a truncated response's last component
+_PARTIAL_RE = re.compile(
+    r'"(' + "|".join(COMPONENT_KEYS) + r')"\s*:\s*"((?:[^"\\]|\\.)*)\\?$',
+    re.DOTALL,
+)
+
+# ────────────────────────────────────────
+# Structured-output schemas (response_format=json_schema)
+# ────────────────────────────────────────
+
+_COMPONENTS_SCHEMA = {
+    "type": "object",
+    "properties": {key: {"type": "string"} for key in COMPONENT_KEYS},
+    "required": list(COMPONENT_KEYS),
+    "additionalProperties": False,
+}
+
+APOLOGY_SCHEMA = {"name": "apology", "schema": _COMPONENTS_SCHEMA, "strict": True}
+
+MEDIATION_SCHEMA = {
+    "name": "mediation",
+    "schema": {
+        "type": "object",
+        "properties": {"rewrite": {"type": "string"}, "apology": _COMPONENTS_SCHEMA},
+        "required": ["rewrite", "apology"],
+        "additionalProperties": False,
+    },
+    "strict": True,
+}
+
+# Outcome counters for the metrics endpoint — "failed" responses were wasted LLM calls
+_stats = {"parsed": 0, "recovered": 0, "failed": 0}
+
+
+def parse_stats() -> dict:
+    """Parse outcome counters and the failure rate."""
+    total = sum(_stats.values())
+    return {**_stats, "failure_rate": round(_stats["failed"] / total, 4) if total else 0.0}
+
+
+def record_parse(outcome: str) -> None:
+    """Count one parse outcome: parsed, recovered, or failed."""
+    _stats[outcome] += 1
+
+
+def parse_json_object(raw: str) -> dict | None:
+    """
+    Parse a JSON object from an LLM response, tolerating markdown fences
+    and chatter around the object.
+    """
+    if not isinstance(raw, str):
+        return None
+    start, end = raw.find("{"), raw.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        parsed = json.loads(raw[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+def recover_components(raw: str) -> dict[str, str]:
+    """
+    Pull whatever apology components can be found in malformed or truncated
+    output — complete "key": "value" pairs plus a trailing unterminated value.
+    """
+    parser = ApologyStreamParser()
+    parser.feed(raw)
+    return parser.finish()
+
+
+def _classify_components(raw: str) -> tuple[str, dict[str, str] | None]:
+    """(outcome, components): "parsed" for complete JSON, "recovered", or "failed" with None."""
+    parsed = parse_json_object(raw)
+    if parsed is not None and any(parsed.get(key) for key in COMPONENT_KEYS):
+        return "parsed", {key: str(parsed.get(key) or "") for key in COMPONENT_KEYS}
+
+    components = recover_components(raw or "")
+    if components:
+        return "recovered", {key: components.get(key, "") for key in COMPONENT_KEYS}
+    return "failed", None
+
+
+def parse_components(raw: str) -> dict[str, str] | None:
+    """
+    Extract the apology components from a full response.
+
+    Tries strict JSON first, then recovers from broken or partial output.
+    Returns None when nothing usable was found.
+    """
+    return _classify_components(raw)[1]
+
+
+def parse_mediation(raw: str) -> tuple[str, dict[str, str]] | None:
+    """
+    (rewrite, apology components) from a combined mediation response.
+    None unless the rewrite is non-empty and at least one component is.
+    """
+    parsed = parse_json_object(raw)
+    rewritten = parsed.get("rewrite") if parsed else None
+    apology = parsed.get("apology") if parsed else None
+    if not isinstance(rewritten, str) or not rewritten.strip() or not isinstance(apology, dict):
+        return None
+    components = {key: str(apology.get(key) or "").strip() for key in COMPONENT_KEYS}
+    if not any(components.values()):
+        return None
+    return rewritten.strip(), components
+
+
+# ────────────────────────────────────────
+# Response checks (call_llm ``validate`` hooks)
+# ────────────────────────────────────────
+# Run once per fresh LLM response, never on cache hits, so parse_stats()
+# reflects provider output and only well-formed responses are cached.
+
+def check_apology(raw: str) -> bool:
+    """Count a fresh apology response's parse outcome; True if it is complete JSON."""
+    outcome, _ = _classify_components(raw)
+    record_parse(outcome)
+    return outcome == "parsed"
+
+
+def check_mediation(raw: str) -> bool:
+    """Count a fresh combined response's parse outcome; True if it is usable."""
+    ok = parse_mediation(raw) is not None
+    record_parse("parsed" if ok else "failed")
+    return ok
+
+
+class ApologyStreamParser:
+    """
+    Feed streamed text chunks; get back each apology component once it is complete.
+
+    Example
+    -------
+    >>> parser = ApologyStreamParser()
+    >>> parser.feed('{"acknowledgment": "I hurt')
+    []
+    >>> parser.feed(' you.", "resp')
+    [('acknowledgment', 'I hurt you.')]
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.components: dict[str, str] = {}
+        self._pos = 0  # everything before this offset has already been parsed
+
+    def feed(self, chunk: str) -> list[tuple[str, str]]:
+        """Append a chunk and return the (key, value) pairs it completed."""
+        self.buffer += chunk
+        completed = []
+        for match in _COMPONENT_RE.finditer(self.buffer, self._pos):
+            self._pos = match.end()
+            key = match.group(1)
+            if key in self.components:
+                continue
+            try:
+                value = json.loads(f'"{match.group(2)}"')
+            except json.JSONDecodeError:
+                value = match.group(2)
+            self.components[key] = value
+            completed.append((key, value))
+        return completed
+
+    def finish(self) -> dict[str, str]:
+        """
+        Call once the stream has ended: returns all components, including a
+        last one whose closing quote never arrived (e.g. a truncated response).
+        """
+        match = _PARTIAL_RE.search(self.buffer, self._pos)
+        if match and match.group(1) not in self.components:
+            raw_value = match.group(2)
+            try:
+                value = json.loads(f'"{raw_value}"')
+            except json.JSONDecodeError:
+                value = raw_value
+            if value.strip():
+                self.components[match.group(1)] = value.strip()
+        return dict(self.components)
@@ -183,6 +183,98 @@ Original Message:
 {text}
 {emotion_hint}"""
 
+# ────────────────────────────────────────
+# SYSTEM PROMPTS — combined rewrite + apology (one LLM call)
+# ────────────────────────────────────────
+
+MEDIATION_SYSTEM_PROMPT = """\
+You are a calm emotional mediator and conflict-resolution expert.
+For the user's message, produce BOTH a calmer rewrite and a sincere apology
+following the 5-component psychological model.
+Tone Requirement: {tone_requirement}
+
+{mode_guidance}
+
+Here is a rewrite example for this relationship:
+BAD:  {example_bad}
+GOOD: {example_good}
+
+Example apology for this relationship type:
+Situation: {example_situation}
+Apology:  {example_apology}
+
+For the rewrite: preserve the core meaning but remove hostility, sarcasm, and blame.
+Keep it concise — roughly the same length as the original.
+
+You MUST respond in valid JSON with exactly these keys:
+{{
+  "rewrite": "The calmer, constructive version of the message",
+  "apology": {{
+    "acknowledgment": "Names the specific harm done",
+    "responsibility": "Takes ownership without excuses",
+    "remorse": "Expresses genuine regret",
+    "repair": "Offers a concrete corrective action",
+    "invitation": "Invites the other person to share their feelings"
+  }}
+}}
+
+Write naturally and empathetically. Each apology value should be 1-2 sentences.
+Return ONLY the JSON object, no markdown fences, no extra text."""
+
+MEDIATION_USER_PROMPT = """\
+Original Message:
+{text}
+{emotion_hint}"""
+
+# ────────────────────────────────────────
+# PRECOMPILED SYSTEM PROMPTS — rendered once per mode at import
+# ────────────────────────────────────────
+# System prompts depend only on the relationship mode, so each is rendered
+# once here and reused byte-for-byte on every request (which also lets
+# provider-side prompt caching hit). Only the small user prompt is
+# formatted per request.
+
+RELATIONSHIP_MODES: tuple[str, ...] = tuple(MODE_GUIDANCE)
+
+
+def normalize_mode(relationship: str | None) -> str:
+    """Map a relationship string onto a known mode (unknown → "neutral")."""
+    mode = (relationship or "").strip().lower()
+    return mode if mode in MODE_GUIDANCE else "neutral"
+
+
+REWRITE_SYSTEM_PROMPTS: dict[str, str] = {
+    mode: REWRITE_SYSTEM_PROMPT.format(
+        tone_requirement=TONE_RULES[mode],
+        mode_guidance=MODE_GUIDANCE[mode],
+        example_bad=REWRITE_EXAMPLES[mode]["bad"],
+        example_good=REWRITE_EXAMPLES[mode]["good"],
+    ).strip()
+    for mode in RELATIONSHIP_MODES
+}
+
+APOLOGY_SYSTEM_PROMPTS: dict[str, str] = {
+    mode: APOLOGY_SYSTEM_PROMPT.format(
+        tone_requirement=TONE_RULES[mode],
+        mode_guidance=MODE_GUIDANCE[mode],
+        example_situation=APOLOGY_EXAMPLES[mode]["situation"],
+        example_apology=APOLOGY_EXAMPLES[mode]["apology"],
+    ).strip()
+    for mode in RELATIONSHIP_MODES
+}
+
+MEDIATION_SYSTEM_PROMPTS: dict[str, str] = {
+    mode: MEDIATION_SYSTEM_PROMPT.format(
+        tone_requirement=TONE_RULES[mode],
+        mode_guidance=MODE_GUIDANCE[mode],
+        example_bad=REWRITE_EXAMPLES[mode]["bad"],
+        example_good=REWRITE_EXAMPLES[mode]["good"],
+        example_situation=APOLOGY_EXAMPLES[mode]["situation"],
+        example_apology=APOLOGY_EXAMPLES[mode]["apology"],
+    ).strip()
+    for mode in RELATIONSHIP_MODES
+}
+
 # ────────────────────────────────────────
 # PSYCHOLOGY-BACKED RE-ENGAGEMENT TRIGGERS
 # ────────────────────────────────────────
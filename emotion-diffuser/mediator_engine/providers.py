@@ -0,0 +1,244 @@
+"""
+LLM providers — one interface over OpenAI, Gemini, and a local fake.
+Each provider owns its own HTTP connection pool; client.call_llm picks
+providers in LLM_PROVIDERS order and fails over between them.
+"""
+
+import asyncio
+import json
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Optional
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+from backend import config
+
+# Gemini's OpenAI-compatible endpoint
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai/"
+
+
+class LLMProvider(ABC):
+    """Base class: a named chat-completion backend with a default model."""
+
+    name: str = "base"
+
+    def __init__(self, default_model: str):
+        self.default_model = default_model
+
+    @abstractmethod
+    async def complete(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        json_schema: Optional[dict] = None,
+    ) -> str:
+        """
+        Return the full completion text for a system + user prompt.
+        ``json_schema`` asks for structured JSON output where the provider supports it.
+        """
+
+    @abstractmethod
+    def stream(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        json_schema: Optional[dict] = None,
+    ) -> AsyncIterator[str]:
+        """Yield completion text deltas as they are generated (implement as an async generator)."""
+
+    async def aclose(self) -> None:
+        """Release pooled connections."""
+
+
+def _messages(system_prompt: str, user_prompt: str) -> list[dict]:
+    """Chat messages for a system + user prompt pair."""
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+# ────────────────────────────────────────
+# OpenAI-compatible HTTP providers
+# ────────────────────────────────────────
+
+class OpenAICompatibleProvider(LLMProvider):
+    """
+    Any OpenAI-compatible chat API (OpenAI itself, Gemini, a local fake server).
+
+    ``json_mode`` is how structured output is requested: "json_schema"
+    (schema-constrained), "json_object" (any valid JSON), or "off".
+    """
+
+    def __init__(
+        self,
+        name: str,
+        api_key: str,
+        default_model: str,
+        base_url: Optional[str] = None,
+        max_connections: int = 50,
+        json_mode: str = "json_object",
+    ):
+        super().__init__(default_model)
+        self.name = name
+        self.json_mode = json_mode
+        # Dedicated keep-alive pool per provider; retries/timeouts are handled in call_llm
+        self._client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url or None,
+            timeout=config.LLM_TIMEOUT_S or None,
+            max_retries=0,
+            http_client=openai.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                ),
+            ),
+        )
+
+    def _format_options(self, json_schema: Optional[dict]) -> dict:
+        """response_format option for a structured-output request (none if unsupported)."""
+        if json_schema is None or self.json_mode == "off":
+            return {}
+        if self.json_mode == "json_schema":
+            return {"response_format": {"type": "json_schema", "json_schema": json_schema}}
+        return {"response_format": {"type": "json_object"}}
+
+    async def complete(self, system_prompt, user_prompt, model=None, temperature=0.7, json_schema=None) -> str:
+        response = await self._client.chat.completions.create(
+            model=model or self.default_model,
+            temperature=temperature,
+            messages=_messages(system_prompt, user_prompt),
+            **self._format_options(json_schema),
+        )
+        return response.choices[0].message.content.strip()
+
+    async def stream(
+        self, system_prompt, user_prompt, model=None, temperature=0.7, json_schema=None
+    ) -> AsyncIterator[str]:
+        stream = await self._client.chat.completions.create(
+            model=model or self.default_model,
+            temperature=temperature,
+            messages=_messages(system_prompt, user_prompt),
+            stream=True,
+            **self._format_options(json_schema),
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    async def aclose(self) -> None:
+        await self._client.close()
+
+
+# ────────────────────────────────────────
+# In-process fake (offline load testing)
+# ────────────────────────────────────────
+
+class FakeProvider(LLMProvider):
+    """
+    Offline stand-in with configurable latency and token rate.
+
+    Answers in the shape each prompt asks for — plain text for rewrites,
+    the 5-component JSON for apologies, rewrite + apology JSON for the
+    combined mediation prompt — so the whole /pipeline path works offline.
+
+    Parameters
+    ----------
+    latency_s : float
+        Delay before the first token.
+    tokens_per_s : float
+        Generation speed after the first token (0 = instant).
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_s: float = 0.3, tokens_per_s: float = 50.0, default_model: str = "fake-llm"):
+        super().__init__(default_model)
+        self.latency_s = latency_s
+        self.tokens_per_s = tokens_per_s
+        self.calls = 0
+
+    @staticmethod
+    def respond(system_prompt: str) -> str:
+        """The canned response for a given system prompt."""
+        rewrite = "I feel hurt by what happened, and I'd like us to talk it through calmly."
+        components = {
+            "acknowledgment": "I know what I said hurt you.",
+            "responsibility": "That was my fault, and I own it.",
+            "remorse": "I'm truly sorry.",
+            "repair": "I'll be more careful with my words from now on.",
+            "invitation": "Would you be willing to tell me how it felt?",
+        }
+        if '"rewrite"' in system_prompt and '"apology"' in system_prompt:
+            return json.dumps({"rewrite": rewrite, "apology": components})
+        if '"acknowledgment"' in system_prompt:
+            return json.dumps(components)
+        return rewrite
+
+    def _tokens(self, text: str) -> list[str]:
+        # Whitespace-split pieces stand in for tokens
+        return [piece + " " for piece in text.split(" ")[:-1]] + [text.split(" ")[-1]]
+
+    async def complete(self, system_prompt, user_prompt, model=None, temperature=0.7, json_schema=None) -> str:
+        self.calls += 1
+        text = self.respond(system_prompt)
+        generation = len(self._tokens(text)) / self.tokens_per_s if self.tokens_per_s > 0 else 0.0
+        await asyncio.sleep(self.latency_s + generation)
+        return text
+
+    async def stream(
+        self, system_prompt, user_prompt, model=None, temperature=0.7, json_schema=None
+    ) -> AsyncIterator[str]:
+        self.calls += 1
+        await asyncio.sleep(self.latency_s)
+        for token in self._tokens(self.respond(system_prompt)):
+            if self.tokens_per_s > 0:
+                await asyncio.sleep(1 / self.tokens_per_s)
+            yield token
+
+
+# ────────────────────────────────────────
+# Factory
+# ────────────────────────────────────────
+
+def build_provider(name: str) -> LLMProvider:
+    """Create a provider by name: openai, gemini, or fake."""
+    name = name.strip().lower()
+
+    if name == "openai":
+        if not config.OPENAI_API_KEY:
+            raise RuntimeError("OPENAI_API_KEY not set in environment.")
+        return OpenAICompatibleProvider(
+            "openai",
+            api_key=config.OPENAI_API_KEY,
+            default_model=config.LLM_MODEL,
+            base_url=config.OPENAI_BASE_URL,
+            max_connections=config.LLM_MAX_CONNECTIONS,
+            json_mode=config.LLM_JSON_MODE,
+        )
+
+    if name == "gemini":
+        if not config.GEMINI_API_KEY:
+            raise RuntimeError("GEMINI_API_KEY not set in environment.")
+        return OpenAICompatibleProvider(
+            "gemini",
+            api_key=config.GEMINI_API_KEY,
+            default_model=config.GEMINI_MODEL,
+            base_url=GEMINI_BASE_URL,
+            max_connections=config.LLM_MAX_CONNECTIONS,
+            json_mode=config.LLM_JSON_MODE,
+        )
+
+    if name == "fake":
+        return FakeProvider(latency_s=config.FAKE_LLM_LATENCY_S, tokens_per_s=config.FAKE_LLM_TOKENS_PER_S)
+
+    raise ValueError(f"Unknown LLM provider: {name!r}")
@@ -3,19 +3,27 @@ LLM-powered message rewriting and apology generation.
 Uses mode-specific prompts, few-shot examples, and relationship guidance.
 """
 
-import json
 import logging
-
-from .client import call_llm
+from typing import AsyncIterator
+
+from .client import call_llm, stream_llm
+from .parsing import (
+    APOLOGY_SCHEMA,
+    MEDIATION_SCHEMA,
+    ApologyStreamParser,
+    check_apology,
+    check_mediation,
+    parse_components,
+    parse_mediation,
+)
 from .prompts import (
-    REWRITE_SYSTEM_PROMPT,
+    REWRITE_SYSTEM_PROMPTS,
     REWRITE_USER_PROMPT,
-    APOLOGY_SYSTEM_PROMPT,
+    APOLOGY_SYSTEM_PROMPTS,
     APOLOGY_USER_PROMPT,
-    TONE_RULES,
-    MODE_GUIDANCE,
-    REWRITE_EXAMPLES,
-    APOLOGY_EXAMPLES,
+    MEDIATION_SYSTEM_PROMPTS,
+    MEDIATION_USER_PROMPT,
+    normalize_mode,
 )
 
 logger = logging.getLogger(__name__)
@@ -30,52 +38,28 @@ _EMPTY_COMPONENTS: dict[str, str] = {
 }
 
 
-def _get_tone_requirement(relationship: str = "neutral") -> str:
-    """Get the specific tone requirement based on the relationship."""
-    return TONE_RULES.get(relationship.lower(), TONE_RULES["neutral"])
-
-
-def _get_mode_guidance(relationship: str = "neutral") -> str:
-    """Get relationship-specific guidance for the LLM system prompt."""
-    return MODE_GUIDANCE.get(relationship.lower(), MODE_GUIDANCE["neutral"])
-
-
-def _get_rewrite_example(relationship: str = "neutral") -> dict:
-    """Get the mode-specific rewrite few-shot example."""
-    return REWRITE_EXAMPLES.get(relationship.lower(), REWRITE_EXAMPLES["neutral"])
-
-
-def _get_apology_example(relationship: str = "neutral") -> dict:
-    """Get the mode-specific apology few-shot example."""
-    return APOLOGY_EXAMPLES.get(relationship.lower(), APOLOGY_EXAMPLES["neutral"])
+def _system_prompt(prompts: dict[str, str], relationship: str = "neutral") -> str:
+    """Precompiled system prompt for a mode; exact mode names skip normalization."""
+    prompt = prompts.get(relationship)
+    return prompt if prompt is not None else prompts[normalize_mode(relationship)]
 
 
-async def rewrite_message_llm(text: str, analysis=None, relationship: str = "neutral") -> str:
+async def rewrite_message_llm(
+    text: str, analysis=None, relationship: str = "neutral", use_cache: bool = True
+) -> str:
     """Rewrite a message to be calmer and more constructive via the LLM."""
-    tone_requirement = _get_tone_requirement(relationship)
-    mode_guidance = _get_mode_guidance(relationship)
-    example = _get_rewrite_example(relationship)
-
-    emotion_hint = ""
-    if analysis:
-        emotion_hint = f"\nDetected emotion: {analysis.emotion} (intensity {analysis.intensity})"
-
-    user_prompt = REWRITE_USER_PROMPT.format(text=text, emotion_hint=emotion_hint)
-    system_prompt = REWRITE_SYSTEM_PROMPT.format(
-        tone_requirement=tone_requirement,
-        mode_guidance=mode_guidance,
-        example_bad=example["bad"],
-        example_good=example["good"],
-    )
+    user_prompt = REWRITE_USER_PROMPT.format(text=text, emotion_hint=_emotion_hint(analysis))
+    system_prompt = _system_prompt(REWRITE_SYSTEM_PROMPTS, relationship)
 
     return await call_llm(
         system_prompt=system_prompt,
         user_prompt=user_prompt,
+        use_cache=use_cache,
     )
 
 
 async def generate_apology_llm(
-    text: str, analysis=None, relationship: str = "neutral"
+    text: str, analysis=None, relationship: str = "neutral", use_cache: bool = True
 ) -> tuple[str, dict[str, str]]:
     """
     Generate a structured apology via the LLM.
@@ -86,45 +70,120 @@ async def generate_apology_llm(
         (full_apology_text, components_dict) where components_dict has
         keys: acknowledgment, responsibility, remorse, repair, invitation.
     """
-    tone_requirement = _get_tone_requirement(relationship)
-    mode_guidance = _get_mode_guidance(relationship)
-    example = _get_apology_example(relationship)
-
-    emotion_hint = ""
-    if analysis:
-        emotion_hint = f"\nDetected emotion: {analysis.emotion} (intensity {analysis.intensity})"
-
-    user_prompt = APOLOGY_USER_PROMPT.format(text=text, emotion_hint=emotion_hint)
-    system_prompt = APOLOGY_SYSTEM_PROMPT.format(
-        tone_requirement=tone_requirement,
-        mode_guidance=mode_guidance,
-        example_situation=example["situation"],
-        example_apology=example["apology"],
+    user_prompt = APOLOGY_USER_PROMPT.format(text=text, emotion_hint=_emotion_hint(analysis))
+    system_prompt = _system_prompt(APOLOGY_SYSTEM_PROMPTS, relationship)
+
+    raw = await call_llm(
+        system_prompt=system_prompt,
+        user_prompt=user_prompt,
+        use_cache=use_cache,
+        json_schema=APOLOGY_SCHEMA,
+        validate=check_apology,
     )
 
+    components = _parse_components(raw)
+    return _join_components(components, raw), components
+
+
+async def rewrite_and_apologize_llm(
+    text: str, analysis=None, relationship: str = "neutral", use_cache: bool = True
+) -> tuple[str, str, dict[str, str]]:
+    """
+    Produce the calm rewrite AND the structured apology in a single LLM call.
+
+    Returns
+    -------
+    tuple[str, str, dict]
+        (rewritten_text, full_apology_text, components_dict).
+        If the combined response can't be parsed, falls back to the two
+        separate calls so callers always get both outputs.
+    """
+    user_prompt = MEDIATION_USER_PROMPT.format(text=text, emotion_hint=_emotion_hint(analysis))
+    system_prompt = _system_prompt(MEDIATION_SYSTEM_PROMPTS, relationship)
+
     raw = await call_llm(
         system_prompt=system_prompt,
         user_prompt=user_prompt,
+        use_cache=use_cache,
+        json_schema=MEDIATION_SCHEMA,
+        validate=check_mediation,
     )
 
-    # --- Parse structured JSON from the LLM response ---
-    try:
-        # LLM might sometimes include markdown code blocks
-        clean_raw = raw.strip()
-        if clean_raw.startswith("```"):
-            clean_raw = clean_raw.split("\n", 1)[1].rsplit("\n", 1)[0].strip()
-            if clean_raw.startswith("json"):
-                clean_raw = clean_raw[4:].strip()
-
-        components = json.loads(clean_raw)
-        # Validate expected keys are present
-        for key in _EMPTY_COMPONENTS:
-            components.setdefault(key, "")
-    except (json.JSONDecodeError, TypeError, IndexError):
+    mediation = parse_mediation(raw)
+    if mediation is None:
+        logger.warning(f"Combined mediation response unusable — falling back to two calls: {raw[:100]}...")
+        rewritten = await rewrite_message_llm(text, analysis, relationship, use_cache=use_cache)
+        apology_text, components = await generate_apology_llm(text, analysis, relationship, use_cache=use_cache)
+        return rewritten, apology_text, components
+
+    rewritten, components = mediation
+    return rewritten, _join_components(components, raw), components
+
+
+# ────────────────────────────────────────
+# STREAMING VARIANTS
+# ────────────────────────────────────────
+
+async def stream_rewrite_llm(
+    text: str, analysis=None, relationship: str = "neutral", use_cache: bool = True
+) -> AsyncIterator[str]:
+    """Streaming rewrite_message_llm — yields the rewrite text as it is generated."""
+    user_prompt = REWRITE_USER_PROMPT.format(text=text, emotion_hint=_emotion_hint(analysis))
+    system_prompt = _system_prompt(REWRITE_SYSTEM_PROMPTS, relationship)
+
+    async for delta in stream_llm(system_prompt, user_prompt, use_cache=use_cache):
+        yield delta
+
+
+async def stream_apology_llm(
+    text: str, analysis=None, relationship: str = "neutral", use_cache: bool = True
+) -> AsyncIterator[tuple[str, dict]]:
+    """
+    Streaming generate_apology_llm.
+
+    Yields ``("component", {"key": ..., "text": ...})`` as soon as each of the
+    5 components has fully arrived, then one final
+    ``("done", {"apology": full_text, "components": components_dict})``.
+    """
+    user_prompt = APOLOGY_USER_PROMPT.format(text=text, emotion_hint=_emotion_hint(analysis))
+    system_prompt = _system_prompt(APOLOGY_SYSTEM_PROMPTS, relationship)
+
+    parser = ApologyStreamParser()
+    async for delta in stream_llm(
+        system_prompt, user_prompt, use_cache=use_cache, json_schema=APOLOGY_SCHEMA, validate=check_apology
+    ):
+        for key, value in parser.feed(delta):
+            yield "component", {"key": key, "text": value}
+
+    # The full response may still carry components the stream parser missed
+    components = _parse_components(parser.buffer)
+    for key, value in parser.components.items():
+        components[key] = components.get(key) or value
+    yield "done", {"apology": _join_components(components, parser.buffer), "components": components}
+
+
+# ────────────────────────────────────────
+# RESPONSE PARSING
+# ────────────────────────────────────────
+
+def _emotion_hint(analysis=None) -> str:
+    """Optional line telling the LLM what the analysis engine detected."""
+    if not analysis:
+        return ""
+    return f"\nDetected emotion: {analysis.emotion} (intensity {analysis.intensity})"
+
+
+def _parse_components(raw: str) -> dict[str, str]:
+    """Extract the 5 apology components, recovering what it can from broken JSON."""
+    components = parse_components(raw)
+    if components is None:
         logger.warning(f"Apology LLM did not return valid JSON — using raw text: {raw[:100]}...")
-        components = dict(_EMPTY_COMPONENTS)
+        return dict(_EMPTY_COMPONENTS)
+    return components
+
 
-    # Build a natural full-text apology from the components
+def _join_components(components: dict[str, str], raw: str) -> str:
+    """Build a natural full-text apology from the components (raw text if empty)."""
     full_apology = " ".join(
         v for v in [
             components.get("acknowledgment", ""),
@@ -140,4 +199,4 @@ async def generate_apology_llm(
     if not full_apology.strip():
         full_apology = raw
 
-    return full_apology, components
\ No newline at end of file
+    return full_apology
@@ -0,0 +1,349 @@
+"""
+Tests for analysis_engine.analyzer — inference plumbing with stubbed models.
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from analysis_engine import analyzer
+from backend.cache import LRUCache, SingleFlight, SQLiteCache
+
+
+def fake_emotions(texts):
+    time.sleep(0.05)  # stand-in for a blocking forward pass
+    return [[{"label": "anger", "score": 0.9}, {"label": "joy", "score": 0.1}] for _ in texts]
+
+
+def fake_toxicity(texts):
+    time.sleep(0.05)
+    return [{"label": "toxic", "score": 0.8} for _ in texts]
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(analyzer, "_batchers", {})
+    monkeypatch.setattr(analyzer, "_analysis_cache", LRUCache(max_entries=64))
+    monkeypatch.setattr(analyzer, "_persistent_cache", None)
+    monkeypatch.setattr(analyzer, "_in_flight", SingleFlight())
+
+
+@pytest.fixture
+def stub_models(monkeypatch):
+    monkeypatch.setattr(analyzer, "predict_emotions", fake_emotions)
+    monkeypatch.setattr(analyzer, "predict_toxicity", fake_toxicity)
+
+
+class TestAnalyzeText:
+    """Tests for analyze_text()."""
+
+    def test_formats_model_output(self, stub_models):
+        result = asyncio.run(analyzer.analyze_text("I am furious"))
+        assert result.emotion == "anger"
+        assert result.is_toxic is True
+        assert result.toxicity_score == 0.8
+        assert result.risk == "high"
+
+    def test_does_not_block_event_loop(self, stub_models):
+        async def scenario():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.005)
+
+            task = asyncio.create_task(ticker())
+            await analyzer.analyze_text("I am furious")
+            task.cancel()
+            return ticks
+
+        assert asyncio.run(scenario()) > 3
+
+    def test_models_run_concurrently(self, monkeypatch):
+        toxicity_started = threading.Event()
+
+        def waiting_emotions(texts):
+            # Only completes if the toxicity model is running at the same time
+            assert toxicity_started.wait(timeout=2)
+            return fake_emotions(texts)
+
+        def signalling_toxicity(texts):
+            toxicity_started.set()
+            return fake_toxicity(texts)
+
+        monkeypatch.setattr(analyzer, "predict_emotions", waiting_emotions)
+        monkeypatch.setattr(analyzer, "predict_toxicity", signalling_toxicity)
+        result = asyncio.run(analyzer.analyze_text("I am furious"))
+        assert result.emotion == "anger"
+
+    def test_model_failure_falls_back_to_neutral(self, monkeypatch):
+        def broken(texts):
+            raise RuntimeError("model unavailable")
+
+        monkeypatch.setattr(analyzer, "predict_emotions", broken)
+        monkeypatch.setattr(analyzer, "predict_toxicity", broken)
+        result = asyncio.run(analyzer.analyze_text("hello"))
+        assert result.emotion == "neutral"
+        assert result.risk == "low"
+
+
+class TestWarmUp:
+    """A failed warm-up is retried in the background until the models load."""
+
+    def test_retries_until_models_load(self, monkeypatch):
+        attempts = []
+
+        def flaky_warm_up():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise OSError("model hub unreachable")
+
+        monkeypatch.setattr(analyzer, "warm_up_models", flaky_warm_up)
+        monkeypatch.setattr(analyzer, "_ready", False)
+        monkeypatch.setattr(analyzer, "_warmup_error", None)
+        monkeypatch.setattr(analyzer.config, "INFERENCE_EXECUTOR", "thread")
+        monkeypatch.setattr(analyzer.config, "WARMUP_RETRY_BACKOFF_S", 0.01)
+
+        asyncio.run(analyzer.warm_up())
+        assert len(attempts) == 3
+        assert analyzer.is_ready() is True
+        assert analyzer.warmup_error() is None
+
+
+class TestAnalysisCache:
+    """Repeated texts should be served from the analysis cache."""
+
+    def test_repeat_skips_inference(self, monkeypatch):
+        calls = []
+
+        def counting_emotions(texts):
+            calls.append(list(texts))
+            return fake_emotions(texts)
+
+        monkeypatch.setattr(analyzer, "predict_emotions", counting_emotions)
+        monkeypatch.setattr(analyzer, "predict_toxicity", fake_toxicity)
+
+        first = asyncio.run(analyzer.analyze_text("You never listen"))
+        second = asyncio.run(analyzer.analyze_text("  You never   listen "))
+        assert first == second
+        assert len(calls) == 1
+        assert analyzer.get_analysis_cache().stats()["hits"] == 1
+
+    def test_fallback_not_cached(self, monkeypatch):
+        def broken(texts):
+            raise RuntimeError("model unavailable")
+
+        monkeypatch.setattr(analyzer, "predict_emotions", broken)
+        monkeypatch.setattr(analyzer, "predict_toxicity", broken)
+        asyncio.run(analyzer.analyze_text("hello"))
+        assert len(analyzer.get_analysis_cache()) == 0
+
+    def test_persistent_tier_survives_memory_loss(self, monkeypatch, tmp_path):
+        calls = []
+
+        def counting_emotions(texts):
+            calls.append(list(texts))
+            return fake_emotions(texts)
+
+        monkeypatch.setattr(analyzer, "predict_emotions", counting_emotions)
+        monkeypatch.setattr(analyzer, "predict_toxicity", fake_toxicity)
+        monkeypatch.setattr(analyzer, "_persistent_cache", SQLiteCache(str(tmp_path / "a.sqlite3")))
+
+        first = asyncio.run(analyzer.analyze_text("persist me"))
+        # Simulate a restart: the in-memory tier is gone, the file is not
+        monkeypatch.setattr(analyzer, "_analysis_cache", LRUCache(max_entries=64))
+        second = asyncio.run(analyzer.analyze_text("persist me"))
+        assert first == second
+        assert len(calls) == 1
+
+    def test_batch_reuses_cache_and_dedupes(self, monkeypatch):
+        calls = []
+
+        def counting_emotions(texts):
+            calls.append(list(texts))
+            return fake_emotions(texts)
+
+        monkeypatch.setattr(analyzer, "predict_emotions", counting_emotions)
+        monkeypatch.setattr(analyzer, "predict_toxicity", fake_toxicity)
+
+        asyncio.run(analyzer.analyze_text("seen before"))
+        results = asyncio.run(analyzer.analyze_texts(["seen before", "new", "new"]))
+        assert len(results) == 3
+        assert calls == [["seen before"], ["new"]]
+
+
+class TestCoalescing:
+    """Concurrent analyses of the same text share one forward pass."""
+
+    def test_concurrent_identical_texts_run_once(self, monkeypatch):
+        monkeypatch.setattr(analyzer.config, "ENABLE_MICRO_BATCHING", False)
+        calls = []
+
+        def counting_emotions(texts):
+            calls.append(list(texts))
+            return fake_emotions(texts)
+
+        monkeypatch.setattr(analyzer, "predict_emotions", counting_emotions)
+        monkeypatch.setattr(analyzer, "predict_toxicity", fake_toxicity)
+
+        async def scenario():
+            return await asyncio.gather(*(analyzer.analyze_text("I am furious") for _ in range(4)))
+
+        results = asyncio.run(scenario())
+        assert len(calls) == 1
+        assert len({id(r) for r in results}) == 4
+        assert analyzer.get_analysis_singleflight().stats()["coalesced"] == 3
+
+
+class TestAnalyzeTexts:
+    """Tests for the batched analyze_texts()."""
+
+    def test_runs_each_model_once_per_chunk(self, monkeypatch):
+        calls = []
+
+        def counting_emotions(texts):
+            calls.append(list(texts))
+            return fake_emotions(texts)
+
+        monkeypatch.setattr(analyzer, "predict_emotions", counting_emotions)
+        monkeypatch.setattr(analyzer, "predict_toxicity", fake_toxicity)
+        monkeypatch.setattr(analyzer.config, "BATCH_CHUNK_SIZE", 2)
+
+        texts = ["a" * 30, "b", "c" * 10, "d" * 20]
+        results = asyncio.run(analyzer.analyze_texts(texts))
+
+        assert len(results) == 4
+        assert all(r.emotion == "anger" for r in results)
+        # Bucketed by length: shortest texts share the first chunk
+        assert calls == [["b", "c" * 10], ["d" * 20, "a" * 30]]
+
+    def test_preserves_input_order(self, monkeypatch):
+        def echo_emotions(texts):
+            return [[{"label": t, "score": 0.5}] for t in texts]
+
+        monkeypatch.setattr(analyzer, "predict_emotions", echo_emotions)
+        monkeypatch.setattr(analyzer, "predict_toxicity", fake_toxicity)
+
+        texts = ["long message here", "hi", "medium one"]
+        results = asyncio.run(analyzer.analyze_texts(texts))
+        assert [r.emotion for r in results] == texts
+
+
+class TestMultiHeadAnalyzer:
+    """The shared-encoder path runs one combined forward pass per text or chunk."""
+
+    @pytest.fixture
+    def combined(self, monkeypatch):
+        calls = []
+
+        def fake_combined(texts):
+            calls.append(list(texts))
+            return list(zip(fake_emotions(texts), fake_toxicity(texts)))
+
+        def unused(texts):
+            raise AssertionError("separate models should not run")
+
+        monkeypatch.setattr(analyzer.config, "ENABLE_MULTIHEAD_ANALYZER", True)
+        monkeypatch.setattr(analyzer, "predict_combined", fake_combined)
+        monkeypatch.setattr(analyzer, "predict_emotions", unused)
+        monkeypatch.setattr(analyzer, "predict_toxicity", unused)
+        return calls
+
+    def test_matches_two_model_result(self, combined, monkeypatch):
+        result = asyncio.run(analyzer.analyze_text("I am furious"))
+        assert len(combined) == 1
+
+        monkeypatch.setattr(analyzer.config, "ENABLE_MULTIHEAD_ANALYZER", False)
+        monkeypatch.setattr(analyzer, "predict_emotions", fake_emotions)
+        monkeypatch.setattr(analyzer, "predict_toxicity", fake_toxicity)
+        reference = asyncio.run(analyzer.analyze_text("I am furious"))
+        assert result.model_dump(exclude={"analysis_id"}) == reference.model_dump(exclude={"analysis_id"})
+
+    def test_batch_runs_one_pass_per_chunk(self, combined, monkeypatch):
+        monkeypatch.setattr(analyzer.config, "BATCH_CHUNK_SIZE", 2)
+        results = asyncio.run(analyzer.analyze_texts(["a", "bb", "ccc"]))
+        assert len(results) == 3
+        assert [len(c) for c in combined] == [2, 1]
+
+    def test_cache_keys_differ_by_analyzer(self, monkeypatch):
+        monkeypatch.setattr(analyzer.config, "ENABLE_MULTIHEAD_ANALYZER", True)
+        shared = analyzer._cache_key("hello")
+        monkeypatch.setattr(analyzer.config, "ENABLE_MULTIHEAD_ANALYZER", False)
+        assert shared != analyzer._cache_key("hello")
+
+
+class TestLongTexts:
+    """Long messages are analyzed as sentence-aligned windows."""
+
+    @pytest.fixture
+    def windows(self, monkeypatch):
+        batches = []
+
+        def emotions(texts):
+            batches.append(list(texts))
+            return [
+                [{"label": "anger", "score": 0.9}, {"label": "joy", "score": 0.1}] if "idiot" in t
+                else [{"label": "anger", "score": 0.1}, {"label": "joy", "score": 0.9}]
+                for t in texts
+            ]
+
+        def toxicity(texts):
+            return [{"label": "toxic", "score": 0.9} if "idiot" in t else {"label": "non-toxic", "score": 0.95}
+                    for t in texts]
+
+        monkeypatch.setattr(analyzer, "predict_emotions", emotions)
+        monkeypatch.setattr(analyzer, "predict_toxicity", toxicity)
+        monkeypatch.setattr(analyzer.config, "ANALYSIS_CHUNK_MAX_CHARS", 40)
+        return batches
+
+    TEXT = "I had a lovely day at the park today. " * 3 + "But you are an idiot."
+
+    def test_chunks_are_batched_and_aggregated(self, windows):
+        result = asyncio.run(analyzer.analyze_text(self.TEXT))
+        assert windows == [[
+            "I had a lovely day at the park today.",
+            "I had a lovely day at the park today.",
+            "I had a lovely day at the park today.",
+            "But you are an idiot.",
+        ]]
+        assert result.emotion == "joy"
+        assert result.is_toxic is True
+        assert result.chunks is None
+
+    def test_chunk_detail_on_request(self, windows):
+        result = asyncio.run(analyzer.analyze_text(self.TEXT, include_chunks=True))
+        assert len(result.chunks) == 4
+        last = result.chunks[-1]
+        assert self.TEXT[last.start:last.end] == "But you are an idiot."
+        assert last.emotion == "anger" and last.is_toxic
+
+    def test_detail_served_from_cache(self, windows):
+        asyncio.run(analyzer.analyze_text(self.TEXT))
+        result = asyncio.run(analyzer.analyze_text(self.TEXT, include_chunks=True))
+        assert len(windows) == 1
+        assert len(result.chunks) == 4
+
+    def test_batch_chunks_long_texts(self, windows):
+        results = asyncio.run(analyzer.analyze_texts(["short one", self.TEXT]))
+        assert results[1].is_toxic is True
+        assert results[1].chunks is None
+
+    def test_line_breaks_change_the_cache_key(self, windows):
+        text = "you never listen to me " * 6
+        reflowed = text.replace(" ", "\n", 1)
+        asyncio.run(analyzer.analyze_text(text))
+        result = asyncio.run(analyzer.analyze_text(reflowed, include_chunks=True))
+        # The break moves the window boundaries, so the first result can't be reused
+        assert len(windows) == 2
+        assert reflowed[result.chunks[0].start:result.chunks[0].end] == "you"
+        # Short texts still share a key however they are spaced
+        assert analyzer._cache_key("see you\nsoon") == analyzer._cache_key("see  you soon")
+
+    def test_batch_cache_hits_drop_chunk_detail(self, windows):
+        asyncio.run(analyzer.analyze_text(self.TEXT, include_chunks=True))
+        results = asyncio.run(analyzer.analyze_texts([self.TEXT, self.TEXT]))
+        assert len(windows) == 1
+        assert [r.chunks for r in results] == [None, None]
@@ -5,7 +5,9 @@ Note: Tests that require LLM calls (rewrite, apologize, pipeline) are skipped
 if OPENAI_API_KEY is not set, since they depend on an external service.
 """
 
+import json
 import os
+import time
 import pytest
 from fastapi.testclient import TestClient
 from backend.main import app
@@ -33,6 +35,19 @@ def test_health_endpoint():
     assert "features" in data
 
 
+def test_ready_endpoint_reports_warm_up(monkeypatch):
+    """Readiness is 503 until the models are warm, then 200."""
+    from analysis_engine import analyzer
+
+    monkeypatch.setattr(analyzer, "_ready", False)
+    assert client.get("/api/v1/ready").status_code == 503
+
+    monkeypatch.setattr(analyzer, "_ready", True)
+    response = client.get("/api/v1/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+
+
 # ── Analyze ─────────────────────────────
 
 def test_analyze_endpoint():
@@ -103,6 +118,155 @@ def test_pipeline_endpoint():
     assert data["apology"] is not None
 
 
+# ── Streaming (fake LLM) ──────────────
+
+def _parse_sse(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_apologize_stream_emits_components(monkeypatch):
+    """Each apology component arrives as its own SSE event before `done`."""
+    from backend import orchestrator
+    from backend.schemas import AnalysisOut
+    from mediator_engine import rewrite
+
+    async def fake_analyze(text, context=None):
+        return AnalysisOut(emotion="sadness", intensity=0.5, risk="medium")
+
+    async def fake_stream(system_prompt, user_prompt, **kwargs):
+        raw = json.dumps({
+            "acknowledgment": "I was late.",
+            "responsibility": "That's on me.",
+            "remorse": "I'm sorry.",
+            "repair": "I'll leave earlier.",
+            "invitation": "Can we talk?",
+        })
+        for i in range(0, len(raw), 10):
+            yield raw[i:i + 10]
+
+    monkeypatch.setattr(orchestrator, "analyze_message", fake_analyze)
+    monkeypatch.setattr(rewrite, "stream_llm", fake_stream)
+
+    response = client.post("/api/v1/apologize/stream", json={"text": "Sorry I was late"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = _parse_sse(response.text)
+    assert events[0][0] == "analysis"
+    assert [p["key"] for e, p in events if e == "component"] == [
+        "acknowledgment", "responsibility", "remorse", "repair", "invitation",
+    ]
+    assert events[-1][0] == "done"
+    assert events[-1][1]["apology"].startswith("I was late.")
+
+
+def test_batch_stream_endpoint(monkeypatch):
+    """NDJSON in, one AnalysisOut per line out, in order; a bad line ends the stream with an error."""
+    from backend import orchestrator
+    from backend.schemas import AnalysisOut
+
+    async def fake_batch(texts):
+        return [AnalysisOut(emotion=t, intensity=0.5, risk="low") for t in texts]
+
+    monkeypatch.setattr(orchestrator, "analyze_texts", fake_batch)
+    body = "".join(json.dumps({"text": t}) + "\n" for t in ["one", "two", "three"])
+    response = client.post("/api/v1/batch/stream", content=body + '{"text": ""}\n{"text": "four"}\n',
+                           headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["emotion"] for line in lines[:3]] == ["one", "two", "three"]
+    assert lines[3]["error"] == "invalid_input"
+    assert "Line 4" in lines[3]["detail"]
+    assert len(lines) == 4
+
+
+# ── Live draft analysis (WebSocket) ────
+
+@pytest.fixture
+def sentence_analyzer(monkeypatch):
+    """Stub analyze_text: 'idiot' is toxic anger, anything else calm joy. Records each text analyzed."""
+    from backend import orchestrator, config
+    from backend.schemas import AnalysisOut, EmotionDetail
+
+    analyzed = []
+
+    async def fake_analyze(text, context=None, include_chunks=False, use_cache=True):
+        analyzed.append(text)
+        if "idiot" in text:
+            return AnalysisOut(emotion="anger", intensity=0.9, risk="high", is_toxic=True, toxicity_score=0.9,
+                               all_emotions=[EmotionDetail(label="anger", score=0.9), EmotionDetail(label="joy", score=0.1)])
+        return AnalysisOut(emotion="joy", intensity=0.8, risk="low", toxicity_score=0.05,
+                           all_emotions=[EmotionDetail(label="joy", score=0.8), EmotionDetail(label="anger", score=0.2)])
+
+    monkeypatch.setattr(orchestrator, "analyze_text", fake_analyze)
+    monkeypatch.setattr(config, "DRAFT_DEBOUNCE_MS", 50)
+    return analyzed
+
+
+def test_live_analysis_debounces_keystrokes(sentence_analyzer):
+    """Rapid updates collapse into one analysis of the latest draft."""
+    with client.websocket_connect("/api/v1/analyze/live") as ws:
+        for seq, draft in enumerate(["I", "I had", "I had a great day."]):
+            ws.send_json({"text": draft, "seq": seq})
+        message = ws.receive_json()
+
+    assert message["type"] == "analysis"
+    assert message["seq"] == 2
+    assert message["changes"]["emotion"] == "joy"
+    assert sentence_analyzer == ["I had a great day."]
+
+
+def test_live_analysis_pushes_deltas(sentence_analyzer):
+    """Each push carries only the fields that changed since the previous one."""
+    with client.websocket_connect("/api/v1/analyze/live") as ws:
+        ws.send_json({"text": "I had a great day.", "seq": 1})
+        first = ws.receive_json()
+        ws.send_json({"text": "I had a great day. Then you called me an idiot.", "seq": 2})
+        second = ws.receive_json()
+        ws.send_json({"text": "   ", "seq": 3})
+        cleared = ws.receive_json()
+
+    assert set(first["changes"]) >= {"emotion", "risk", "is_toxic"}
+    assert second["changes"]["is_toxic"] is True
+    assert second["changes"]["emotion"] == "anger"
+    assert "toxicity_score" in second["changes"]
+    assert cleared == {"type": "cleared", "seq": 3}
+
+
+def test_live_analysis_survives_a_failed_analysis(sentence_analyzer, monkeypatch):
+    from backend import orchestrator
+
+    analyze_draft = orchestrator.analyze_draft
+
+    async def flaky(text):
+        if "boom" in text:
+            raise RuntimeError("model exploded")
+        return await analyze_draft(text)
+
+    monkeypatch.setattr(orchestrator, "analyze_draft", flaky)
+    with client.websocket_connect("/api/v1/analyze/live") as ws:
+        ws.send_json({"text": "boom.", "seq": 1})
+        time.sleep(0.1)
+        ws.send_json({"text": "I had a great day.", "seq": 2})
+        message = ws.receive_json()
+
+    assert message["seq"] == 2
+
+
+def test_live_analysis_rejects_bad_updates(sentence_analyzer):
+    with client.websocket_connect("/api/v1/analyze/live") as ws:
+        ws.send_text("not json")
+        assert ws.receive_json()["type"] == "error"
+        ws.send_json({"draft": "wrong key"})
+        assert ws.receive_json()["type"] == "error"
+
+
 # ── Triggers (mode-aware) ──────────────
 
 def test_triggers_endpoint_neutral():
@@ -131,3 +295,23 @@ def test_triggers_endpoint_per_mode(mode):
     # Verify the trigger strategies are mode-specific (not the generic neutral ones)
     strategies = [t["strategy"] for t in data["suggested_triggers"]]
     assert len(strategies) >= 2
+
+
+def test_trigger_session_appends_incrementally():
+    """A session accepts only new messages per turn and 404s once ended."""
+    start = client.post(
+        "/api/v1/triggers/sessions",
+        json={"messages": ["How did the interview go today?"], "relationship": "friend", "analyze": False},
+    )
+    assert start.status_code == 200
+    session_id = start.json()["session_id"]
+    assert start.json()["engagement_level"] == "high"
+
+    turn = client.post(f"/api/v1/triggers/sessions/{session_id}", json={"messages": ["Ok", "Fine", "Yes"]})
+    assert turn.status_code == 200
+    assert turn.json()["message_count"] == 4
+    assert turn.json()["signals_detected"] == ["short_responses"]
+
+    assert client.delete(f"/api/v1/triggers/sessions/{session_id}").status_code == 204
+    gone = client.post(f"/api/v1/triggers/sessions/{session_id}", json={"messages": ["hello?"]})
+    assert gone.status_code == 404
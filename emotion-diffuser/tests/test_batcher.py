@@ -0,0 +1,56 @@
+"""
+Tests for analysis_engine.batcher.MicroBatcher.
+"""
+
+import asyncio
+
+from analysis_engine.batcher import MicroBatcher
+
+
+def run_concurrently(batcher, items):
+    async def scenario():
+        return await asyncio.gather(*(batcher.submit(i) for i in items))
+    return asyncio.run(scenario())
+
+
+class TestMicroBatcher:
+    """Concurrent submits should share batched calls."""
+
+    def test_coalesces_concurrent_submits(self):
+        calls = []
+
+        def double(items):
+            calls.append(list(items))
+            return [i * 2 for i in items]
+
+        batcher = MicroBatcher(double, max_batch_size=8, max_wait_ms=20)
+        assert run_concurrently(batcher, [1, 2, 3]) == [2, 4, 6]
+        assert calls == [[1, 2, 3]]
+
+    def test_respects_max_batch_size(self):
+        calls = []
+
+        def echo(items):
+            calls.append(len(items))
+            return list(items)
+
+        batcher = MicroBatcher(echo, max_batch_size=2, max_wait_ms=20)
+        assert run_concurrently(batcher, list(range(5))) == list(range(5))
+        assert sorted(calls) == [1, 2, 2]
+
+    def test_bad_item_does_not_fail_neighbours(self):
+        def picky(items):
+            if "bad" in items:
+                raise ValueError("bad input")
+            return [i.upper() for i in items]
+
+        batcher = MicroBatcher(picky, max_batch_size=8, max_wait_ms=20)
+
+        async def scenario():
+            return await asyncio.gather(
+                batcher.submit("ok"), batcher.submit("bad"), return_exceptions=True
+            )
+
+        ok, bad = asyncio.run(scenario())
+        assert ok == "OK"
+        assert isinstance(bad, ValueError)
@@ -0,0 +1,188 @@
+"""
+Tests for backend.cache primitives.
+"""
+
+import asyncio
+import sqlite3
+import time
+
+from backend.cache import LRUCache, SingleFlight, SQLiteCache, content_key, normalize_text
+
+
+class TestLRUCache:
+    """Tests for LRUCache."""
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "b" is now the oldest
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.stats()["evictions"] == 1
+
+    def test_ttl_expiry(self):
+        cache = LRUCache(max_entries=4, ttl_seconds=0.01)
+        cache.set("a", 1)
+        time.sleep(0.02)
+        assert cache.get("a") is None
+        assert cache.stats()["expirations"] == 1
+
+    def test_counts_hits_and_misses(self):
+        cache = LRUCache()
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("missing")
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_zero_size_disables(self):
+        cache = LRUCache(max_entries=0)
+        cache.set("a", 1)
+        assert cache.get("a") is None
+
+
+class TestContentKey:
+    """Tests for content_key() and normalize_text()."""
+
+    def test_normalization_collapses_whitespace(self):
+        assert normalize_text("  hi   there\n") == "hi there"
+
+    def test_parts_are_separated(self):
+        assert content_key("ab", "c") != content_key("a", "bc")
+
+    def test_stable(self):
+        assert content_key("x", 1) == content_key("x", 1)
+
+
+class TestSQLiteCache:
+    """Tests for the persistent SQLiteCache."""
+
+    def test_survives_reopen(self, tmp_path):
+        path = str(tmp_path / "cache.sqlite3")
+        cache = SQLiteCache(path)
+        cache.set("a", "value")
+        cache.close()
+
+        reopened = SQLiteCache(path)
+        assert reopened.get("a") == "value"
+        assert reopened.stats()["hits"] == 1
+
+    def test_bounded_eviction(self, tmp_path):
+        cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), max_entries=10)
+        for i in range(SQLiteCache._EVICT_EVERY):
+            cache.set(f"k{i}", "v")
+        assert len(cache) == 10
+        # The most recent writes are the ones kept
+        assert cache.get(f"k{SQLiteCache._EVICT_EVERY - 1}") == "v"
+        assert cache.get("k0") is None
+
+    def test_ttl_expiry(self, tmp_path):
+        cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=0.01)
+        cache.set("a", "value")
+        time.sleep(0.02)
+        assert cache.get("a") is None
+
+
+    def test_reads_only_refresh_recency_occasionally(self, tmp_path):
+        cache = SQLiteCache(str(tmp_path / "cache.sqlite3"))
+        cache.set("a", "value")
+        stamp = cache._conn.execute("SELECT accessed_at FROM cache").fetchone()[0]
+        assert cache.get("a") == "value"
+        assert cache._conn.execute("SELECT accessed_at FROM cache").fetchone()[0] == stamp
+
+    def test_write_lock_held_elsewhere_skips_store(self, tmp_path):
+        path = str(tmp_path / "cache.sqlite3")
+        cache = SQLiteCache(path, busy_timeout_s=0.01)
+        cache.set("a", "value")
+
+        other = sqlite3.connect(path, isolation_level=None)
+        other.execute("BEGIN IMMEDIATE")
+        try:
+            start = time.monotonic()
+            # WAL readers aren't blocked by the writer; the store gives up quickly
+            assert cache.get("a") == "value"
+            cache.set("b", "value")
+            assert time.monotonic() - start < 1.0
+        finally:
+            other.execute("ROLLBACK")
+            other.close()
+        assert cache.stats()["lock_timeouts"] == 1
+        assert cache.get("b") is None
+
+class TestSingleFlight:
+    """Concurrent callers with the same key share one in-flight call."""
+
+    def test_concurrent_callers_share_one_call(self):
+        flights = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return {"value": 42}
+
+        async def scenario():
+            return await asyncio.gather(*(flights.do("k", work) for _ in range(5)))
+
+        results = asyncio.run(scenario())
+        assert len(calls) == 1
+        assert all(r == {"value": 42} for r in results)
+        assert flights.stats()["coalesced"] == 4
+        assert flights.stats()["in_flight"] == 0
+
+    def test_share_gives_each_caller_a_copy(self):
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            return {"value": 42}
+
+        async def scenario():
+            return await asyncio.gather(*(flights.do("k", work, share=dict) for _ in range(2)))
+
+        first, second = asyncio.run(scenario())
+        assert first == second and first is not second
+
+    def test_sequential_calls_run_again(self):
+        flights = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            return len(calls)
+
+        assert asyncio.run(flights.do("k", work)) == 1
+        assert asyncio.run(flights.do("k", work)) == 2
+
+    def test_errors_reach_every_caller(self):
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        async def scenario():
+            return await asyncio.gather(*(flights.do("k", work) for _ in range(3)), return_exceptions=True)
+
+        assert all(isinstance(r, ValueError) for r in asyncio.run(scenario()))
+
+    def test_cancelled_leader_does_not_cancel_followers(self):
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.03)
+            return "done"
+
+        async def scenario():
+            leader = asyncio.create_task(flights.do("k", work))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(flights.do("k", work))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return await follower
+
+        assert asyncio.run(scenario()) == "done"
@@ -0,0 +1,81 @@
+"""
+Tests for analysis_engine.chunking — sentence-aligned windows and aggregation.
+"""
+
+from analysis_engine.chunking import aggregate, is_sentence_closed, iter_chunks
+
+
+def chunks(text, max_chars):
+    return [text[start:end] for start, end in iter_chunks(text, max_chars)]
+
+
+class TestIterChunks:
+    """Windows never exceed the size limit and prefer sentence boundaries."""
+
+    def test_short_text_is_one_chunk(self):
+        assert chunks("Hi there. How are you?", 100) == ["Hi there. How are you?"]
+
+    def test_packs_whole_sentences(self):
+        assert chunks("One. Two. Three.", 10) == ["One. Two.", "Three."]
+
+    def test_splits_on_line_breaks(self):
+        assert chunks("first line\n\nsecond line", 15) == ["first line", "second line"]
+
+    def test_long_sentence_splits_at_words(self):
+        text = "word " * 30
+        result = chunks(text, 24)
+        assert all(len(c) <= 24 for c in result)
+        assert all(c.split() == ["word"] * len(c.split()) for c in result)
+        assert sum(len(c.split()) for c in result) == 30
+
+    def test_unbroken_text_is_hard_cut(self):
+        assert chunks("a" * 25, 10) == ["a" * 10, "a" * 10, "a" * 5]
+
+    def test_blank_text_has_no_chunks(self):
+        assert chunks("   \n ", 10) == []
+
+    def test_is_lazy(self):
+        spans = iter_chunks("One. " * 10_000, 20)
+        assert next(spans) == (0, 19)
+
+
+class TestAggregate:
+    """Emotion scores are length-weighted; toxicity takes the worst chunk."""
+
+    def test_length_weighted_emotions(self):
+        emotions, _ = aggregate(
+            [(0, 30), (30, 40)],
+            [
+                [{"label": "joy", "score": 0.8}, {"label": "anger", "score": 0.2}],
+                [{"label": "joy", "score": 0.0}, {"label": "anger", "score": 1.0}],
+            ],
+            [{"label": "non-toxic", "score": 0.9}] * 2,
+        )
+        assert emotions[0]["label"] == "joy"
+        assert abs(emotions[0]["score"] - 0.6) < 1e-9
+        assert abs(emotions[1]["score"] - 0.4) < 1e-9
+
+    def test_one_toxic_chunk_makes_message_toxic(self):
+        _, toxicity = aggregate(
+            [(0, 100), (100, 110)],
+            [[{"label": "joy", "score": 1.0}]] * 2,
+            [{"label": "non-toxic", "score": 0.99}, {"label": "toxic", "score": 0.85}],
+        )
+        assert toxicity == {"label": "toxic", "score": 0.85}
+
+    def test_non_toxic_keeps_model_format(self):
+        _, toxicity = aggregate(
+            [(0, 10), (10, 20)],
+            [[{"label": "joy", "score": 1.0}]] * 2,
+            [{"label": "non-toxic", "score": 0.9}, {"label": "non-toxic", "score": 0.7}],
+        )
+        assert toxicity["label"] == "non-toxic"
+        assert abs(toxicity["score"] - 0.7) < 1e-9
+
+
+class TestIsSentenceClosed:
+    def test_only_a_following_break_closes_a_sentence(self):
+        assert is_sentence_closed("Done. Next", 5)
+        assert is_sentence_closed("Line one\nLine two", 8)
+        assert not is_sentence_closed("Done.", 5)
+        assert not is_sentence_closed("Still typing ", 12)
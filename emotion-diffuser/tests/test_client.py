@@ -0,0 +1,317 @@
+"""
+Tests for mediator_engine.client — run against in-process scripted providers.
+"""
+
+import asyncio
+import threading
+import time
+
+import httpx
+import openai
+import pytest
+from backend.cache import LRUCache, SingleFlight, SQLiteCache
+from mediator_engine import client
+from mediator_engine.limiter import AdmissionController
+from mediator_engine.providers import LLMProvider
+
+
+class ScriptedProvider(LLMProvider):
+    """
+    In-process provider that counts calls.
+    ``script`` holds one (delay_seconds, exception_or_None) per call; later calls answer at once.
+    """
+
+    def __init__(self, name: str = "primary", reply: str = "calm reply"):
+        super().__init__(default_model=f"{name}-model")
+        self.name = name
+        self.reply = reply
+        self.calls = 0
+        self.models: list = []
+        self.script: list[tuple[float, Exception | None]] = []
+
+    async def _step(self, model):
+        self.calls += 1
+        self.models.append(model)
+        delay, error = self.script.pop(0) if self.script else (0.0, None)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return self.calls
+
+    async def complete(self, system_prompt, user_prompt, model=None, temperature=0.7, json_schema=None):
+        call = await self._step(model)
+        return f" {self.reply} #{call} "
+
+    async def stream(self, system_prompt, user_prompt, model=None, temperature=0.7, json_schema=None):
+        call = await self._step(model)
+        for piece in (self.reply, f" #{call}"):
+            yield piece
+
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "http://fake-llm/v1/chat/completions"))
+
+
+@pytest.fixture
+def providers(monkeypatch):
+    primary = ScriptedProvider("primary")
+    backup = ScriptedProvider("backup", reply="backup reply")
+    monkeypatch.setattr(client, "_providers", [primary, backup])
+    monkeypatch.setattr(client, "_response_cache", LRUCache(max_entries=16))
+    monkeypatch.setattr(client, "_admission", AdmissionController(max_in_flight=4))
+    monkeypatch.setattr(client, "_latency", client.LatencyTracker())
+    monkeypatch.setattr(client, "_in_flight", SingleFlight())
+    monkeypatch.setattr(client, "_stats", dict.fromkeys(client._stats, 0))
+    monkeypatch.setattr(client.config, "LLM_RETRY_BACKOFF_S", 0.001)
+    return primary, backup
+
+
+@pytest.fixture
+def fake_llm(providers, monkeypatch):
+    """A single scripted provider (no failover)."""
+    primary, _ = providers
+    monkeypatch.setattr(client, "_providers", [primary])
+    return primary
+
+
+class TestResponseCache:
+    """Identical prompts should be served from the response cache."""
+
+    def test_repeat_call_is_cached(self, fake_llm):
+        first = asyncio.run(client.call_llm("system", "user"))
+        second = asyncio.run(client.call_llm("system", "user"))
+        assert first == second == "calm reply #1"
+        assert fake_llm.calls == 1
+        assert client.get_admission_controller().stats()["admitted"] == 1
+
+    def test_different_parameters_miss(self, fake_llm):
+        asyncio.run(client.call_llm("system", "user", temperature=0.7))
+        asyncio.run(client.call_llm("system", "user", temperature=0.2))
+        assert fake_llm.calls == 2
+
+    def test_opt_out_forces_regeneration(self, fake_llm):
+        asyncio.run(client.call_llm("system", "user"))
+        fresh = asyncio.run(client.call_llm("system", "user", use_cache=False))
+        assert fresh == "calm reply #2"
+        # The regenerated response replaces the cached one
+        assert asyncio.run(client.call_llm("system", "user")) == "calm reply #2"
+
+
+    def test_rejected_response_is_returned_but_not_cached(self, fake_llm):
+        checked = []
+
+        def reject(text):
+            checked.append(text)
+            return False
+
+        first = asyncio.run(client.call_llm("system", "user", validate=reject))
+        second = asyncio.run(client.call_llm("system", "user", validate=reject))
+        assert (first, second) == ("calm reply #1", "calm reply #2")
+        assert checked == [first, second]
+
+    def test_cache_hits_skip_validation(self, fake_llm):
+        checked = []
+
+        def accept(text):
+            checked.append(text)
+            return True
+
+        asyncio.run(client.call_llm("system", "user", validate=accept))
+        asyncio.run(client.call_llm("system", "user", validate=accept))
+        assert fake_llm.calls == 1
+        assert len(checked) == 1
+
+    def test_stream_respects_validation(self, fake_llm):
+        async def drain():
+            return "".join([d async for d in client.stream_llm("system", "user", validate=lambda text: False)])
+
+        asyncio.run(drain())
+        assert asyncio.run(drain()) == "calm reply #2"
+
+    def test_persistent_cache_is_used_off_the_event_loop(self, fake_llm, tmp_path, monkeypatch):
+        threads = []
+
+        class RecordingCache(SQLiteCache):
+            def get(self, key, default=None):
+                threads.append(threading.get_ident())
+                return super().get(key, default)
+
+            def set(self, key, value):
+                threads.append(threading.get_ident())
+                super().set(key, value)
+
+        monkeypatch.setattr(client, "_response_cache", RecordingCache(str(tmp_path / "llm.db"), max_entries=16))
+
+        async def drain():
+            return "".join([d async for d in client.stream_llm("system", "other")])
+
+        assert asyncio.run(client.call_llm("system", "user")) == asyncio.run(client.call_llm("system", "user"))
+        assert asyncio.run(drain()) == asyncio.run(drain())
+        assert fake_llm.calls == 2
+        # get + set for each first call, get for each repeat
+        assert len(threads) == 6
+        assert threading.get_ident() not in threads
+
+
+class TestRetriesAndDeadlines:
+    """Transient failures are retried; every call respects its deadline."""
+
+    def test_transient_error_is_retried(self, fake_llm):
+        fake_llm.script = [(0, connection_error())]
+        assert asyncio.run(client.call_llm("system", "user")) == "calm reply #2"
+        assert client.client_stats()["retries"] == 1
+
+    def test_non_transient_error_is_not_retried(self, fake_llm):
+        fake_llm.script = [(0, ValueError("bad request"))]
+        with pytest.raises(ValueError):
+            asyncio.run(client.call_llm("system", "user"))
+        assert fake_llm.calls == 1
+
+    def test_gives_up_after_max_retries(self, fake_llm, monkeypatch):
+        monkeypatch.setattr(client.config, "LLM_MAX_RETRIES", 1)
+        fake_llm.script = [(0, connection_error())] * 3
+        with pytest.raises(openai.APIConnectionError):
+            asyncio.run(client.call_llm("system", "user"))
+        assert fake_llm.calls == 2
+
+    def test_deadline_cuts_slow_call(self, fake_llm):
+        fake_llm.script = [(1.0, None)] * 3
+        start = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(client.call_llm("system", "user", timeout=0.05))
+        assert time.monotonic() - start < 0.5
+
+
+class TestHedging:
+    """A call slower than the recent p95 gets a duplicate; the first answer wins."""
+
+    def test_hedge_beats_slow_primary(self, fake_llm, monkeypatch):
+        monkeypatch.setattr(client.config, "LLM_HEDGE_ENABLED", True)
+        monkeypatch.setattr(client.config, "LLM_HEDGE_MIN_SAMPLES", 5)
+        for _ in range(5):
+            client._latency.record(0.01)
+
+        fake_llm.script = [(1.0, None), (0.0, None)]
+        start = time.monotonic()
+        assert asyncio.run(client.call_llm("system", "user")) == "calm reply #2"
+        assert time.monotonic() - start < 0.5
+        stats = client.client_stats()
+        assert stats["hedges"] == 1
+        assert stats["hedge_wins"] == 1
+
+    def test_no_hedge_without_latency_history(self, fake_llm, monkeypatch):
+        monkeypatch.setattr(client.config, "LLM_HEDGE_ENABLED", True)
+        fake_llm.script = [(0.05, None)]
+        asyncio.run(client.call_llm("system", "user"))
+        assert fake_llm.calls == 1
+
+
+class TestProviderFailover:
+    """Retries rotate through LLM_PROVIDERS; streams only fail over before the first token."""
+
+    def test_transient_error_fails_over_to_backup(self, providers):
+        primary, backup = providers
+        primary.script = [(0, connection_error())]
+        assert asyncio.run(client.call_llm("system", "user")) == "backup reply #1"
+        assert client.client_stats()["failovers"] == 1
+
+    def test_explicit_model_only_applies_to_primary(self, providers):
+        primary, backup = providers
+        primary.script = [(0, connection_error())]
+        asyncio.run(client.call_llm("system", "user", model="special-model"))
+        assert primary.models == ["special-model"]
+        assert backup.models == [None]
+
+    def test_hedge_goes_to_backup(self, providers, monkeypatch):
+        primary, backup = providers
+        monkeypatch.setattr(client.config, "LLM_HEDGE_ENABLED", True)
+        monkeypatch.setattr(client.config, "LLM_HEDGE_MIN_SAMPLES", 5)
+        for _ in range(5):
+            client._latency.record(0.01)
+
+        primary.script = [(1.0, None)]
+        assert asyncio.run(client.call_llm("system", "user")) == "backup reply #1"
+
+    def test_stream_fails_over_before_first_token(self, providers):
+        primary, backup = providers
+        primary.script = [(0, connection_error())]
+
+        async def collect():
+            return [delta async for delta in client.stream_llm("system", "user")]
+
+        assert asyncio.run(collect()) == ["backup reply", " #1"]
+        # The streamed text lands in the shared response cache
+        assert asyncio.run(client.call_llm("system", "user")) == "backup reply #1"
+
+    def test_returning_to_primary_counts_as_failover(self, providers):
+        primary, backup = providers
+        primary.script = [(0, connection_error())]
+        backup.script = [(0, connection_error())]
+        assert asyncio.run(client.call_llm("system", "user")) == "calm reply #2"
+        assert client.client_stats()["failovers"] == 2
+
+    def test_single_provider_retries_are_not_failovers(self, fake_llm):
+        fake_llm.script = [(0, connection_error())]
+        asyncio.run(client.call_llm("system", "user"))
+        assert client.client_stats()["retries"] == 1
+        assert client.client_stats()["failovers"] == 0
+
+
+class TestStreamDeadline:
+    """LLM_TIMEOUT_S bounds a whole stream, not each attempt."""
+
+    def test_retries_share_one_deadline(self, fake_llm, monkeypatch):
+        monkeypatch.setattr(client.config, "LLM_TIMEOUT_S", 0.1)
+        fake_llm.script = [(1.0, None)] * 3
+
+        async def collect():
+            return [delta async for delta in client.stream_llm("system", "user")]
+
+        start = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(collect())
+        assert time.monotonic() - start < 0.5
+        assert fake_llm.calls == 1
+
+    def test_stalled_stream_times_out_after_first_token(self, fake_llm, monkeypatch):
+        monkeypatch.setattr(client.config, "LLM_TIMEOUT_S", 0.1)
+
+        async def stalling(*args, **kwargs):
+            yield "calm"
+            await asyncio.sleep(1.0)
+            yield " reply"
+
+        monkeypatch.setattr(fake_llm, "stream", stalling)
+        received = []
+
+        async def collect():
+            async for delta in client.stream_llm("system", "user"):
+                received.append(delta)
+
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(collect())
+        assert received == ["calm"]
+        assert client.client_stats()["timeouts"] == 1
+
+
+class TestCoalescing:
+    """Concurrent identical calls share one provider request."""
+
+    def test_concurrent_identical_calls_coalesce(self, fake_llm):
+        fake_llm.script = [(0.05, None)]
+
+        async def scenario():
+            return await asyncio.gather(*(client.call_llm("system", "user") for _ in range(3)))
+
+        assert asyncio.run(scenario()) == ["calm reply #1"] * 3
+        assert fake_llm.calls == 1
+        assert client.client_stats()["coalesced"] == 2
+
+    def test_forced_regeneration_is_not_coalesced(self, fake_llm):
+        fake_llm.script = [(0.05, None), (0.05, None)]
+
+        async def scenario():
+            return await asyncio.gather(*(client.call_llm("system", "user", use_cache=False) for _ in range(2)))
+
+        asyncio.run(scenario())
+        assert fake_llm.calls == 2
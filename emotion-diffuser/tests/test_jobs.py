@@ -0,0 +1,283 @@
+"""
+Tests for backend.jobs — background NDJSON analysis jobs and their API.
+"""
+
+import asyncio
+import json
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import jobs, orchestrator
+from backend.jobs import JobManager
+from backend.ndjson import NDJSONError, aiter_lines
+from backend.schemas import AnalysisOut
+
+
+async def _chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+def _upload(texts: list[str]) -> bytes:
+    return "".join(json.dumps({"text": t}) + "\n" for t in texts).encode()
+
+
+async def _wait_for(manager: JobManager, job_id: str, status: str = "done") -> dict:
+    for _ in range(200):
+        meta = manager.get(job_id)
+        if meta["status"] == status:
+            return meta
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job stuck in {manager.get(job_id)['status']}")
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    """Stub analyze_texts: echoes each text back as its emotion and records each batch."""
+    seen = []
+
+    async def analyze_texts(texts):
+        seen.append(list(texts))
+        return [AnalysisOut(emotion=t, intensity=0.5, risk="low") for t in texts]
+
+    monkeypatch.setattr(orchestrator, "analyze_texts", analyze_texts)
+    return seen
+
+
+class TestAiterLines:
+    def test_splits_across_chunk_boundaries(self):
+        async def run():
+            return [pair async for pair in aiter_lines(_chunks(b'{"a"', b': 1}\n\n{"b": 2}\r\n{"c"', b": 3}"))]
+
+        assert asyncio.run(run()) == [(1, '{"a": 1}'), (3, '{"b": 2}'), (4, '{"c": 3}')]
+
+    def test_invalid_utf8_names_the_line(self):
+        async def run():
+            return [pair async for pair in aiter_lines(_chunks(b'{"a": 1}\n{"b": "\xff"}\n'))]
+
+        with pytest.raises(NDJSONError, match="Line 2: invalid UTF-8"):
+            asyncio.run(run())
+
+    def test_overlong_line_is_rejected_before_it_ends(self, monkeypatch):
+        from backend import config
+
+        monkeypatch.setattr(config, "NDJSON_MAX_LINE_BYTES", 8)
+        received = []
+
+        async def endless():
+            while True:
+                received.append(1)
+                yield b"x" * 4
+
+        async def run():
+            return [pair async for pair in aiter_lines(endless())]
+
+        with pytest.raises(NDJSONError, match="Line 1: longer than 8 bytes"):
+            asyncio.run(run())
+        assert len(received) == 3
+
+
+class TestJobManager:
+    def test_processes_upload_in_chunks(self, tmp_path, batches):
+        texts = [f"message {i}" for i in range(7)]
+
+        async def run():
+            manager = JobManager(str(tmp_path), workers=1, chunk_size=3)
+            meta = await manager.submit(_chunks(_upload(texts)))
+            await _wait_for(manager, meta["job_id"])
+            body = b"".join([data async for data in manager.iter_results(meta["job_id"])])
+            await manager.stop()
+            return manager.get(meta["job_id"]), body
+
+        meta, body = asyncio.run(run())
+        assert meta["processed"] == meta["total"] == 7
+        assert [len(b) for b in batches] == [3, 3, 1]
+        assert [json.loads(line)["emotion"] for line in body.splitlines()] == texts
+
+    def test_rejects_invalid_line_and_cleans_up(self, tmp_path, batches):
+        async def run():
+            manager = JobManager(str(tmp_path))
+            await manager.submit(_chunks(b'{"text": "fine"}\n{"body": "wrong key"}\n'))
+
+        with pytest.raises(NDJSONError, match="Line 2"):
+            asyncio.run(run())
+        assert os.listdir(tmp_path) == []
+
+    def test_resumes_from_last_checkpoint_after_restart(self, tmp_path, monkeypatch):
+        texts = [f"message {i}" for i in range(5)]
+        calls = []
+
+        async def analyze_then_hang(texts):
+            calls.append(list(texts))
+            if len(calls) > 1:
+                await asyncio.Event().wait()  # the worker dies mid-job
+            return [AnalysisOut(emotion=t, intensity=0.5, risk="low") for t in texts]
+
+        async def first_run():
+            manager = JobManager(str(tmp_path), workers=1, chunk_size=2)
+            meta = await manager.submit(_chunks(_upload(texts)))
+            while len(calls) < 2:
+                await asyncio.sleep(0.01)
+            await manager.stop()
+            return meta["job_id"]
+
+        monkeypatch.setattr(orchestrator, "analyze_texts", analyze_then_hang)
+        job_id = asyncio.run(first_run())
+        # A result line written after the last checkpoint must not survive the restart
+        with open(tmp_path / job_id / "results.ndjson", "ab") as f:
+            f.write(b'{"partial":')
+
+        calls.clear()
+
+        async def analyze(texts):
+            calls.append(list(texts))
+            return [AnalysisOut(emotion=t, intensity=0.5, risk="low") for t in texts]
+
+        async def second_run():
+            manager = JobManager(str(tmp_path), workers=1, chunk_size=2)
+            assert manager.get(job_id)["processed"] == 2
+            manager.start()
+            await _wait_for(manager, job_id)
+            body = b"".join([data async for data in manager.iter_results(job_id)])
+            await manager.stop()
+            return body
+
+        monkeypatch.setattr(orchestrator, "analyze_texts", analyze)
+        body = asyncio.run(second_run())
+        assert calls == [["message 2", "message 3"], ["message 4"]]
+        assert [json.loads(line)["emotion"] for line in body.splitlines()] == texts
+
+    def test_workers_sharing_a_directory_run_each_job_once(self, tmp_path, monkeypatch):
+        texts = [f"message {i}" for i in range(6)]
+        calls = []
+
+        async def slow_analyze(texts):
+            calls.append(list(texts))
+            await asyncio.sleep(0.02)
+            return [AnalysisOut(emotion=t, intensity=0.5, risk="low") for t in texts]
+
+        async def run():
+            first = JobManager(str(tmp_path), workers=1, chunk_size=2)
+            second = JobManager(str(tmp_path), workers=1, chunk_size=2)
+            meta = await first.submit(_chunks(_upload(texts)))
+            second.start()  # finds the queued job on disk and tries to resume it too
+            # Status is shared through the directory, whichever process is asked
+            await _wait_for(second, meta["job_id"])
+            body = b"".join([data async for data in second.iter_results(meta["job_id"])])
+            await first.stop()
+            await second.stop()
+            return body
+
+        monkeypatch.setattr(orchestrator, "analyze_texts", slow_analyze)
+        body = asyncio.run(run())
+        assert sum(len(batch) for batch in calls) == 6
+        assert [json.loads(line)["emotion"] for line in body.splitlines()] == texts
+
+    def test_unknown_or_malformed_job_ids(self, tmp_path):
+        manager = JobManager(str(tmp_path))
+        assert manager.get("0" * 32) is None
+        assert manager.get("../etc") is None
+        assert manager.delete("../etc") is False
+
+    def test_stats_track_transitions_without_rescanning(self, tmp_path, batches, monkeypatch):
+        async def run():
+            manager = JobManager(str(tmp_path), workers=1)
+            meta = await manager.submit(_chunks(_upload(["a", "b"])))
+            await _wait_for(manager, meta["job_id"])
+            monkeypatch.setattr(manager, "_all_meta", lambda: pytest.fail("stats() scanned the job directory"))
+            stats = manager.stats()
+            await manager.stop()
+            return stats
+
+        assert asyncio.run(run()) == {"queued": 0, "running": 0, "done": 1, "failed": 0}
+
+    def test_sweep_deletes_expired_finished_jobs(self, tmp_path, batches):
+        async def run():
+            manager = JobManager(str(tmp_path), workers=1, retention_s=3600)
+            finished = await manager.submit(_chunks(_upload(["a"])))
+            await _wait_for(manager, finished["job_id"])
+            await manager.stop()
+            queued = await manager.submit(_chunks(_upload(["b"])))
+            await manager.stop()
+            return manager, finished["job_id"], queued["job_id"]
+
+        manager, finished, queued = asyncio.run(run())
+        for job_id in (finished, queued):
+            meta = manager.get(job_id)
+            meta["updated_at"] -= 7200
+            manager._write_meta(meta)
+
+        manager._sweep()
+        assert manager.get(finished) is None
+        # Unfinished jobs are kept however old they are
+        assert manager.get(queued)["status"] == "queued"
+        assert manager.stats() == {"queued": 1, "running": 0, "done": 0, "failed": 0}
+
+    def test_failed_batch_marks_job_failed(self, tmp_path, monkeypatch):
+        async def broken(texts):
+            raise RuntimeError("model exploded")
+
+        async def run():
+            manager = JobManager(str(tmp_path), workers=1)
+            meta = await manager.submit(_chunks(_upload(["hi"])))
+            meta = await _wait_for(manager, meta["job_id"], status="failed")
+            await manager.stop()
+            return meta
+
+        monkeypatch.setattr(orchestrator, "analyze_texts", broken)
+        meta = asyncio.run(run())
+        assert meta["error"] == "model exploded"
+        assert meta["processed"] == 0
+
+
+class TestJobsAPI:
+    @pytest.fixture
+    def client(self, tmp_path, monkeypatch, batches):
+        from backend import config, main
+
+        monkeypatch.setattr(config, "JOBS_DIR", str(tmp_path))
+        monkeypatch.setattr(config, "JOB_CHUNK_SIZE", 2)
+        monkeypatch.setattr(main, "WARMUP_ON_STARTUP", False)
+        monkeypatch.setattr(jobs, "_manager", None)
+        with TestClient(main.app) as client:
+            yield client
+
+    def test_submit_poll_and_stream_results(self, client):
+        texts = ["first", "second", "third"]
+        response = client.post("/api/v1/jobs", content=_upload(texts),
+                               headers={"content-type": "application/x-ndjson"})
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        assert response.json()["total"] == 3
+
+        for _ in range(200):
+            status = client.get(f"/api/v1/jobs/{job_id}").json()
+            if status["status"] == "done":
+                break
+            time.sleep(0.01)
+        assert status["processed"] == 3
+
+        results = client.get(f"/api/v1/jobs/{job_id}/results")
+        assert results.headers["content-type"].startswith("application/x-ndjson")
+        assert [json.loads(line)["emotion"] for line in results.text.splitlines()] == texts
+
+        assert client.delete(f"/api/v1/jobs/{job_id}").status_code == 204
+        assert client.get(f"/api/v1/jobs/{job_id}").status_code == 404
+
+    def test_follow_streams_until_done(self, client):
+        response = client.post("/api/v1/jobs", content=_upload(["a", "b", "c", "d", "e"]))
+        job_id = response.json()["job_id"]
+        results = client.get(f"/api/v1/jobs/{job_id}/results", params={"follow": "true"})
+        assert len(results.text.splitlines()) == 5
+
+    def test_invalid_upload_is_rejected(self, client):
+        response = client.post("/api/v1/jobs", content=b'{"text": ""}\n')
+        assert response.status_code == 422
+        assert "Line 1" in response.json()["detail"]
+        response = client.post("/api/v1/jobs", content=b'{"text": "\xff"}\n')
+        assert response.status_code == 422
+        assert response.json()["detail"] == "Line 1: invalid UTF-8"
+        assert client.get("/api/v1/jobs/nope").status_code == 404
@@ -0,0 +1,119 @@
+"""
+Tests for mediator_engine.limiter.AdmissionController.
+"""
+
+import asyncio
+
+import pytest
+from mediator_engine.limiter import AdmissionController, LLMOverloadedError
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+class TestAdmissionController:
+    """Concurrency bound, shedding, and adaptation."""
+
+    def test_bounds_concurrency(self):
+        controller = AdmissionController(max_in_flight=2)
+        peak = 0
+
+        async def call():
+            nonlocal peak
+            async with controller.slot():
+                peak = max(peak, controller.in_flight)
+                await asyncio.sleep(0.01)
+
+        async def scenario():
+            await asyncio.gather(*(call() for _ in range(6)))
+
+        asyncio.run(scenario())
+        assert peak == 2
+        assert controller.admitted == 6
+        assert controller.in_flight == 0
+
+    def test_sheds_when_deadline_passes_in_queue(self):
+        controller = AdmissionController(max_in_flight=1)
+
+        async def scenario():
+            async with controller.slot():
+                with pytest.raises(LLMOverloadedError):
+                    await controller.acquire(timeout=0.01)
+            return controller.stats()
+
+        stats = asyncio.run(scenario())
+        assert stats["shed"] == 1
+        assert stats["queue_depth"] == 0
+
+    def test_sheds_when_queue_full(self):
+        controller = AdmissionController(max_in_flight=1, max_queue=0)
+
+        async def scenario():
+            async with controller.slot():
+                with pytest.raises(LLMOverloadedError):
+                    await controller.acquire()
+
+        asyncio.run(scenario())
+
+    def test_rate_limit_halves_limit(self):
+        controller = AdmissionController(max_in_flight=8)
+
+        async def scenario():
+            with pytest.raises(RateLimited):
+                async with controller.slot():
+                    raise RateLimited()
+
+        asyncio.run(scenario())
+        assert controller.limit == 4
+        assert controller.stats()["rate_limited"] == 1
+
+    def test_cancelled_call_leaves_limit_alone(self):
+        controller = AdmissionController(max_in_flight=8, target_latency_s=0.01)
+
+        async def call():
+            async with controller.slot():
+                await asyncio.sleep(1.0)
+
+        async def scenario():
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(call(), timeout=0.05)
+
+        asyncio.run(scenario())
+        # 0.05s is over the latency target, but a cancelled call isn't a sample
+        assert controller.limit == 8
+        assert controller.stats()["avg_latency_ms"] is None
+        assert controller.in_flight == 0
+
+    def test_token_budget_delays_calls(self):
+        controller = AdmissionController(tokens_per_minute=6000)  # 100 tokens/s
+
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            await controller.acquire(tokens=6000)  # drains the bucket
+            controller.release()
+            start = loop.time()
+            await controller.acquire(tokens=5)
+            controller.release()
+            return loop.time() - start
+
+        assert asyncio.run(scenario()) >= 0.04
+
+    def test_cancelled_during_token_wait_frees_slot(self):
+        controller = AdmissionController(max_in_flight=2, tokens_per_minute=60)
+
+        async def call():
+            async with controller.slot(tokens=30):
+                pass
+
+        async def scenario():
+            await controller.acquire(tokens=60)  # drains the bucket
+            controller.release()
+            for _ in range(3):
+                with pytest.raises(asyncio.TimeoutError):
+                    await asyncio.wait_for(call(), timeout=0.05)
+            return controller.in_flight
+
+        assert asyncio.run(scenario()) == 0
+        # Budget reserved by the cancelled calls was refunded
+        assert controller.stats()["tokens_available"] >= 0
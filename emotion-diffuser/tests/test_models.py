@@ -0,0 +1,75 @@
+"""
+Tests for analysis_engine.models — backend selection and drift measurement.
+"""
+
+import sys
+
+import pytest
+from analysis_engine import models
+
+EMOTIONS = [
+    [{"label": "anger", "score": 0.80}, {"label": "joy", "score": 0.15}, {"label": "sadness", "score": 0.05}],
+    [{"label": "anger", "score": 0.10}, {"label": "joy", "score": 0.85}, {"label": "sadness", "score": 0.05}],
+]
+TOXICITY = [{"label": "toxic", "score": 0.90}, {"label": "non-toxic", "score": 0.95}]
+
+
+class TestCompareOutputs:
+    """Drift between a reference and a candidate backend."""
+
+    def test_identical_outputs_have_no_drift(self):
+        report = models.compare_outputs(EMOTIONS, EMOTIONS, TOXICITY, TOXICITY)
+        assert report["emotion_top_label_agreement"] == 1.0
+        assert report["toxicity_label_agreement"] == 1.0
+        assert report["emotion_max_score_diff"] == 0.0
+        assert report["toxicity_max_score_diff"] == 0.0
+
+    def test_small_score_shift(self):
+        shifted = [
+            [{"label": "anger", "score": 0.78}, {"label": "joy", "score": 0.17}, {"label": "sadness", "score": 0.05}],
+            EMOTIONS[1],
+        ]
+        report = models.compare_outputs(EMOTIONS, shifted, TOXICITY, TOXICITY)
+        assert report["emotion_top_label_agreement"] == 1.0
+        assert report["emotion_max_score_diff"] == pytest.approx(0.02)
+
+    def test_flipped_labels_lower_agreement(self):
+        flipped = [TOXICITY[0], {"label": "toxic", "score": 0.55}]
+        report = models.compare_outputs(EMOTIONS, EMOTIONS, TOXICITY, flipped)
+        assert report["toxicity_label_agreement"] == 0.5
+        # non-toxic 0.95 vs toxic 0.55 (= non-toxic 0.45)
+        assert report["toxicity_max_score_diff"] == pytest.approx(0.5)
+
+
+class TestBackendSelection:
+    def test_unknown_backend_raises(self):
+        with pytest.raises(ValueError):
+            models._build_pipeline("some/model", "tensorrt")
+
+    def test_onnx_without_optimum_explains_install(self, monkeypatch):
+        monkeypatch.setitem(sys.modules, "optimum.onnxruntime", None)
+        with pytest.raises(RuntimeError, match="optimum"):
+            models._build_pipeline("some/model", "onnx-int8")
+
+    def test_onnx_export_dirs(self, monkeypatch):
+        monkeypatch.setattr(models.config, "ONNX_MODEL_DIR", "/tmp/onnx")
+        fp32 = models._onnx_model_dir("org/model", quantized=False)
+        int8 = models._onnx_model_dir("org/model", quantized=True)
+        assert fp32.parent == int8.parent
+        assert fp32.parent.name == "org--model"
+
+
+class TestMultiHeadOutputs:
+    """The shared-encoder heads produce the same shapes as the two pipelines."""
+
+    def test_format_outputs(self):
+        multihead = pytest.importorskip("analysis_engine.multihead")
+        emotions, toxicity = multihead.format_outputs(["anger", "joy"], [0.2, 0.8], [0.3, 0.7])
+        assert emotions == [{"label": "joy", "score": 0.8}, {"label": "anger", "score": 0.2}]
+        assert toxicity == {"label": "toxic", "score": 0.7}
+
+    def test_missing_head_explains_distillation(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(models, "_multihead", None)
+        monkeypatch.setattr(models.config, "MULTIHEAD_TOXICITY_HEAD_PATH", str(tmp_path / "missing.pt"))
+        with pytest.raises(RuntimeError, match="analysis_engine.multihead"):
+            models.get_multihead_analyzer()
@@ -12,14 +12,14 @@ from mediator_engine.prompts import (
     SUGGESTED_TRIGGERS,
     REWRITE_SYSTEM_PROMPT,
     APOLOGY_SYSTEM_PROMPT,
+    MEDIATION_SYSTEM_PROMPT,
     GOTTMAN_RULES,
+    REWRITE_SYSTEM_PROMPTS,
+    APOLOGY_SYSTEM_PROMPTS,
+    MEDIATION_SYSTEM_PROMPTS,
+    normalize_mode,
 )
-from mediator_engine.rewrite import (
-    _get_tone_requirement,
-    _get_mode_guidance,
-    _get_rewrite_example,
-    _get_apology_example,
-)
+from mediator_engine.rewrite import _system_prompt
 
 ALL_MODES = ["parent", "sibling", "partner", "friend", "professional", "neutral"]
 
@@ -34,7 +34,8 @@ class TestToneRules:
         assert len(TONE_RULES[mode]) > 5
 
     def test_unknown_mode_falls_back(self):
-        assert _get_tone_requirement("alien") == TONE_RULES["neutral"]
+        assert normalize_mode("alien") == "neutral"
+        assert TONE_RULES["neutral"] in _system_prompt(REWRITE_SYSTEM_PROMPTS, "alien")
 
 
 class TestModeGuidance:
@@ -50,7 +51,7 @@ class TestModeGuidance:
         assert "CRITICISM" in MODE_GUIDANCE["partner"]
 
     def test_unknown_mode_falls_back(self):
-        assert _get_mode_guidance("alien") == MODE_GUIDANCE["neutral"]
+        assert MODE_GUIDANCE["neutral"] in _system_prompt(APOLOGY_SYSTEM_PROMPTS, "alien")
 
 
 class TestRewriteExamples:
@@ -64,8 +65,7 @@ class TestRewriteExamples:
         assert len(ex["good"]) > 5
 
     def test_unknown_mode_falls_back(self):
-        ex = _get_rewrite_example("alien")
-        assert ex == REWRITE_EXAMPLES["neutral"]
+        assert REWRITE_EXAMPLES["neutral"]["good"] in _system_prompt(REWRITE_SYSTEM_PROMPTS, "alien")
 
 
 class TestApologyExamples:
@@ -77,8 +77,7 @@ class TestApologyExamples:
         assert "situation" in ex and "apology" in ex
 
     def test_unknown_mode_falls_back(self):
-        ex = _get_apology_example("alien")
-        assert ex == APOLOGY_EXAMPLES["neutral"]
+        assert APOLOGY_EXAMPLES["neutral"]["apology"] in _system_prompt(APOLOGY_SYSTEM_PROMPTS, "alien")
 
 
 class TestSuggestedTriggers:
@@ -121,3 +120,54 @@ class TestPromptFormatting:
         )
         assert TONE_RULES[mode] in result
         assert ex["situation"] in result
+
+    @pytest.mark.parametrize("mode", ALL_MODES)
+    def test_mediation_prompt_formats(self, mode):
+        rewrite_ex = REWRITE_EXAMPLES[mode]
+        apology_ex = APOLOGY_EXAMPLES[mode]
+        result = MEDIATION_SYSTEM_PROMPT.format(
+            tone_requirement=TONE_RULES[mode],
+            mode_guidance=MODE_GUIDANCE[mode],
+            example_bad=rewrite_ex["bad"],
+            example_good=rewrite_ex["good"],
+            example_situation=apology_ex["situation"],
+            example_apology=apology_ex["apology"],
+        )
+        assert TONE_RULES[mode] in result
+        assert '"rewrite"' in result and '"acknowledgment"' in result
+
+
+class TestPrecompiledPrompts:
+    """System prompts are rendered once per mode and match the templates."""
+
+    @pytest.mark.parametrize("mode", ALL_MODES)
+    def test_every_mode_is_precompiled(self, mode):
+        for prompts in (REWRITE_SYSTEM_PROMPTS, APOLOGY_SYSTEM_PROMPTS, MEDIATION_SYSTEM_PROMPTS):
+            assert mode in prompts
+            assert TONE_RULES[mode] in prompts[mode]
+            assert "{tone_requirement}" not in prompts[mode]
+
+    @pytest.mark.parametrize("mode", ALL_MODES)
+    def test_matches_template(self, mode):
+        ex = REWRITE_EXAMPLES[mode]
+        expected = REWRITE_SYSTEM_PROMPT.format(
+            tone_requirement=TONE_RULES[mode],
+            mode_guidance=MODE_GUIDANCE[mode],
+            example_bad=ex["bad"],
+            example_good=ex["good"],
+        )
+        assert REWRITE_SYSTEM_PROMPTS[mode] == expected.strip()
+
+    @pytest.mark.parametrize("raw, mode", [
+        ("Partner", "partner"),
+        ("  friend ", "friend"),
+        ("alien", "neutral"),
+        ("", "neutral"),
+        (None, "neutral"),
+    ])
+    def test_normalize_mode(self, raw, mode):
+        assert normalize_mode(raw) == mode
+
+    def test_lookup_normalizes_unknown_modes(self):
+        assert _system_prompt(APOLOGY_SYSTEM_PROMPTS, "PARENT") is APOLOGY_SYSTEM_PROMPTS["parent"]
+        assert _system_prompt(APOLOGY_SYSTEM_PROMPTS, "alien") is APOLOGY_SYSTEM_PROMPTS["neutral"]
@@ -0,0 +1,312 @@
+"""
+Tests for backend.orchestrator — pipeline stage scheduling, analysis reuse,
+and incremental conversation sessions.
+"""
+
+import asyncio
+import time
+
+import pytest
+from backend import orchestrator
+from backend.schemas import AnalysisOut, RewriteOut
+
+ANALYSIS = AnalysisOut(emotion="anger", intensity=0.9, risk="high")
+
+
+@pytest.fixture
+def stub_stages(monkeypatch):
+    async def analyze(text, context=None):
+        return ANALYSIS
+
+    async def slow_rewrite(text, analysis=None, relationship="neutral", use_cache=True):
+        await asyncio.sleep(0.1)
+        return RewriteOut(original=text, rewritten="calm", tone="calm", emotion=analysis.emotion)
+
+    async def failing_apology(text, analysis=None, relationship="neutral", use_cache=True):
+        await asyncio.sleep(0.1)
+        raise RuntimeError("provider down")
+
+    monkeypatch.setattr(orchestrator, "analyze_message", analyze)
+    monkeypatch.setattr(orchestrator, "rewrite_message", slow_rewrite)
+    monkeypatch.setattr(orchestrator, "generate_apology", failing_apology)
+    monkeypatch.setattr(orchestrator.config, "ENABLE_FUSED_MEDIATION", False)
+
+
+class TestFullPipeline:
+    """Stages after analysis run concurrently and fail independently."""
+
+    def test_failed_stage_gives_partial_result(self, stub_stages):
+        result = asyncio.run(orchestrator.full_pipeline("You never listen!"))
+        assert result.rewrite.rewritten == "calm"
+        assert result.apology is None
+        assert result.errors == {"apology": "provider down"}
+
+    def test_stages_run_concurrently(self, stub_stages):
+        start = time.perf_counter()
+        asyncio.run(orchestrator.full_pipeline(
+            "You never listen!",
+            include_triggers=True,
+            conversation_history=["Ok", "Fine"],
+        ))
+        # Two 0.1s stages side by side, not back to back
+        assert time.perf_counter() - start < 0.19
+
+    def test_stage_timeout(self, stub_stages, monkeypatch):
+        monkeypatch.setattr(orchestrator.config, "PIPELINE_REWRITE_TIMEOUT_S", 0.01)
+        result = asyncio.run(orchestrator.full_pipeline("You never listen!", include_apology=False))
+        assert result.rewrite is None
+        assert result.errors["rewrite"] == "timed out after 0.01s"
+
+    def test_llm_deadline_is_reported_as_such(self, stub_stages, monkeypatch):
+        async def llm_timeout(text, analysis=None, relationship="neutral", use_cache=True):
+            raise asyncio.TimeoutError()
+
+        monkeypatch.setattr(orchestrator, "rewrite_message", llm_timeout)
+        monkeypatch.setattr(orchestrator.config, "LLM_TIMEOUT_S", 25)
+        result = asyncio.run(orchestrator.full_pipeline("You never listen!", include_apology=False))
+        assert result.errors["rewrite"] == "LLM call timed out after 25s"
+
+
+class TestResolveAnalysis:
+    """Mediation requests can reuse an earlier analysis instead of re-running the models."""
+
+    @pytest.fixture
+    def counting_analyzer(self, monkeypatch):
+        calls = []
+
+        async def analyze_text(text, context=None, include_chunks=False):
+            calls.append(text)
+            return ANALYSIS.model_copy()
+
+        monkeypatch.setattr(orchestrator, "analyze_text", analyze_text)
+        monkeypatch.setattr(orchestrator, "_analysis_store", orchestrator.LRUCache(max_entries=8))
+        return calls
+
+    def test_reuses_stored_analysis_by_id(self, counting_analyzer):
+        first = asyncio.run(orchestrator.analyze_message("You never listen!"))
+        assert first.analysis_id
+
+        reused = asyncio.run(orchestrator.resolve_analysis("You never listen!", analysis_id=first.analysis_id))
+        assert reused == first
+        assert counting_analyzer == ["You never listen!"]
+
+    def test_batch_results_are_only_stored_on_request(self, counting_analyzer, monkeypatch):
+        async def analyze_texts(texts):
+            return [ANALYSIS.model_copy() for _ in texts]
+
+        monkeypatch.setattr(orchestrator, "analyze_texts", analyze_texts)
+        first = asyncio.run(orchestrator.analyze_message("You never listen!"))
+        results = asyncio.run(orchestrator.analyze_messages([f"message {i}" for i in range(8)]))
+        assert [r.analysis_id for r in results] == [None] * 8
+        # The store (8 entries) still holds the /analyze result
+        assert orchestrator._analysis_store.get(first.analysis_id) is not None
+
+        remembered = asyncio.run(orchestrator.analyze_messages(["Fine."], remember=True))
+        reused = asyncio.run(orchestrator.resolve_analysis("Fine.", analysis_id=remembered[0].analysis_id))
+        assert reused == remembered[0]
+
+    def test_id_for_different_text_is_ignored(self, counting_analyzer):
+        first = asyncio.run(orchestrator.analyze_message("You never listen!"))
+        asyncio.run(orchestrator.resolve_analysis("Something else", analysis_id=first.analysis_id))
+        assert counting_analyzer == ["You never listen!", "Something else"]
+
+    def test_prior_analysis_skips_inference(self, counting_analyzer):
+        prior = AnalysisOut(emotion="joy", intensity=0.3, risk="low")
+        assert asyncio.run(orchestrator.resolve_analysis("hi", prior=prior)) is prior
+        assert counting_analyzer == []
+
+
+class TestConversationSessions:
+    """Appending to a session only scans and analyzes the new messages."""
+
+    @pytest.fixture
+    def counting_batch(self, monkeypatch):
+        batches = []
+
+        async def analyze_texts(texts):
+            batches.append(list(texts))
+            return [
+                AnalysisOut(emotion="anger" if "!" in t else "neutral", intensity=0.5, risk="low", is_toxic="!" in t)
+                for t in texts
+            ]
+
+        monkeypatch.setattr(orchestrator, "analyze_texts", analyze_texts)
+        monkeypatch.setattr(orchestrator, "_conversations", orchestrator.LRUCache(max_entries=8, ttl_seconds=60))
+        return batches
+
+    def test_append_only_analyzes_new_messages(self, counting_batch):
+        start = asyncio.run(orchestrator.start_conversation(["How was your day?", "Long, tell you later!"]))
+        result = asyncio.run(orchestrator.append_to_conversation(start.session_id, ["Ok!", "Fine!"]))
+
+        assert counting_batch == [["How was your day?", "Long, tell you later!"], ["Ok!", "Fine!"]]
+        assert result.message_count == 4
+        assert result.toxic_messages == 3
+        assert result.dominant_emotion == "anger"
+
+    def test_matches_full_rescan(self, counting_batch):
+        history = ["Ok", "Yes", "How are you?", "Fine", "Sure"]
+        session = asyncio.run(orchestrator.start_conversation(history[:2], relationship="partner"))
+        for message in history[2:]:
+            result = asyncio.run(orchestrator.append_to_conversation(session.session_id, [message]))
+
+        full = asyncio.run(orchestrator.detect_triggers(history, relationship="partner"))
+        assert result.signals_detected == full.signals_detected
+        assert result.engagement_level == full.engagement_level
+        assert result.suggested_triggers == full.suggested_triggers
+
+    def test_analysis_can_be_turned_off(self, counting_batch):
+        start = asyncio.run(orchestrator.start_conversation(["Ok"], analyze=False))
+        asyncio.run(orchestrator.append_to_conversation(start.session_id, ["Fine"]))
+        assert counting_batch == []
+
+    def test_unknown_or_ended_session(self, counting_batch):
+        assert asyncio.run(orchestrator.append_to_conversation("nope", ["hi"])) is None
+        start = asyncio.run(orchestrator.start_conversation([]))
+        assert orchestrator.end_conversation(start.session_id) is True
+        assert asyncio.run(orchestrator.append_to_conversation(start.session_id, ["hi"])) is None
+
+    def test_session_ended_during_analysis(self, counting_batch, monkeypatch):
+        start = asyncio.run(orchestrator.start_conversation(["hi"], analyze=True))
+
+        async def end_then_analyze(texts):
+            orchestrator.end_conversation(start.session_id)
+            return [ANALYSIS for _ in texts]
+
+        monkeypatch.setattr(orchestrator, "analyze_texts", end_then_analyze)
+        assert asyncio.run(orchestrator.append_to_conversation(start.session_id, ["Fine!"])) is None
+
+    def test_failed_analysis_leaves_counters_alone(self, counting_batch, monkeypatch):
+        start = asyncio.run(orchestrator.start_conversation(["hi"]))
+
+        async def broken(texts):
+            raise RuntimeError("model exploded")
+
+        monkeypatch.setattr(orchestrator, "analyze_texts", broken)
+        with pytest.raises(RuntimeError):
+            asyncio.run(orchestrator.append_to_conversation(start.session_id, ["Fine?"]))
+        assert orchestrator._conversations.get(start.session_id).message_count == 1
+
+    def test_idle_sessions_expire(self, counting_batch, monkeypatch):
+        monkeypatch.setattr(orchestrator, "_conversations", orchestrator.LRUCache(max_entries=8, ttl_seconds=0.01))
+        start = asyncio.run(orchestrator.start_conversation(["hi"], analyze=False))
+        time.sleep(0.02)
+        assert asyncio.run(orchestrator.append_to_conversation(start.session_id, ["still there?"])) is None
+
+
+class TestAnalyzeDraft:
+    """Drafts are analyzed per sentence so unchanged sentences come from the cache."""
+
+    def test_only_edited_sentences_reach_the_models(self, monkeypatch):
+        from analysis_engine import analyzer
+        from backend.cache import SingleFlight
+
+        seen = []
+
+        def emotions(texts):
+            seen.extend(texts)
+            return [[{"label": "joy", "score": 0.7}, {"label": "anger", "score": 0.3}] for _ in texts]
+
+        def toxicity(texts):
+            return [{"label": "non-toxic", "score": 0.9} for _ in texts]
+
+        monkeypatch.setattr(analyzer, "_batchers", {})
+        monkeypatch.setattr(analyzer, "_analysis_cache", analyzer.LRUCache(max_entries=64))
+        monkeypatch.setattr(analyzer, "_persistent_cache", None)
+        monkeypatch.setattr(analyzer, "_in_flight", SingleFlight())
+        monkeypatch.setattr(analyzer, "predict_emotions", emotions)
+        monkeypatch.setattr(analyzer, "predict_toxicity", toxicity)
+
+        asyncio.run(orchestrator.analyze_draft("Thanks for dinner. "))
+        result = asyncio.run(orchestrator.analyze_draft("Thanks for dinner. See you soon"))
+        asyncio.run(orchestrator.analyze_draft("Thanks for dinner. See you soon!"))
+
+        # The unfinished last sentence is re-run each time; it never enters the cache
+        assert seen == ["Thanks for dinner.", "See you soon", "See you soon!"]
+        assert result.emotion == "joy"
+        assert result.is_toxic is False
+        assert len(analyzer._analysis_cache) == 1
+
+    def test_blank_draft(self):
+        assert asyncio.run(orchestrator.analyze_draft("  \n ")) is None
+
+
+class TestStreamMessages:
+    """Streamed batches are analyzed as messages arrive, with bounded read-ahead."""
+
+    @pytest.fixture
+    def batches(self, monkeypatch):
+        seen = []
+
+        async def analyze_texts(texts):
+            seen.append(list(texts))
+            return [AnalysisOut(emotion=t, intensity=0.5, risk="low") for t in texts]
+
+        monkeypatch.setattr(orchestrator, "analyze_texts", analyze_texts)
+        return seen
+
+    def test_first_result_does_not_wait_for_the_whole_stream(self, batches):
+        first_result = None
+
+        async def texts():
+            yield "hello"
+            # The rest of the stream only arrives once a result has gone out
+            await first_result.wait()
+            for i in range(5):
+                yield f"msg {i}"
+
+        async def run():
+            nonlocal first_result
+            first_result = asyncio.Event()
+            out = []
+            async for result in orchestrator.stream_messages(texts(), batch_size=2):
+                out.append(result.emotion)
+                first_result.set()
+            return out
+
+        out = asyncio.run(asyncio.wait_for(run(), timeout=5))
+        assert out == ["hello", "msg 0", "msg 1", "msg 2", "msg 3", "msg 4"]
+        assert batches[0] == ["hello"]
+        assert all(len(b) <= 2 for b in batches)
+
+    def test_read_error_follows_earlier_results(self, batches):
+        async def texts():
+            yield "fine"
+            raise ValueError("Line 2: bad")
+
+        async def run():
+            out = []
+            with pytest.raises(ValueError, match="Line 2"):
+                async for result in orchestrator.stream_messages(texts()):
+                    out.append(result.emotion)
+            return out
+
+        assert asyncio.run(run()) == ["fine"]
+
+    def test_stopping_early_cancels_the_reader(self, batches):
+        async def endless():
+            i = 0
+            while True:
+                yield f"msg {i}"
+                i += 1
+
+        async def run():
+            stream = orchestrator.stream_messages(endless(), batch_size=2)
+            await stream.__anext__()
+            await asyncio.sleep(0.01)  # let the reader fill the queue and block on it
+            await stream.aclose()
+            return [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+
+        assert asyncio.run(run()) == []
+
+    def test_results_stay_out_of_the_analysis_store(self, batches, monkeypatch):
+        monkeypatch.setattr(orchestrator, "_analysis_store", orchestrator.LRUCache(max_entries=8))
+
+        async def texts():
+            yield "hello"
+
+        async def run():
+            return [r async for r in orchestrator.stream_messages(texts())]
+
+        [result] = asyncio.run(run())
+        assert result.analysis_id is None
+        assert len(orchestrator._analysis_store) == 0
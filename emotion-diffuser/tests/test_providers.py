@@ -0,0 +1,113 @@
+"""
+Tests for mediator_engine.providers and the local OpenAI-compatible fake server.
+"""
+
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from backend import config
+from mediator_engine import fake_server, providers
+from mediator_engine.prompts import (
+    APOLOGY_SYSTEM_PROMPT,
+    MEDIATION_SYSTEM_PROMPT,
+    REWRITE_SYSTEM_PROMPT,
+)
+from mediator_engine.rewrite import _parse_components
+
+
+class TestFakeProvider:
+    """The fake answers in the shape each prompt expects."""
+
+    def setup_method(self):
+        self.provider = providers.FakeProvider(latency_s=0, tokens_per_s=0)
+
+    def test_rewrite_is_plain_text(self):
+        text = asyncio.run(self.provider.complete(REWRITE_SYSTEM_PROMPT, "you never listen"))
+        assert not text.startswith("{")
+
+    def test_apology_has_all_components(self):
+        text = asyncio.run(self.provider.complete(APOLOGY_SYSTEM_PROMPT, "I yelled"))
+        assert _parse_components(text) is not None
+
+    def test_mediation_has_rewrite_and_apology(self):
+        data = json.loads(asyncio.run(self.provider.complete(MEDIATION_SYSTEM_PROMPT, "I yelled")))
+        assert set(data) == {"rewrite", "apology"}
+
+    def test_stream_reassembles_to_completion(self):
+        async def collect():
+            return "".join([t async for t in self.provider.stream(APOLOGY_SYSTEM_PROMPT, "I yelled")])
+
+        assert asyncio.run(collect()) == self.provider.respond(APOLOGY_SYSTEM_PROMPT)
+
+
+class TestBuildProvider:
+    def test_missing_key_raises(self, monkeypatch):
+        monkeypatch.setattr(config, "GEMINI_API_KEY", "")
+        with pytest.raises(RuntimeError):
+            providers.build_provider("gemini")
+
+    def test_unknown_provider_raises(self):
+        with pytest.raises(ValueError):
+            providers.build_provider("nope")
+
+    def test_openai_compatible_provider(self, monkeypatch):
+        monkeypatch.setattr(config, "OPENAI_API_KEY", "sk-test")
+        monkeypatch.setattr(config, "OPENAI_BASE_URL", "http://127.0.0.1:9000/v1")
+        provider = providers.build_provider("openai")
+        assert provider.name == "openai"
+        assert provider.default_model == config.LLM_MODEL
+
+    @pytest.mark.parametrize("json_mode, expected", [
+        ("json_schema", {"type": "json_schema", "json_schema": {"name": "apology"}}),
+        ("json_object", {"type": "json_object"}),
+        ("off", None),
+    ])
+    def test_structured_output_options(self, monkeypatch, json_mode, expected):
+        monkeypatch.setattr(config, "OPENAI_API_KEY", "sk-test")
+        monkeypatch.setattr(config, "LLM_JSON_MODE", json_mode)
+        provider = providers.build_provider("openai")
+        assert provider._format_options(None) == {}
+        assert provider._format_options({"name": "apology"}).get("response_format") == expected
+
+
+class TestFakeServer:
+    """The stub server speaks the OpenAI chat completions wire format."""
+
+    @pytest.fixture(autouse=True)
+    def instant(self, monkeypatch):
+        monkeypatch.setattr(fake_server, "provider", providers.FakeProvider(latency_s=0, tokens_per_s=0))
+        self.client = TestClient(fake_server.app)
+
+    def _body(self, **extra):
+        return {
+            "model": "fake-llm",
+            "messages": [
+                {"role": "system", "content": APOLOGY_SYSTEM_PROMPT},
+                {"role": "user", "content": "I yelled"},
+            ],
+            **extra,
+        }
+
+    def test_completion(self):
+        resp = self.client.post("/v1/chat/completions", json=self._body())
+        assert resp.status_code == 200
+        content = resp.json()["choices"][0]["message"]["content"]
+        assert _parse_components(content) is not None
+
+    def test_streaming_completion(self):
+        resp = self.client.post("/v1/chat/completions", json=self._body(stream=True))
+        assert resp.status_code == 200
+        events = [line[len("data: "):] for line in resp.text.splitlines() if line.startswith("data: ")]
+        assert events[-1] == "[DONE]"
+        text = "".join(json.loads(e)["choices"][0]["delta"]["content"] for e in events[:-1])
+        assert _parse_components(text) is not None
+
+
+class TestLLMProvider:
+    def test_interface_is_abstract(self):
+        from mediator_engine.providers import LLMProvider
+
+        with pytest.raises(TypeError):
+            LLMProvider(default_model="m")
@@ -0,0 +1,150 @@
+"""
+Tests for mediator_engine.rewrite — response parsing and the combined call.
+"""
+
+import asyncio
+import json
+
+import pytest
+from mediator_engine import parsing, rewrite
+from mediator_engine.parsing import ApologyStreamParser
+
+COMPONENTS = {
+    "acknowledgment": "I hurt you.",
+    "responsibility": "That was on me.",
+    "remorse": "I'm sorry.",
+    "repair": "I'll do better.",
+    "invitation": "How are you feeling?",
+}
+
+
+@pytest.fixture
+def fake_call_llm(monkeypatch):
+    """Replace call_llm with a scripted list of responses; records each call."""
+    calls = []
+    replies = []
+
+    async def fake(system_prompt, user_prompt, **kwargs):
+        calls.append({"system": system_prompt, "user": user_prompt, **kwargs})
+        return replies.pop(0)
+
+    monkeypatch.setattr(rewrite, "call_llm", fake)
+    return calls, replies
+
+
+class TestRewriteAndApologize:
+    """The combined rewrite + apology call."""
+
+    def test_single_call_returns_both(self, fake_call_llm):
+        calls, replies = fake_call_llm
+        replies.append(json.dumps({"rewrite": "Can we talk?", "apology": COMPONENTS}))
+
+        rewritten, apology, components = asyncio.run(
+            rewrite.rewrite_and_apologize_llm("You never listen!", relationship="partner")
+        )
+        assert len(calls) == 1
+        assert rewritten == "Can we talk?"
+        assert components == COMPONENTS
+        assert apology.startswith("I hurt you.")
+        assert "Gottman" in calls[0]["system"]
+        assert calls[0]["json_schema"] is parsing.MEDIATION_SCHEMA
+
+    def test_unparseable_falls_back_to_two_calls(self, fake_call_llm):
+        calls, replies = fake_call_llm
+        replies.extend(["not json", "Can we talk?", json.dumps(COMPONENTS)])
+
+        rewritten, apology, components = asyncio.run(
+            rewrite.rewrite_and_apologize_llm("You never listen!")
+        )
+        assert len(calls) == 3
+        assert rewritten == "Can we talk?"
+        assert components == COMPONENTS
+
+
+    def test_empty_apology_falls_back_and_is_rejected(self, fake_call_llm):
+        calls, replies = fake_call_llm
+        empty = json.dumps({"rewrite": "Can we talk?", "apology": {"remorse": "  "}})
+        replies.extend([empty, "Can we talk?", json.dumps(COMPONENTS)])
+
+        rewritten, apology, components = asyncio.run(rewrite.rewrite_and_apologize_llm("You never listen!"))
+        assert len(calls) == 3
+        assert components == COMPONENTS
+        assert "rewrite" not in apology
+        # The check hook keeps such a response out of the LLM cache
+        assert parsing.check_mediation(empty) is False
+
+
+class TestParseComponents:
+    """Apology JSON parsing."""
+
+    def test_strips_markdown_fences(self):
+        raw = "```json\n" + json.dumps(COMPONENTS) + "\n```"
+        assert rewrite._parse_components(raw) == COMPONENTS
+
+    def test_invalid_json_gives_empty_components(self):
+        components = rewrite._parse_components("Sorry about that.")
+        assert set(components) == set(COMPONENTS)
+        assert not any(components.values())
+
+    def test_recovers_from_truncated_output(self):
+        raw = json.dumps(COMPONENTS)[:-10]
+        components = rewrite._parse_components(raw)
+        assert components["acknowledgment"] == "I hurt you."
+        assert components["repair"] == "I'll do better."
+        assert components["invitation"].startswith("How")
+
+    def test_tolerates_chatter_around_object(self):
+        raw = "Here is the apology:\n" + json.dumps(COMPONENTS) + "\nHope that helps!"
+        assert rewrite._parse_components(raw) == COMPONENTS
+
+    def test_failure_rate_is_tracked(self, monkeypatch):
+        monkeypatch.setattr(parsing, "_stats", dict.fromkeys(parsing._stats, 0))
+        assert parsing.check_apology(json.dumps(COMPONENTS)) is True
+        # Recovered output is usable but not cached
+        assert parsing.check_apology('{"remorse": "sorry", "repa') is False
+        assert parsing.check_apology("no json here") is False
+        stats = parsing.parse_stats()
+        assert (stats["parsed"], stats["recovered"], stats["failed"]) == (1, 1, 1)
+        assert stats["failure_rate"] == pytest.approx(1 / 3, abs=1e-3)
+
+    def test_parsing_alone_is_not_counted(self, monkeypatch):
+        monkeypatch.setattr(parsing, "_stats", dict.fromkeys(parsing._stats, 0))
+        rewrite._parse_components("no json here")
+        assert parsing.parse_stats()["failed"] == 0
+
+    def test_llm_calls_validate_responses(self, fake_call_llm):
+        calls, replies = fake_call_llm
+        replies.append(json.dumps(COMPONENTS))
+        asyncio.run(rewrite.generate_apology_llm("I yelled"))
+        replies.append(json.dumps({"rewrite": "Can we talk?", "apology": COMPONENTS}))
+        asyncio.run(rewrite.rewrite_and_apologize_llm("You never listen!"))
+        assert calls[0]["validate"] is parsing.check_apology
+        assert calls[1]["validate"] is parsing.check_mediation
+
+    def test_apology_requests_structured_output(self, fake_call_llm):
+        calls, replies = fake_call_llm
+        replies.append(json.dumps(COMPONENTS))
+        asyncio.run(rewrite.generate_apology_llm("I yelled"))
+        assert calls[0]["json_schema"] is parsing.APOLOGY_SCHEMA
+
+
+class TestApologyStreamParser:
+    """Components are emitted as soon as they complete, whatever the chunking."""
+
+    def test_emits_each_component_once_complete(self):
+        raw = json.dumps(COMPONENTS)
+        parser = ApologyStreamParser()
+        emitted = []
+        for i in range(0, len(raw), 7):
+            emitted.extend(parser.feed(raw[i:i + 7]))
+        assert emitted == list(COMPONENTS.items())
+
+    def test_finish_returns_unterminated_component(self):
+        parser = ApologyStreamParser()
+        parser.feed('{"acknowledgment": "I hurt you.", "remorse": "I am so')
+        assert parser.finish() == {"acknowledgment": "I hurt you.", "remorse": "I am so"}
+
+    def test_waits_for_closing_quote(self):
+        parser = ApologyStreamParser()
+        assert parser.feed('{"acknowledgment": "I said \\"no') == []
+        assert parser.feed('\\" too fast."') == [("acknowledgment", 'I said "no" too fast.')]